@@ -0,0 +1,351 @@
+"""
+Automated Comment Checker Benchmark: Benchmarks for the automated_comment_checker program.
+
+Run "python Comment_Checker_Benchmark.py" from the same folder as the program for the quick benchmarks, or
+"python Comment_Checker_Benchmark.py --corpus --output results.json" to also time every engine on a synthetic
+corpus and save the results as JSON, so that releases can be compared.
+"""
+
+import os
+import sys
+import json
+import time
+import random
+import shutil
+import timeit
+import argparse
+import platform
+import tempfile
+import tracemalloc
+
+from automated_comment_checker import CommentChecker
+from automated_comment_checker import read_csv_file
+from automated_comment_checker import build_regex
+from automated_comment_checker import count_lines
+from automated_comment_checker import load_numpy
+
+# Small test programs, where the per file overhead is most of the work
+FILES = ["Test/gui_controller.py", "Test/TestCaps.JAVA", "Test/compare.c", "Test/index.html", "Test/style.css"]
+
+# Ways of scanning a file, each a function from a comment checker to its file summary method
+ENGINES = {
+    "scan": lambda checker: checker.file_summary,
+    "text": lambda checker: checker.text_file_summary,
+    "regex": lambda checker: checker.regex_file_summary,
+    "mmap": lambda checker: checker.mmap_file_summary,
+    "lexer": lambda checker: checker.lexer_file_summary,
+    "trie": lambda checker: checker.trie_file_summary,
+    "chunked": lambda checker: checker.chunked_file_summary,
+}
+
+# Files generated for every extension in the synthetic corpus, as (kind, number of lines, comment density)
+CORPUS_FILES = [("plain", 20, 0.1), ("plain", 500, 0.3), ("plain", 5000, 0.6), ("nested", 500, 0.4),
+                ("unterminated", 500, 0.2)]
+
+# Words used for code and comment text in the synthetic corpus
+WORDS = ["value", "total", "count", "index", "result", "buffer", "TODO", "name", "items", "length"]
+
+
+def uncached_file_summary(csv_file, file_name):
+    """ Read the csv_file and build the regexes for file_name from scratch, the way every call to file_summary
+    used to.
+
+    @param str csv_file:
+    @param str file_name:
+    @rtype: list summary:
+    """
+
+    return CommentChecker(csv_file).file_summary(file_name)
+
+
+def per_file_overhead(csv_file="commenting_syntax.csv", number=200):
+    """ Time scanning each file with a new comment checker per file and with one shared comment checker.
+
+    @param str csv_file:
+    @param int number: number of times each file is scanned
+    @rtype: dict: microseconds per file for "uncached" and "cached"
+    """
+
+    checker = CommentChecker(csv_file)
+    uncached = timeit.timeit(lambda: [uncached_file_summary(csv_file, file_name) for file_name in FILES],
+                             number=number)
+    cached = timeit.timeit(lambda: [checker.file_summary(file_name) for file_name in FILES], number=number)
+    # build_regex alone, which the shared comment checker only runs once per file extension
+    single_commenting_syntax, multi_commenting_syntax, extension_list = read_csv_file(csv_file)
+    regex = timeit.timeit(lambda: build_regex(single_commenting_syntax, multi_commenting_syntax, ".java"),
+                          number=number * len(FILES))
+
+    files = number * len(FILES)
+    return {"uncached": uncached / files * 1e6, "cached": cached / files * 1e6, "build_regex": regex / files * 1e6}
+
+
+def write_comment_file(file_name, comments=100000):
+    """ Write a Java file with comments comments, alternating between single line comments, block comments on
+    one line and block comments over three lines, every tenth with a TODO.
+
+    @param str file_name:
+    @param int comments:
+    @rtype: NoneType:
+    """
+
+    with open(file_name, 'w') as file_handler:
+        for i in range(comments):
+            todo = "TODO " if i % 10 == 0 else ""
+            if i % 3 == 0:
+                file_handler.write("int a{} = {}; // {}single\n".format(i, i, todo))
+            elif i % 3 == 1:
+                file_handler.write("/* {}block */ call({});\n".format(todo, i))
+            else:
+                file_handler.write("/**\n * {}doc\n */\n".format(todo))
+
+
+def block_classification(csv_file="commenting_syntax.csv", comments=100000):
+    """ Time the regexes and the line by line scan on a file with comments comments. Telling single line and
+    block comments apart used to compare every comment with every single line comment, which took about half a
+    minute at this size.
+
+    @param str csv_file:
+    @param int comments:
+    @rtype: dict: seconds taken by "regex" and "scan"
+    """
+
+    checker = CommentChecker(csv_file)
+    directory = tempfile.mkdtemp()
+    file_name = os.path.join(directory, "comments.java")
+    write_comment_file(file_name, comments)
+
+    try:
+        results = {}
+        for name, summary in [("regex", checker.regex_file_summary), ("scan", checker.file_summary)]:
+            start = time.perf_counter()
+            summary(file_name)
+            results[name] = time.perf_counter() - start
+    finally:
+        os.remove(file_name)
+        os.rmdir(directory)
+
+    return results
+
+
+def delimiter_matching(csv_file="commenting_syntax.csv", extensions=(".d", ".cs"), seed=0, repeat=3):
+    """ Time the regexes, the line by line scan and the delimiter trie on files of each of extensions, which have
+    the most commenting syntaxes and so the longest alternations in their regexes. Each extension gets a file of
+    20k lines with nested block comments and a file of 2k lines with block comments that are never closed, which
+    the regexes search to the end of the file for every time.
+
+    @param str csv_file:
+    @param tuple extensions:
+    @param int seed:
+    @param int repeat: number of times each file is scanned, of which the fastest is kept
+    @rtype: dict: seconds taken by "regex", "scan" and "trie" for each (extension, kind of file)
+    """
+
+    checker = CommentChecker(csv_file)
+    rnd = random.Random(seed)
+    directory = tempfile.mkdtemp()
+
+    try:
+        results = {}
+        for extension in extensions:
+            for kind, lines in [("nested", 20000), ("unterminated", 2000)]:
+                file_name = os.path.join(directory, kind + extension)
+                with open(file_name, 'w') as file_handler:
+                    file_handler.write(generate_source(rnd, checker.single_commenting_syntax[extension],
+                                                       checker.multi_commenting_syntax[extension], kind, lines, 0.5))
+
+                results[extension, kind] = {}
+                for name in ["regex", "scan", "trie"]:
+                    summary = ENGINES[name](checker)
+                    results[extension, kind][name] = min(timeit.repeat(lambda: summary(file_name), number=1,
+                                                                       repeat=repeat))
+    finally:
+        shutil.rmtree(directory)
+
+    return results
+
+
+def line_accounting(lines=5000000, seed=0, repeat=3):
+    """ Time counting the lines that aren't blank in a buffer of lines lines, a mix of code, indented blank lines
+    and empty lines, with each backend of count_lines. NumPy is left out when it isn't installed.
+
+    @param int lines:
+    @param int seed:
+    @param int repeat: number of times the buffer is counted, of which the fastest is kept
+    @rtype: dict: seconds taken by "regex" and "numpy"
+    """
+
+    rnd = random.Random(seed)
+    kinds = [b"    total = count(index)  // TODO\n", b"    \t\r\n", b"\n", b"}\n"]
+    buffer = b"".join(kinds[rnd.randrange(len(kinds))] for i in range(lines))
+
+    results = {}
+    for backend in ["regex", "numpy"] if load_numpy() is not None else ["regex"]:
+        results[backend] = min(timeit.repeat(lambda: count_lines(buffer, backend=backend), number=1, repeat=repeat))
+
+    return results
+
+
+def generate_source(rnd, single_syntax, multi_syntax, kind, lines, density):
+    """ Return the text of a synthetic source file with about lines lines, where about density of the lines are
+    in comments. "nested" files have commenting syntax inside block comments, and "unterminated" files start
+    block comments that are never closed.
+
+    @param random.Random rnd:
+    @param list single_syntax:
+    @param list multi_syntax:
+    @param str kind:
+    @param int lines:
+    @param float density:
+    @rtype: str:
+    """
+
+    blocks = [(multi_syntax[i], multi_syntax[i + 1]) for i in range(0, len(multi_syntax), 2)]
+    # Block comments in unterminated files never close, so that their starting syntax has to be given up on
+    unterminated = rnd.choice(blocks)
+    if kind == "unterminated":
+        blocks = [block for block in blocks if block[1] != unterminated[1]]
+    output = []
+
+    while len(output) < lines:
+        text = " ".join(rnd.choice(WORDS) for i in range(rnd.randint(1, 8)))
+        choice = rnd.random()
+        if choice >= density:
+            output.append("    {} = {}({})".format(rnd.choice(WORDS), rnd.choice(WORDS), rnd.randint(0, 999))
+                          if choice > density + 0.1 else "")
+        elif kind == "unterminated" and choice < density / 4:
+            output.append("    x = 1 {} {}".format(unterminated[0], text))
+        elif choice < density / 2 or not blocks:
+            output.append("    x = 1  {} {}".format(rnd.choice(single_syntax), text))
+        else:
+            start, end = rnd.choice(blocks)
+            inside = [text] * rnd.randint(0, 6)
+            if kind == "nested" and inside:
+                inside[0] = "{} {} {}".format(rnd.choice(blocks)[0], rnd.choice(single_syntax), text)
+            output.append(start + " " + "\n".join(inside) + " " + end)
+
+    return "\n".join(output) + "\n"
+
+
+def generate_corpus(directory, csv_file="commenting_syntax.csv", seed=0, scale=1):
+    """ Write a reproducible synthetic corpus to directory, with the files in CORPUS_FILES for every extension in
+    csv_file, and return the file names.
+
+    @param str directory:
+    @param str csv_file:
+    @param int seed:
+    @param int scale: multiplies the number of lines in every file
+    @rtype: list:
+    """
+
+    single_commenting_syntax, multi_commenting_syntax, extension_list = read_csv_file(csv_file)
+    rnd = random.Random(seed)
+    file_names = []
+
+    for extension in extension_list:
+        for i, (kind, lines, density) in enumerate(CORPUS_FILES):
+            file_name = os.path.join(directory, "{}_{}_{}{}".format(kind, lines, i, extension))
+            with open(file_name, 'w') as file_handler:
+                file_handler.write(generate_source(rnd, single_commenting_syntax[extension],
+                                                   multi_commenting_syntax[extension], kind, lines * scale,
+                                                   density))
+            file_names.append(file_name)
+
+    return file_names
+
+
+def benchmark_engine(summary, file_names):
+    """ Time scanning every file with summary, then scan them again to find the peak memory used by any one
+    file. Files summary can't scan are counted as errors.
+
+    @param function summary:
+    @param list file_names:
+    @rtype: dict:
+    """
+
+    scanned, errors, size = [], 0, 0
+    start = time.perf_counter()
+    for file_name in file_names:
+        try:
+            summary(file_name)
+        except Exception:
+            errors += 1
+        else:
+            scanned.append(file_name)
+            size += os.path.getsize(file_name)
+    seconds = time.perf_counter() - start
+
+    # Memory is measured separately, since tracing allocations slows everything down
+    peak = 0
+    for file_name in scanned:
+        tracemalloc.start()
+        summary(file_name)
+        peak = max(peak, tracemalloc.get_traced_memory()[1])
+        tracemalloc.stop()
+
+    return {"files": len(scanned), "errors": errors, "bytes": size, "seconds": seconds,
+            "files_per_second": len(scanned) / seconds if seconds else 0.0,
+            "mb_per_second": size / 1e6 / seconds if seconds else 0.0, "peak_memory_bytes": peak}
+
+
+def benchmark_corpus(csv_file="commenting_syntax.csv", seed=0, scale=1, engines=None):
+    """ Generate a synthetic corpus, time every engine on it and return the results.
+
+    @param str csv_file:
+    @param int seed:
+    @param int scale:
+    @param list engines: names of the engines in ENGINES (defaults to all of them)
+    @rtype: dict:
+    """
+
+    checker = CommentChecker(csv_file)
+    directory = tempfile.mkdtemp()
+    try:
+        file_names = generate_corpus(directory, csv_file, seed, scale)
+        results = {}
+        for name in engines or ENGINES:
+            results[name] = benchmark_engine(ENGINES[name](checker), file_names)
+    finally:
+        shutil.rmtree(directory)
+
+    return {"python": sys.version.split()[0], "platform": platform.platform(), "seed": seed, "scale": scale,
+            "corpus_files": len(file_names), "engines": results}
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--corpus", help="also time every engine on a synthetic corpus", action="store_true")
+    parser.add_argument("--seed", help="seed for generating the corpus", type=int, default=0)
+    parser.add_argument("--scale", help="multiplies the number of lines in every corpus file", type=int, default=1)
+    parser.add_argument("--engines", help="engines to time on the corpus", nargs='+', choices=sorted(ENGINES))
+    parser.add_argument("--output", help="file to write the corpus results to as JSON (defaults to standard out)")
+    args = parser.parse_args()
+
+    results = per_file_overhead()
+    print("Per file, new comment checker:    {:.1f} us".format(results["uncached"]))
+    print("Per file, shared comment checker: {:.1f} us".format(results["cached"]))
+    print("build_regex on its own:           {:.1f} us".format(results["build_regex"]))
+
+    results = block_classification()
+    print("100k comments, regexes:           {:.2f} s".format(results["regex"]))
+    print("100k comments, line by line scan: {:.2f} s".format(results["scan"]))
+
+    results = delimiter_matching()
+    for extension, kind in sorted(results):
+        times = results[extension, kind]
+        print("{:<3} {:<12} regexes / line by line / delimiter trie: {:.3f} / {:.3f} / {:.3f} s".format(
+            extension, kind, times["regex"], times["scan"], times["trie"]))
+
+    results = line_accounting()
+    print("5M lines, non-blank lines with regexes: {:.3f} s".format(results["regex"]))
+    if "numpy" in results:
+        print("5M lines, non-blank lines with NumPy:   {:.3f} s".format(results["numpy"]))
+    else:
+        print("5M lines, non-blank lines with NumPy:   not installed")
+
+    if args.corpus:
+        results = benchmark_corpus(seed=args.seed, scale=args.scale, engines=args.engines)
+        if args.output:
+            with open(args.output, 'w') as file_handler:
+                json.dump(results, file_handler, indent=2)
+        else:
+            print(json.dumps(results, indent=2))
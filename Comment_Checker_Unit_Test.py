@@ -4,10 +4,94 @@ Automated Comment Checker Unit Test: Unit Tests for the automated_comment_checke
 Author: Jeremy Shih
 """
 
+import io
+import csv
+import json
+import asyncio
+import codecs
+import contextlib
+import random
+import os
+import multiprocessing
+import pickle
+import shutil
+import socket
+import subprocess
+import sys
+import tarfile
+import tempfile
+import threading
+import time
 import unittest
+import zipfile
+
+import automated_comment_checker
+import comment_archive
+import comment_output
+
 from automated_comment_checker import file_summary
 from automated_comment_checker import read_csv_file
 from automated_comment_checker import build_regex
+from automated_comment_checker import find_source_files
+from automated_comment_checker import CommentChecker
+from automated_comment_checker import get_checker
+from automated_comment_checker import scan_comments
+from automated_comment_checker import tree_summary
+from automated_comment_checker import buffer_summaries
+from automated_comment_checker import CSVFileNotFoundError
+from automated_comment_checker import CSVFormatError
+from automated_comment_checker import UnknownSyntaxError
+from automated_comment_checker import scan_buffer
+from automated_comment_checker import label_regex
+from automated_comment_checker import compile_syntax
+from automated_comment_checker import load_syntax
+from automated_comment_checker import SyntaxIndex
+from automated_comment_checker import scan_tree
+from automated_comment_checker import output_tree_summary
+from automated_comment_checker import SourceFileNotFoundError
+from automated_comment_checker import write_tree_records
+from automated_comment_checker import detect_encoding
+from automated_comment_checker import read_lexer_options
+from automated_comment_checker import DelimiterTrie
+from automated_comment_checker import Comment
+from automated_comment_checker import iter_comments
+from automated_comment_checker import file_comments
+from automated_comment_checker import scan_chunk
+from automated_comment_checker import merge_chunks
+from automated_comment_checker import summary_method
+from automated_comment_checker import summarize_file
+from automated_comment_checker import count_lines
+from automated_comment_checker import load_numpy
+from automated_comment_checker import CommentCheckerError
+from automated_comment_checker import merge_summaries
+from comment_cache import ResultCache
+from comment_cache import file_stamp
+from comment_cache import hash_file
+from comment_git import diff_summary
+from comment_async import AsyncCommentChecker
+from Comment_Checker_Benchmark import generate_source
+from Comment_Checker_Benchmark import benchmark_engine
+from Comment_Checker_Benchmark import generate_corpus
+from comment_metrics import ScanMetrics
+from comment_output import SUMMARY_FIELDS
+from comment_output import JSONLinesWriter
+from comment_output import CSVWriter
+from comment_output import ColumnarWriter
+from comment_output import read_columnar
+from comment_markers import Marker
+from comment_markers import MarkerIndex
+from comment_markers import file_markers
+from comment_markers import count_markers
+from comment_daemon import CommentDaemon
+from comment_rollup import RollupTree
+from comment_archive import ArchiveError
+from comment_archive import scan_archives
+from comment_shard import ShardError
+from comment_shard import PartialWriter
+from comment_shard import parse_shard
+from comment_shard import partition_files
+from comment_shard import shard_files
+from comment_shard import merge_partials
 
 
 class TestFileSummary(unittest.TestCase):
@@ -55,10 +139,14 @@ class TestFileSummary(unittest.TestCase):
     def testAlternatingUpperLowerCaseFileExtension(self):
         """ Test program with a Java which has a file extension with alternating upper and lower cases.
         """
-        with self.assertRaises(SystemExit) as output:
-            file_summary("commenting_syntax.csv", "test/test_alternating_characters.JaVa")
+        self.output = file_summary("commenting_syntax.csv", "test/test_alternating_characters.JaVa")
+        self.assertEqual(self.output, [77, 28, 6, 22, 2, 1])
 
-        self.assertEqual(output.exception.code, 1)
+    def testUnknownFileExtension(self):
+        """ Test program with a file whose extension has no commenting syntax in the csv file.
+        """
+        with self.assertRaises(UnknownSyntaxError):
+            file_summary("commenting_syntax.csv", "README.txt")
 
     def testEmptyFile(self):
         """ Test program with an empty program File.
@@ -119,11 +207,9 @@ class TestFileSummary(unittest.TestCase):
     def testProgramFileNotInFolder(self):
         """ Test program with input file not in folder.
         """
-        with self.assertRaises(SystemExit) as output:
+        with self.assertRaises(SourceFileNotFoundError):
             file_summary("commenting_syntax.csv", "not_in_folder.py")
 
-        self.assertEqual(output.exception.code, 1)
-
     def InvalidProgramFileName(self):
         """ Test program with invalid program filename.
         """
@@ -137,11 +223,9 @@ class TestFileSummary(unittest.TestCase):
         """ Test program with invalid CSV file name.
         """
 
-        with self.assertRaises(SystemExit) as output:
+        with self.assertRaises(CSVFileNotFoundError):
             file_summary("wrong_csv.csv", "test.py")
 
-        self.assertEqual(output.exception.code, 1)
-
 
 class TestReadCSVFile(unittest.TestCase):
     """ Test whether read_csv_file works properly.
@@ -150,19 +234,15 @@ class TestReadCSVFile(unittest.TestCase):
     def testCSVNotInFolder(self):
         """ Test on a CSV file that is not in the folder.
         """
-        with self.assertRaises(SystemExit) as output:
+        with self.assertRaises(CSVFileNotFoundError):
             read_csv_file("not_in_folder.csv")
 
-        self.assertEqual(output.exception.code, 1)
-
     def testEmptyCSV(self):
         """ Test on an empty CSV file.
         """
-        with self.assertRaises(SystemExit) as output:
+        with self.assertRaises(CSVFileNotFoundError):
             read_csv_file("test/empty.csv")
 
-        self.assertEqual(output.exception.code, 1)
-
     def testSingleLineCSV(self):
         """ Test on a CSV with one line.
         """
@@ -210,6 +290,12 @@ class TestReadCSVFile(unittest.TestCase):
 
         self.assertTrue('CSV file is in wrong format.', output.exception)
 
+    def testCSVFormatError(self):
+        """ Test that a csv file in the wrong format raises a CSVFormatError.
+        """
+        with self.assertRaises(CSVFormatError):
+            read_csv_file("test/wrong_format.csv")
+
 
 class TestBuildRegex(unittest.TestCase):
 
@@ -221,11 +307,9 @@ class TestBuildRegex(unittest.TestCase):
         """
         single_commenting_syntax, multi_commenting_syntax, extension_list = read_csv_file("test/syntax_not_in_csv.csv")
         extension = ".py"
-        with self.assertRaises(SystemExit) as output:
+        with self.assertRaises(UnknownSyntaxError):
             build_regex(single_commenting_syntax, multi_commenting_syntax, extension)
 
-        self.assertEqual(output.exception.code, 1)
-
     def testOneSingleCommentingSyntax(self):
         """ Test with one single commenting syntax and no multi line commenting syntax.
         """
@@ -316,5 +400,1572 @@ class TestBuildRegex(unittest.TestCase):
                                 '|\\\"\\\"\\\"(?:(?:.|\\n)*?)\\\"\\\"\\\")')
 
 
+class TestScanComments(unittest.TestCase):
+
+    """ Test whether scan_comments works properly.
+    """
+
+    def testBlockCommentAcrossLines(self):
+        """ Test a block comment over several lines followed by a comment on its last line.
+        """
+        file_handler = io.StringIO("int x; /* TODO\n\n  more */ y(); // end\n")
+        self.assertEqual(scan_comments(file_handler, ["//"], ["/*", "*/"]), [2, 4, 1, 3, 1, 1])
+
+    def testUnterminatedBlockComment(self):
+        """ Test that a block comment that is never closed isn't a comment, like with the regex.
+        """
+        file_handler = io.StringIO("/* closed */ /* not closed\ncode // comment\n")
+        self.assertEqual(scan_comments(file_handler, ["//"], ["/*", "*/"]), [2, 2, 1, 1, 1, 0])
+
+    def testManyUnterminatedBlockComments(self):
+        """ Test a large file of block comments that are never closed.
+        """
+        file_handler = io.StringIO("/* x\n" * 100000)
+        self.assertEqual(scan_comments(file_handler, ["//"], ["/*", "*/", "/**", "*/"]), [100000, 0, 0, 0, 0, 0])
+
+    def testSameSummaryAsRegex(self):
+        """ Test that scanning gives the same summary as the regexes for the test programs.
+        """
+        checker = CommentChecker("commenting_syntax.csv")
+        for file_name in ["Test/gui_controller.py", "Test/TestCaps.JAVA", "Test/compare.c", "Test/index.html",
+                          "Test/style.css", "Test/nested_multi_line_comment.py", "Test/single_and_multi.py"]:
+            self.assertEqual(checker.file_summary(file_name), checker.regex_file_summary(file_name))
+
+
+class TestCommentChecker(unittest.TestCase):
+
+    """ Test whether CommentChecker works properly.
+    """
+
+    def testPatternsCompiledOnce(self):
+        """ Test that the regexes for a file extension are compiled once and reused.
+        """
+        checker = CommentChecker("commenting_syntax.csv")
+        single_line_regex, regex = checker.patterns(".py")
+        self.assertEqual(single_line_regex.pattern, "(\\#(?:.*)$)")
+        self.assertIs(checker.patterns(".py")[1], regex)
+
+    def testSameSummaryAsFileSummary(self):
+        """ Test that one comment checker gives the same summaries as file_summary for several files.
+        """
+        checker = CommentChecker("commenting_syntax.csv")
+        self.assertEqual(checker.file_summary("Test/gui_controller.py"), [41, 37, 19, 18, 2, 3])
+        self.assertEqual(checker.file_summary("Test/compare.c"), [26, 10, 0, 10, 1, 0])
+
+    def testCheckerReused(self):
+        """ Test that file_summary reuses the comment checker for the same csv file.
+        """
+        self.assertIs(get_checker("commenting_syntax.csv"), get_checker("commenting_syntax.csv"))
+
+
+class TestTreeSummary(unittest.TestCase):
+
+    """ Test whether tree_summary works properly.
+    """
+
+    def setUp(self):
+        """ Copy a few test programs into a temporary directory tree.
+        """
+        self.directory = tempfile.mkdtemp()
+        os.makedirs(os.path.join(self.directory, "package", ".git"))
+        shutil.copy("Test/gui_controller.py", os.path.join(self.directory, "package"))
+        shutil.copy("Test/todo.py", os.path.join(self.directory, "package", ".git"))
+        shutil.copy("Test/compare.c", self.directory)
+        shutil.copy("Test/style.css", self.directory)
+        shutil.copy("README.txt", self.directory)
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def testFindSourceFiles(self):
+        """ Test that only files with commenting syntax outside of hidden directories are found.
+        """
+        files = list(find_source_files([self.directory], [".py", ".c", ".css"]))
+        self.assertEqual(files, [os.path.join(self.directory, "compare.c"),
+                                 os.path.join(self.directory, "style.css"),
+                                 os.path.join(self.directory, "package", "gui_controller.py")])
+
+    def testGlobPattern(self):
+        """ Test expanding a recursive glob pattern.
+        """
+        files = list(find_source_files([os.path.join(self.directory, "**", "*.py")], [".py"]))
+        self.assertEqual(files, [os.path.join(self.directory, "package", "gui_controller.py")])
+
+    def testTotals(self):
+        """ Test per extension totals and grand totals of a directory.
+        """
+        extension_totals, grand_totals, file_count = tree_summary("commenting_syntax.csv", [self.directory], 1)
+        self.assertEqual(file_count, 3)
+        self.assertEqual(extension_totals, {".py": [41, 37, 19, 18, 2, 3], ".c": [26, 10, 0, 10, 1, 0],
+                                            ".css": [163, 41, 41, 0, 0, 0]})
+        self.assertEqual(grand_totals, [230, 88, 60, 28, 3, 3])
+
+    def testWorkerPool(self):
+        """ Test that a pool of worker processes gives the same totals as a single process.
+        """
+        self.assertEqual(tree_summary("commenting_syntax.csv", [self.directory], 2),
+                         tree_summary("commenting_syntax.csv", [self.directory], 1))
+
+
+class TestResultCache(unittest.TestCase):
+
+    """ Test whether ResultCache works properly.
+    """
+
+    def setUp(self):
+        """ Copy a test program and the csv file into a temporary directory.
+        """
+        self.directory = tempfile.mkdtemp()
+        self.csv_file = os.path.join(self.directory, "commenting_syntax.csv")
+        self.file_name = os.path.join(self.directory, "todo.py")
+        self.cache_directory = os.path.join(self.directory, ".comment-counter-cache")
+        shutil.copy("commenting_syntax.csv", self.csv_file)
+        shutil.copy("Test/todo.py", self.file_name)
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def testUnchangedFile(self):
+        """ Test that the summary of an unchanged file is used again.
+        """
+        with ResultCache(self.csv_file, self.cache_directory) as cache:
+            self.assertIsNone(cache.lookup(self.file_name))
+            tree_summary(self.csv_file, [self.directory], 1, cache)
+        with ResultCache(self.csv_file, self.cache_directory) as cache:
+            self.assertEqual(cache.lookup(self.file_name), [1, 1, 1, 0, 0, 1])
+
+    def testChangedFile(self):
+        """ Test that a file with new contents is scanned again.
+        """
+        with ResultCache(self.csv_file, self.cache_directory) as cache:
+            tree_summary(self.csv_file, [self.directory], 1, cache)
+            with open(self.file_name, "a") as file_handler:
+                file_handler.write("x = 1  # TODO: two\n")
+            self.assertIsNone(cache.lookup(self.file_name))
+            extension_totals, grand_totals, file_count = tree_summary(self.csv_file, [self.directory], 1, cache)
+            self.assertEqual(grand_totals, [2, 2, 2, 0, 0, 2])
+            self.assertEqual(cache.lookup(self.file_name), [2, 2, 2, 0, 0, 2])
+
+    def testChangedCSVFile(self):
+        """ Test that changing the csv file invalidates the cache.
+        """
+        with ResultCache(self.csv_file, self.cache_directory) as cache:
+            tree_summary(self.csv_file, [self.directory], 1, cache)
+        with open(self.csv_file, "a") as file_handler:
+            file_handler.write("\n.ts,1,//,1,/* */,,,,")
+        with ResultCache(self.csv_file, self.cache_directory) as cache:
+            self.assertIsNone(cache.lookup(self.file_name))
+
+    def testEvictDeletedFile(self):
+        """ Test that the summaries of deleted files are removed.
+        """
+        with ResultCache(self.csv_file, self.cache_directory) as cache:
+            tree_summary(self.csv_file, [self.directory], 1, cache)
+            os.remove(self.file_name)
+            self.assertEqual(cache.evict_missing(), 1)
+
+    def testSharedCache(self):
+        """ Test that two runs can use the same cache at once without locking each other out.
+        """
+        with ResultCache(self.csv_file, self.cache_directory) as first:
+            first.store(self.file_name, [1, 1, 1, 0, 0, 1], file_stamp(self.file_name), hash_file(self.file_name))
+            with ResultCache(self.csv_file, self.cache_directory) as second:
+                second.store(self.file_name, [1, 1, 1, 0, 0, 1], file_stamp(self.file_name),
+                             hash_file(self.file_name))
+                self.assertEqual(second.evict_missing(), 0)
+                self.assertEqual(second.lookup(self.file_name), [1, 1, 1, 0, 0, 1])
+            first.flush()
+
+    def testStaleStamp(self):
+        """ Test that a summary stored with the hash of contents the file no longer has isn't used.
+        """
+        stamp = file_stamp(self.file_name)
+        content_hash = hash_file(self.file_name)
+        with open(self.file_name, "a") as file_handler:
+            file_handler.write("x = 1  # TODO: two\n")
+        os.utime(self.file_name, ns=(stamp[1] + 10 ** 9, stamp[1] + 10 ** 9))
+        with ResultCache(self.csv_file, self.cache_directory) as cache:
+            cache.store(self.file_name, [1, 1, 1, 0, 0, 1], (os.path.getsize(self.file_name), stamp[1]),
+                        content_hash)
+            self.assertIsNone(cache.lookup(self.file_name))
+
+
+class TestDiffSummary(unittest.TestCase):
+
+    """ Test whether diff_summary works properly.
+    """
+
+    def setUp(self):
+        """ Create a git repository with two commits.
+        """
+        self.directory = tempfile.mkdtemp()
+        self.git("init", "-q")
+        shutil.copy("Test/todo.py", self.directory)
+        shutil.copy("Test/compare.c", self.directory)
+        shutil.copy("README.txt", self.directory)
+        self.git("add", ".")
+        self.git("commit", "-q", "-m", "first")
+        with open(os.path.join(self.directory, "todo.py"), "a") as file_handler:
+            file_handler.write('"""\nTODO: more\n"""\n')
+        with open(os.path.join(self.directory, "README.txt"), "a") as file_handler:
+            file_handler.write("TODO\n")
+        shutil.copy("Test/single_line.py", os.path.join(self.directory, "new.py"))
+        os.remove(os.path.join(self.directory, "compare.c"))
+        self.git("add", "-A", ".")
+        self.git("commit", "-q", "-m", "second")
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def git(self, *args):
+        """ Run a git command in the repository.
+        """
+        subprocess.run(["git", "-C", self.directory, "-c", "user.name=Test", "-c", "user.email=test@example.com"]
+                       + list(args), check=True)
+
+    def testChangedFiles(self):
+        """ Test the summaries of added, changed and removed files at both revisions.
+        """
+        results = list(diff_summary("commenting_syntax.csv", "HEAD~1", "HEAD", self.directory))
+        self.assertEqual(results, [("compare.c", [26, 10, 0, 10, 1, 0], [0, 0, 0, 0, 0, 0]),
+                                   ("new.py", [0, 0, 0, 0, 0, 0], [1, 1, 1, 0, 0, 0]),
+                                   ("todo.py", [1, 1, 1, 0, 0, 1], [4, 4, 1, 3, 1, 2])])
+
+
+class TestBufferSummaries(unittest.TestCase):
+
+    """ Test whether buffer_summaries works properly.
+    """
+
+    def testBytesAndText(self):
+        """ Test scanning bytes and text buffers without files.
+        """
+        self.assertEqual(buffer_summaries("commenting_syntax.csv", [(".py", b"x = 1  # TODO\n"),
+                                                                    (".c", "/* a\r\nb */\r\n")]),
+                         [[1, 1, 1, 0, 0, 1], [2, 2, 0, 2, 1, 0]])
+
+    def testUnknownSyntax(self):
+        """ Test that a buffer without commenting syntax raises an error instead of exiting.
+        """
+        with self.assertRaises(UnknownSyntaxError):
+            buffer_summaries("commenting_syntax.csv", [(".txt", "// x")])
+
+
+class TestAsyncCommentChecker(unittest.TestCase):
+
+    """ Test whether AsyncCommentChecker works properly.
+    """
+
+    def testSummariesInOrder(self):
+        """ Test that summaries are yielded in the same order as the buffers with bounded concurrency.
+        """
+        async def collect():
+            checker = AsyncCommentChecker("commenting_syntax.csv", max_concurrency=2)
+            buffers = [(".py", "# {}\n".format(i) * i) for i in range(10)]
+            return [summary async for summary in checker.summaries(buffers)]
+
+        self.assertEqual(asyncio.run(collect()), [[i, i, i, 0, 0, 0] for i in range(10)])
+
+    def testUnknownSyntax(self):
+        """ Test that errors are raised in the event loop instead of exiting.
+        """
+        async def scan():
+            return await AsyncCommentChecker("commenting_syntax.csv").summary(".unknown", b"")
+
+        with self.assertRaises(UnknownSyntaxError):
+            asyncio.run(scan())
+
+
+class TestScanBuffer(unittest.TestCase):
+
+    """ Test whether scan_buffer and mmap_file_summary work properly.
+    """
+
+    def testSameSummaryAsScanComments(self):
+        """ Test that scanning through mmap gives the same summary as scanning line by line.
+        """
+        checker = CommentChecker("commenting_syntax.csv")
+        for file_name in ["Test/gui_controller.py", "Test/TestCaps.JAVA", "Test/compare.c", "Test/index.html",
+                          "Test/style.css", "Test/empty.py", "Test/nested_multi_line_comment.py",
+                          "Test/single_and_multi.py", "Test/two_to_dos_same_line.py"]:
+            self.assertEqual(checker.mmap_file_summary(file_name), checker.file_summary(file_name))
+
+    def testLongLine(self):
+        """ Test a single long line with many block comments, like minified code.
+        """
+        buffer = b"var a = 1;/* TODO */ b();" * 10000 + b"/* not closed"
+        self.assertEqual(scan_buffer(buffer, [b"//"], [b"/*", b"*/"]), [1, 10000, 0, 10000, 10000, 10000])
+
+    def testThreshold(self):
+        """ Test that file_summary scans files over the size threshold through mmap.
+        """
+        threshold = automated_comment_checker.MMAP_THRESHOLD
+        automated_comment_checker.MMAP_THRESHOLD = 0
+        try:
+            self.assertEqual(file_summary("commenting_syntax.csv", "Test/gui_controller.py"), [41, 37, 19, 18, 2, 3])
+        finally:
+            automated_comment_checker.MMAP_THRESHOLD = threshold
+
+
+class TestLabelRegex(unittest.TestCase):
+
+    """ Test whether label_regex works properly.
+    """
+
+    def testLabelledGroups(self):
+        """ Test that the labelled regex has a group for single line and for block comments.
+        """
+        single_commenting_syntax, multi_commenting_syntax, extension_list \
+            = read_csv_file("test/single_and_multi_syntax.csv")
+        single_line_regex, regex = build_regex(single_commenting_syntax, multi_commenting_syntax, ".py")
+        self.assertEqual(label_regex(single_line_regex, regex),
+                         "(?P<single>\\#(?:.*)$)|(?P<block>\\'\\'(?:(?:.|\\n)*?)\\'\\'\\')")
+
+    def testSingleLineCommentAfterBlockComment(self):
+        """ Test that a single line comment after a block comment on the same line isn't counted as a block comment.
+        """
+        directory = tempfile.mkdtemp()
+        file_name = os.path.join(directory, "after_block.java")
+        with open(file_name, "w") as file_handler:
+            file_handler.write("/**//x //y\n")
+        try:
+            checker = CommentChecker("commenting_syntax.csv")
+            self.assertEqual(checker.regex_file_summary(file_name), [1, 2, 1, 1, 1, 0])
+            self.assertEqual(checker.file_summary(file_name), [1, 2, 1, 1, 1, 0])
+        finally:
+            shutil.rmtree(directory)
+
+
+class TestBenchmarkCorpus(unittest.TestCase):
+
+    """ Test whether the synthetic benchmark corpus is generated properly.
+    """
+
+    def testReproducible(self):
+        """ Test that the same seed generates the same source.
+        """
+        sources = [generate_source(random.Random(3), ["//"], ["/*", "*/", "/**", "*/"], "nested", 200, 0.5)
+                   for i in range(2)]
+        self.assertEqual(sources[0], sources[1])
+
+    def testUnterminated(self):
+        """ Test that unterminated sources start block comments whose ending syntax never appears.
+        """
+        source = generate_source(random.Random(0), ["#"], ["<#", "#>"], "unterminated", 200, 0.5)
+        self.assertIn("<#", source)
+        self.assertNotIn("#>", source)
+
+    def testBenchmarkEngine(self):
+        """ Test timing an engine on a few files.
+        """
+        results = benchmark_engine(CommentChecker("commenting_syntax.csv").file_summary,
+                                   ["Test/gui_controller.py", "README.txt"])
+        self.assertEqual(results["files"], 1)
+        self.assertEqual(results["errors"], 1)
+        self.assertEqual(results["bytes"], os.path.getsize("Test/gui_controller.py"))
+
+
+class TestScanMetrics(unittest.TestCase):
+
+    """ Test whether ScanMetrics works properly.
+    """
+
+    def testPhases(self):
+        """ Test that the phases of the regexes are timed and each file is counted.
+        """
+        metrics = ScanMetrics()
+        checker = CommentChecker("commenting_syntax.csv", metrics)
+        checker.regex_file_summary("Test/gui_controller.py")
+        checker.file_summary("Test/todo.py")
+        self.assertEqual(sorted(metrics.phase_calls), ["build_regex", "classification", "detect_encoding", "findall",
+                                                       "read", "read_csv_file", "scan"])
+        self.assertEqual([(record["file"], record["lines"], record["todos"]) for record in metrics.files],
+                         [("Test/gui_controller.py", 41, 3), ("Test/todo.py", 1, 1)])
+
+    def testNoMetrics(self):
+        """ Test that nothing is collected by default.
+        """
+        self.assertIsNone(CommentChecker("commenting_syntax.csv").metrics)
+
+    def testWorkerMetrics(self):
+        """ Test that metrics from worker processes are merged.
+        """
+        metrics = ScanMetrics()
+        tree_summary("commenting_syntax.csv", ["Test/*.py"], 2, metrics=metrics)
+        self.assertEqual(len(metrics.files), 10)
+        self.assertEqual(metrics.phase_calls["scan"], 10)
+
+    def testExport(self):
+        """ Test exporting the metrics as JSON and in the Prometheus text format.
+        """
+        metrics = ScanMetrics()
+        CommentChecker("commenting_syntax.csv", metrics).file_summary("Test/gui_controller.py")
+        self.assertEqual(json.loads(metrics.to_json())["phases"]["scan"]["calls"], 1)
+        self.assertIn("comment_checker_phase_calls_total{phase=\"scan\"} 1\n", metrics.to_prometheus())
+        self.assertIn("comment_checker_todos_total 3\n", metrics.to_prometheus())
+
+    def testProfileFile(self):
+        """ Test that profiling a single file reads the csv file once, in the read_csv_file phase.
+        """
+        directory = tempfile.mkdtemp()
+        try:
+            csv_file = os.path.join(directory, "commenting_syntax.csv")
+            profile = os.path.join(directory, "profile.json")
+            shutil.copy("commenting_syntax.csv", csv_file)
+            with contextlib.redirect_stdout(io.StringIO()):
+                automated_comment_checker.main([csv_file, "Test/todo.py", "--profile", profile])
+            with open(profile) as file_handler:
+                phases = json.load(file_handler)["phases"]
+            self.assertIsNone(get_checker(csv_file).metrics)
+        finally:
+            shutil.rmtree(directory)
+        self.assertEqual(phases["read_csv_file"]["calls"], 1)
+        self.assertEqual(phases["scan"]["calls"], 1)
+
+
+class TestCompileSyntax(unittest.TestCase):
+
+    """ Test whether compile_syntax and load_syntax work properly.
+    """
+
+    # Most seconds a fresh interpreter may take to load the precompiled syntax and scan one small file
+    COLD_START_BUDGET = 2.0
+
+    def setUp(self):
+        """ Copy the csv file into a temporary directory.
+        """
+        self.directory = tempfile.mkdtemp()
+        self.csv_file = os.path.join(self.directory, "commenting_syntax.csv")
+        shutil.copy("commenting_syntax.csv", self.csv_file)
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def testSameSyntax(self):
+        """ Test that the precompiled syntax is the same as the syntax read from the csv file.
+        """
+        self.assertEqual(compile_syntax(self.csv_file), os.path.join(self.directory, "commenting_syntax.syntax.json"))
+        syntax = load_syntax(self.csv_file)
+        self.assertEqual((syntax["single_commenting_syntax"], syntax["multi_commenting_syntax"],
+                          syntax["extension_list"]), read_csv_file(self.csv_file))
+
+    def testSameSummaries(self):
+        """ Test that a comment checker using the precompiled syntax gives the same summaries.
+        """
+        expected = CommentChecker(self.csv_file)
+        compile_syntax(self.csv_file)
+        checker = CommentChecker(self.csv_file)
+        self.assertEqual(checker.extension_list, expected.extension_list)
+        for file_name in ["Test/gui_controller.py", "Test/TestCaps.JAVA", "Test/compare.c", "Test/index.html"]:
+            self.assertEqual(checker.file_summary(file_name), expected.file_summary(file_name))
+            self.assertEqual(checker.regex_file_summary(file_name), expected.regex_file_summary(file_name))
+
+    def testChangedCSVFile(self):
+        """ Test that the csv file is read again once it changes after being compiled.
+        """
+        compile_syntax(self.csv_file)
+        with open(self.csv_file, 'a') as file_handler:
+            file_handler.write("\n.new,1,#,1,\"<< >>\"")
+        self.assertIsNone(load_syntax(self.csv_file))
+        self.assertIn(".new", CommentChecker(self.csv_file).extension_list)
+
+    def testOlderVersion(self):
+        """ Test that a precompiled syntax file from another version is not used.
+        """
+        syntax_file = compile_syntax(self.csv_file)
+        with open(syntax_file) as file_handler:
+            syntax = json.load(file_handler)
+        syntax["version"] = 0
+        with open(syntax_file, 'w') as file_handler:
+            json.dump(syntax, file_handler)
+        self.assertIsNone(load_syntax(self.csv_file))
+
+    def testBadCSVFile(self):
+        """ Test that a csv file in the wrong format is not compiled.
+        """
+        with open(self.csv_file, 'a') as file_handler:
+            file_handler.write("\n.bad,x")
+        self.assertRaises(CSVFormatError, compile_syntax, self.csv_file)
+        self.assertFalse(os.path.exists(os.path.join(self.directory, "commenting_syntax.syntax.json")))
+
+    def testColdStart(self):
+        """ Test that a fresh interpreter loads the precompiled syntax and scans a file within the budget.
+        """
+        program = os.path.abspath("automated_comment_checker.py")
+        file_name = os.path.abspath("Test/todo.py")
+        subprocess.run([sys.executable, program, self.csv_file, "--compile-syntax"], stdout=subprocess.PIPE,
+                       check=True)
+
+        seconds = []
+        for i in range(3):
+            start = time.perf_counter()
+            output = subprocess.run([sys.executable, program, self.csv_file, file_name], stdout=subprocess.PIPE,
+                                    check=True).stdout
+            seconds.append(time.perf_counter() - start)
+        self.assertIn(b"Total # of TODO's : 1", output)
+        self.assertLess(min(seconds), self.COLD_START_BUDGET)
+
+
+class TestSyntaxIndex(unittest.TestCase):
+
+    """ Test whether SyntaxIndex works properly.
+    """
+
+    def setUp(self):
+        self.index = SyntaxIndex([".py", ".PY", ".ts", ".d.ts", "Makefile", ".java"])
+
+    def testIgnoreCase(self):
+        """ Test that extensions are found whatever their case, preferring a key with the same case.
+        """
+        self.assertEqual(self.index.resolve("src/Flight.JaVa"), ".java")
+        self.assertEqual(self.index.resolve(".JAVA"), ".java")
+        self.assertEqual(self.index.resolve("main.PY"), ".PY")
+        self.assertEqual(self.index.resolve("main.Py"), ".py")
+
+    def testLongestExtension(self):
+        """ Test that the longest extension a file name ends with is used.
+        """
+        self.assertEqual(self.index.resolve("types/index.d.ts"), ".d.ts")
+        self.assertEqual(self.index.resolve("types/index.D.TS"), ".d.ts")
+        self.assertEqual(self.index.resolve("index.ts"), ".ts")
+        self.assertEqual(self.index.resolve("archive.tar.ts"), ".ts")
+
+    def testFileName(self):
+        """ Test that keys which aren't extensions match whole file names.
+        """
+        self.assertEqual(self.index.resolve("build/makefile"), "Makefile")
+        self.assertIsNone(self.index.resolve("Makefile.am"))
+        self.assertIsNone(self.index.resolve("README"))
+        self.assertIsNone(self.index.resolve("name."))
+
+    def testShebang(self):
+        """ Test finding the syntax of a script from its "#!" line.
+        """
+        self.assertEqual(self.index.sniff("#!/usr/bin/env python3\n"), ".py")
+        self.assertEqual(self.index.sniff(b"#! /usr/bin/python3.11 -u\n"), ".py")
+        self.assertEqual(self.index.sniff("#!/usr/bin/env -S python -u\n"), ".py")
+        self.assertIsNone(self.index.sniff("#!/bin/sh\n"))
+        self.assertIsNone(self.index.sniff("import os\n"))
+
+    def testShebangScript(self):
+        """ Test scanning a script without an extension, which is only found in trees when asked for.
+        """
+        directory = tempfile.mkdtemp()
+        try:
+            script = os.path.join(directory, "deploy")
+            with open(script, 'w') as file_handler:
+                file_handler.write("#!/usr/bin/env python\n# TODO\nx = 1\n")
+            self.assertEqual(file_summary("commenting_syntax.csv", script), [3, 2, 2, 0, 0, 1])
+            self.assertEqual(list(find_source_files([directory], [".py"])), [])
+            self.assertEqual(list(find_source_files([directory], [".py"], shebang=True)), [script])
+        finally:
+            shutil.rmtree(directory)
+
+    def testTotalsIgnoreCase(self):
+        """ Test that files whose extensions only differ in case are added up together.
+        """
+        extension_totals, grand_totals, file_count = tree_summary("commenting_syntax.csv",
+                                                                  ["Test/TestCaps.JAVA", "Test/Flight.Java"], 1)
+        self.assertEqual(extension_totals, {".java": [154, 56, 12, 44, 4, 2]})
+
+
+class TestKeepGoing(unittest.TestCase):
+
+    """ Test whether scanning trees carries on past files that can't be scanned.
+    """
+
+    def setUp(self):
+        """ Create a directory with a good file, a UTF-16 file that is cut short and a link to a file that doesn't
+        exist.
+        """
+        self.directory = tempfile.mkdtemp()
+        shutil.copy("Test/todo.py", self.directory)
+        with open(os.path.join(self.directory, "wide.py"), 'wb') as file_handler:
+            file_handler.write("# TODO\n".encode("utf-16")[:-1])
+        os.symlink(os.path.join(self.directory, "missing.py"), os.path.join(self.directory, "broken.py"))
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def testFailuresRecorded(self):
+        """ Test that each failure is recorded with its kind and the other files are still scanned.
+        """
+        results = sorted(scan_tree("commenting_syntax.csv", [self.directory], 1, keep_going=True))
+        self.assertEqual([(os.path.basename(file_name), summary, failure and failure[0])
+                          for file_name, summary, failure in results],
+                         [("broken.py", None, "unreadable"), ("todo.py", [1, 1, 1, 0, 0, 1], None),
+                          ("wide.py", None, "decode_error")])
+
+    def testStopsWithoutKeepGoing(self):
+        """ Test that the first failure is raised when not keeping going.
+        """
+        with self.assertRaises((SourceFileNotFoundError, UnicodeDecodeError)):
+            tree_summary("commenting_syntax.csv", [self.directory], 1)
+
+    def testTimeout(self):
+        """ Test that a file taking longer than the time limit is recorded as a timeout.
+        """
+        with open(os.path.join(self.directory, "todo.py"), 'w') as file_handler:
+            file_handler.write("x = 1  # TODO\n" * 200000)
+        results = {os.path.basename(file_name): failure
+                   for file_name, summary, failure in scan_tree("commenting_syntax.csv", [self.directory], 1,
+                                                                keep_going=True, timeout=0.01)}
+        self.assertEqual(results["todo.py"][0], "timeout")
+
+    def testOutput(self):
+        """ Test that the failures and throughput are output at the end, and the number of failures returned.
+        """
+        output, errors = io.StringIO(), io.StringIO()
+        with contextlib.redirect_stdout(output), contextlib.redirect_stderr(errors):
+            failed = output_tree_summary("commenting_syntax.csv", [self.directory], 1, keep_going=True)
+        self.assertEqual(failed, 2)
+        self.assertIn("Total # of files: 1\n", output.getvalue())
+        self.assertIn("Total # of failed files: 2\n  decode_error: 1\n  unreadable: 1\n", output.getvalue())
+        self.assertIn("Scanned 3 files in ", output.getvalue())
+        self.assertIn("wide.py: decode_error: ", errors.getvalue())
+
+    def testNoGlobalTracebackLimit(self):
+        """ Test that importing the program doesn't hide tracebacks for the rest of the process.
+        """
+        output = subprocess.run([sys.executable, "-c", "import sys, automated_comment_checker; "
+                                                       "print(hasattr(sys, 'tracebacklimit'))"],
+                                stdout=subprocess.PIPE, check=True).stdout
+        self.assertEqual(output.strip(), b"False")
+
+
+class TestRecordOutput(unittest.TestCase):
+
+    """ Test whether the machine readable output formats work properly.
+    """
+
+    def records(self, writer_class, file_handler, paths=("Test/*.py",)):
+        """ Write the records of paths with writer_class to file_handler and return the number of failures.
+        """
+        return write_tree_records("commenting_syntax.csv", list(paths), writer_class(file_handler), 1,
+                                  keep_going=True)
+
+    def testJSONLines(self):
+        """ Test that there is a record for every file followed by the same totals as tree_summary.
+        """
+        output = io.StringIO()
+        self.assertEqual(self.records(JSONLinesWriter, output), 0)
+        records = [json.loads(line) for line in output.getvalue().splitlines()]
+        extension_totals, grand_totals, file_count = tree_summary("commenting_syntax.csv", ["Test/*.py"], 1)
+
+        self.assertEqual(len(records), file_count + 1)
+        self.assertEqual({record["type"] for record in records[:-1]}, {"file"})
+        gui_controller = [record for record in records if record.get("file") == "Test/gui_controller.py"][0]
+        self.assertEqual([gui_controller[field] for field in SUMMARY_FIELDS], [41, 37, 19, 18, 2, 3])
+        self.assertEqual(records[-1]["files"], file_count)
+        self.assertEqual([records[-1][field] for field in SUMMARY_FIELDS], grand_totals)
+        self.assertEqual([records[-1]["extensions"][".py"][field] for field in SUMMARY_FIELDS],
+                         extension_totals[".py"])
+
+    def testFailure(self):
+        """ Test that a file that failed has a record with its failure.
+        """
+        directory = tempfile.mkdtemp()
+        try:
+            with open(os.path.join(directory, "wide.py"), 'wb') as file_handler:
+                file_handler.write("# TODO\n".encode("utf-16")[:-1])
+            output = io.StringIO()
+            self.assertEqual(self.records(JSONLinesWriter, output, [directory]), 1)
+            records = [json.loads(line) for line in output.getvalue().splitlines()]
+            self.assertEqual(records[0]["failure"], "decode_error")
+            self.assertEqual((records[1]["files"], records[1]["failed"], records[1]["failures"]),
+                             (0, 1, {"decode_error": 1}))
+        finally:
+            shutil.rmtree(directory)
+
+    def testCSV(self):
+        """ Test that the CSV rows have the same counts as the JSON Lines records.
+        """
+        output = io.StringIO(newline="")
+        self.records(CSVWriter, output)
+        rows = list(csv.DictReader(io.StringIO(output.getvalue())))
+        output = io.StringIO()
+        self.records(JSONLinesWriter, output)
+        records = [json.loads(line) for line in output.getvalue().splitlines()]
+
+        self.assertEqual([(row["file"], [int(row[field]) for field in SUMMARY_FIELDS])
+                          for row in rows if row["type"] == "file"],
+                         [(record["file"], [record[field] for field in SUMMARY_FIELDS]) for record in records[:-1]])
+        self.assertEqual([row["type"] for row in rows[-2:]], ["extension", "totals"])
+        self.assertEqual(int(rows[-1]["file"]), records[-1]["files"])
+
+    def testColumnar(self):
+        """ Test that the columnar file reads back as the JSON Lines records, across several batches.
+        """
+        output = io.StringIO()
+        self.records(JSONLinesWriter, output)
+        records = [json.loads(line) for line in output.getvalue().splitlines()]
+
+        batch_size = comment_output.COLUMNAR_BATCH_SIZE
+        comment_output.COLUMNAR_BATCH_SIZE = 3
+        try:
+            output = io.BytesIO()
+            self.records(ColumnarWriter, output)
+        finally:
+            comment_output.COLUMNAR_BATCH_SIZE = batch_size
+
+        self.assertEqual(output.getvalue().count(b"B\x03\x00\x00\x00"), len(records) // 3)
+        output.seek(0)
+        self.assertEqual(list(read_columnar(output)), records)
+
+
+class TestEncodings(unittest.TestCase):
+
+    """ Test whether files in different encodings are scanned properly.
+    """
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.checker = CommentChecker("commenting_syntax.csv")
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def write(self, name, contents):
+        """ Write contents to the file name in the temporary directory and return its path.
+        """
+        file_name = os.path.join(self.directory, name)
+        with open(file_name, 'wb') as file_handler:
+            file_handler.write(contents)
+        return file_name
+
+    def testLatin1(self):
+        """ Test that a file that isn't UTF-8 is scanned without being decoded.
+        """
+        file_name = self.write("latin.py", b"x = 1  # caf\xe9 TODO\n\xe9\n'''\nbloc\xe9\n'''\n")
+        self.assertEqual(self.checker.file_summary(file_name), [5, 4, 1, 3, 1, 1])
+        self.assertEqual(self.checker.mmap_file_summary(file_name), [5, 4, 1, 3, 1, 1])
+        self.assertEqual(self.checker.text_file_summary(file_name, "latin-1"), [5, 4, 1, 3, 1, 1])
+        with self.assertRaises(UnicodeDecodeError):
+            self.checker.text_file_summary(file_name, "utf-8")
+
+    def testUTF16(self):
+        """ Test that files with a UTF-16 or UTF-32 byte order mark are decoded before they are scanned.
+        """
+        text = "x = 1;  // TODO\n/* a\nb */\n"
+        for contents in [text.encode("utf-16"), codecs.BOM_UTF16_BE + text.encode("utf-16-be"), text.encode("utf-32")]:
+            file_name = self.write("wide.c", contents)
+            self.assertEqual(self.checker.file_summary(file_name), [3, 3, 1, 2, 1, 1])
+            self.assertEqual(self.checker.buffer_summary(".c", contents), [3, 3, 1, 2, 1, 1])
+
+    def testDetectEncoding(self):
+        """ Test finding the encoding of files.
+        """
+        for contents, encoding in [(b"", "ascii"), (b"x = 1\n", "ascii"), ("caf\xe9".encode(), "utf-8"),
+                                   (b"caf\xe9", "unknown-8bit"), ("﻿x".encode(), "utf-8-sig"),
+                                   ("x".encode("utf-16"), "utf-16"), ("x".encode("utf-32"), "utf-32"),
+                                   (b"x" * ((1 << 20) - 1) + "\xe9".encode(), "utf-8"),
+                                   (b"x" * (1 << 20) + "\xe9".encode()[:1], "unknown-8bit")]:
+            file_handler = io.BytesIO(contents)
+            self.assertEqual(detect_encoding(file_handler), encoding)
+            self.assertEqual(file_handler.tell(), 0)
+
+    def testEncodingMetrics(self):
+        """ Test that the encoding of each file is counted in the metrics.
+        """
+        metrics = ScanMetrics()
+        checker = CommentChecker("commenting_syntax.csv", metrics)
+        checker.file_summary("Test/todo.py")
+        checker.file_summary(self.write("latin.py", b"# caf\xe9\n"))
+        self.assertEqual(metrics.encodings, {"ascii": 1, "unknown-8bit": 1})
+        self.assertEqual(json.loads(metrics.to_json())["encodings"], {"ascii": 1, "unknown-8bit": 1})
+        self.assertIn('comment_checker_encoding_files_total{encoding="unknown-8bit"} 1\n', metrics.to_prometheus())
+
+
+class TestLexer(unittest.TestCase):
+
+    """ Test whether the lexer skips string literals and counts nested block comments properly.
+    """
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.checker = CommentChecker("commenting_syntax.csv")
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def write(self, name, contents):
+        """ Write contents to the file name in the temporary directory and return its path.
+        """
+        file_name = os.path.join(self.directory, name)
+        with open(file_name, 'wb') as file_handler:
+            file_handler.write(contents)
+        return file_name
+
+    def testStringLiterals(self):
+        """ Test that commenting syntax inside string literals isn't counted, even with escaped delimiters.
+        """
+        file_name = self.write("url.js", b'var url = "http://example.com";\nvar s = \'/* \\\' */\'; // TODO\n'
+                                         b'var t = "a \\" // b";\n')
+        self.assertEqual(self.checker.lexer_file_summary(file_name), [3, 1, 1, 0, 0, 1])
+        self.assertEqual(self.checker.file_summary(file_name), [3, 4, 3, 1, 1, 1])
+
+    def testEmptyString(self):
+        """ Test that an empty string in Python is a string literal, not the start of a docstring.
+        """
+        file_name = self.write("empty.py", b"x = ''  # c\ny = 1\n# d\n'''doc\nstring'''\n")
+        self.assertEqual(self.checker.lexer_file_summary(file_name), [5, 4, 2, 2, 1, 0])
+
+    def testUnterminatedString(self):
+        """ Test that a string literal that isn't closed ends at the end of its line.
+        """
+        file_name = self.write("quote.c", b"char *s = \"abc\n/* comment */\n")
+        self.assertEqual(self.checker.lexer_file_summary(file_name), [2, 1, 0, 1, 1, 0])
+
+    def testNestedD(self):
+        """ Test that nesting block comments in D are counted as one comment over all their lines.
+        """
+        file_name = self.write("nested.d", b"/+ outer\n/+ inner +/\nstill outer TODO\n+/\nint x; /* a /* b */\n")
+        self.assertEqual(self.checker.lexer_file_summary(file_name), [5, 5, 0, 5, 2, 1])
+
+    def testNestedHaskell(self):
+        """ Test that nesting block comments in Haskell are counted as one comment.
+        """
+        file_name = self.write("nested.hs", b"{- a {- b -} c -}\nmain = putStrLn \"{- not a comment\"\n-- done\n")
+        self.assertEqual(self.checker.lexer_file_summary(file_name), [3, 2, 1, 1, 1, 0])
+
+    def testUnterminatedBlock(self):
+        """ Test that a block comment that is never closed runs to the end of the file.
+        """
+        file_name = self.write("open.java", b"int x;\n/* never\nclosed\n")
+        self.assertEqual(self.checker.lexer_file_summary(file_name), [3, 2, 0, 2, 1, 0])
+
+    def testLongestSyntax(self):
+        """ Test that the longest commenting syntax starting at a position wins.
+        """
+        file_name = self.write("doc.cs", b"/// summary\n/** doc */\n")
+        self.assertEqual(self.checker.lexer_file_summary(file_name), [2, 2, 1, 1, 1, 0])
+
+    def testSameAsScan(self):
+        """ Test that the lexer agrees with the line by line scan on files without strings, nesting or unclosed
+        block comments.
+        """
+        for file_name in ["Test/Flight.Java", "Test/compare.c", "Test/gui_controller.py", "Test/index.html",
+                          "Test/style.css", "Test/Multi_line_on_one_line.java"]:
+            self.assertEqual(self.checker.lexer_file_summary(file_name), self.checker.file_summary(file_name))
+
+    def testUTF16(self):
+        """ Test that files with a UTF-16 byte order mark are lexed after decoding them.
+        """
+        file_name = self.write("wide.c", "x = \"//\";  // TODO\n/* a\nb */\n".encode("utf-16"))
+        self.assertEqual(self.checker.lexer_file_summary(file_name), [3, 3, 1, 2, 1, 1])
+
+    def testReadLexerOptions(self):
+        """ Test reading the lexer options from the .csv file.
+        """
+        options = read_lexer_options("commenting_syntax.csv")
+        self.assertEqual(options[".d"], {"strings": ['"', "'"], "escape": "\\", "nested": ["/+", "/++"]})
+        self.assertEqual(options[".sql"], {"strings": ["'"]})
+        self.assertNotIn(".html", options)
+
+    def testBadLexerOptions(self):
+        """ Test that unknown options and nesting syntaxes that aren't multi line syntaxes are wrong formats.
+        """
+        for cell in ["colour=red", "strings", "nested=//"]:
+            csv_file = os.path.join(self.directory, "bad.csv")
+            with open(csv_file, 'w') as file_handler:
+                file_handler.write(".js,1,//,1,/* */,{}\n".format(cell))
+            with self.assertRaises(CSVFormatError):
+                read_lexer_options(csv_file)
+
+    def testEngineCommandLine(self):
+        """ Test choosing the lexer on the command line for a single file and for a directory.
+        """
+        file_name = self.write("url.js", b'var url = "http://example.com";  // TODO\n')
+        for path in [file_name, self.directory]:
+            output = subprocess.run([sys.executable, "automated_comment_checker.py", "commenting_syntax.csv", path,
+                                     "--engine", "lexer", "--no-cache", "-j", "1"], stdout=subprocess.PIPE,
+                                    check=True, universal_newlines=True).stdout
+            self.assertIn("Total # of comment lines: 1\n", output)
+
+
+class TestDelimiterTrie(unittest.TestCase):
+
+    """ Test whether the delimiter trie finds commenting syntaxes and the same comments as the line by line scan.
+    """
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.checker = CommentChecker("commenting_syntax.csv")
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def testLongestSyntax(self):
+        """ Test that the longest syntax starting at each position is found, including overlapping syntaxes.
+        """
+        trie = DelimiterTrie([b"//", b"///"], [b"/*", b"*/", b"/**", b"*/", b"/+", b"+/"])
+        self.assertEqual([(match.start(), match.group(1)) for match in trie.regex.finditer(b"x /// /**/ +/")],
+                         [(2, b"///"), (3, b"//"), (6, b"/**"), (8, b"*/"), (11, b"+/")])
+
+    def testSameAsScan(self):
+        """ Test that the delimiter trie agrees with the line by line scan on the synthetic corpus.
+        """
+        for file_name in generate_corpus(self.directory, scale=1):
+            self.assertEqual(self.checker.trie_file_summary(file_name), self.checker.file_summary(file_name))
+
+    def testOverlappingSyntax(self):
+        """ Test that an ending syntax overlapping its starting syntax doesn't close the block comment.
+        """
+        file_name = os.path.join(self.directory, "overlap.java")
+        with open(file_name, 'w') as file_handler:
+            file_handler.write("/*/ TODO\nx */\n/*/\n")
+        self.assertEqual(self.checker.trie_file_summary(file_name), [3, 2, 0, 2, 1, 1])
+        self.assertEqual(self.checker.file_summary(file_name), [3, 2, 0, 2, 1, 1])
+
+
+class TestComments(unittest.TestCase):
+
+    """ Test whether the comments in a file are yielded one at a time with their locations.
+    """
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def testLocations(self):
+        """ Test the kind, lines, byte offsets and TODO flag of each comment.
+        """
+        file_name = os.path.join(self.directory, "locations.java")
+        with open(file_name, 'wb') as file_handler:
+            file_handler.write(b"int x;  // TODO\n\n/* one\ntwo */ int y;\n/** doc */\n")
+        self.assertEqual(list(file_comments("commenting_syntax.csv", file_name)),
+                         [Comment("single", 1, 1, 8, 15, True), Comment("block", 3, 4, 17, 30, False),
+                          Comment("block", 5, 5, 38, 48, False)])
+
+    def testSameAsSummary(self):
+        """ Test that the comments add up to the counts in the summary.
+        """
+        for file_name in ["Test/Flight.Java", "Test/compare.c", "Test/gui_controller.py", "Test/style.css"]:
+            summary = file_summary("commenting_syntax.csv", file_name)
+            comments = list(file_comments("commenting_syntax.csv", file_name))
+            self.assertEqual(sum(comment.end_line - comment.start_line + 1 for comment in comments), summary[1])
+            self.assertEqual(sum(comment.end_line - comment.start_line + 1 for comment in comments
+                                 if comment.kind == "block"), summary[3])
+            self.assertEqual(sum(comment.kind == "block" for comment in comments), summary[4])
+            self.assertEqual(sum(comment.is_todo for comment in comments), summary[5])
+
+    def testLazy(self):
+        """ Test that comments are found as they are asked for.
+        """
+        comments = iter_comments(b"# a\n" * 1000, [b"#"], [b"<#", b"#>"])
+        self.assertEqual(next(comments), Comment("single", 1, 1, 0, 3, False))
+        self.assertEqual(next(comments).start_line, 2)
+
+    def testUnknownSyntax(self):
+        """ Test that a file without commenting syntax in the .csv file raises an error as soon as it is iterated.
+        """
+        with self.assertRaises(UnknownSyntaxError):
+            next(file_comments("commenting_syntax.csv", "README.txt"))
+
+
+class TestMarkers(unittest.TestCase):
+
+    """ Test whether markers are found in comments and indexed properly.
+    """
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.source = os.path.join(self.directory, "src")
+        os.mkdir(self.source)
+        self.write("a.py", "x = 1  # TODO(alice): fix PROJ-12 soon\n'''\nFIXME #7 and XXX\nHACK(bob)\n'''\n"
+                           "TODO = 2  # TODOS aren't markers\n")
+        self.write("b.c", "/* XXX */ int a;  // TODO(team-x) #4 later\n")
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def write(self, name, contents):
+        """ Write contents to the file name in the source directory.
+        """
+        with open(os.path.join(self.source, name), 'w') as file_handler:
+            file_handler.write(contents)
+
+    def testFileMarkers(self):
+        """ Test finding the tag, position, owner, issue and text of every marker in comments only.
+        """
+        self.assertEqual(file_markers("commenting_syntax.csv", os.path.join(self.source, "a.py")),
+                         [Marker("TODO", 1, 10, "alice", "PROJ-12", "fix PROJ-12 soon"),
+                          Marker("FIXME", 3, 1, None, "#7", "#7 and XXX"), Marker("XXX", 3, 14, None, None, ""),
+                          Marker("HACK", 4, 1, "bob", None, "")])
+
+    def testEveryMarkerCounted(self):
+        """ Test that every marker in a comment is counted, unlike the TODO's in the summary.
+        """
+        markers = file_markers("commenting_syntax.csv", "Test/two_to_dos_same_line.py")
+        self.assertEqual(count_markers(markers), {"TODO": 2})
+        self.assertEqual(file_summary("commenting_syntax.csv", "Test/two_to_dos_same_line.py")[5], 1)
+
+    def testCustomTags(self):
+        """ Test looking for other markers.
+        """
+        markers = file_markers("commenting_syntax.csv", os.path.join(self.source, "b.c"), ["NOTE", "XXX"])
+        self.assertEqual([marker.tag for marker in markers], ["XXX"])
+
+    def testIndex(self):
+        """ Test that the index only scans changed files, answers queries and forgets deleted files.
+        """
+        cache_directory = os.path.join(self.directory, "cache")
+        with MarkerIndex("commenting_syntax.csv", directory=cache_directory) as index:
+            self.assertEqual(index.update([self.source], 1), 2)
+            self.assertEqual(index.counts(), {"FIXME": 1, "HACK": 1, "TODO": 2, "XXX": 2})
+
+        with MarkerIndex("commenting_syntax.csv", directory=cache_directory) as index:
+            self.assertEqual(index.update([self.source], 1), 0)
+            self.assertEqual([(os.path.basename(path), marker.line) for path, marker in index.query("TODO")],
+                             [("a.py", 1), ("b.c", 1)])
+            self.assertEqual([marker.owner for path, marker in index.query(owner="team-x")], ["team-x"])
+            self.assertEqual([marker.tag for path, marker in index.query(issue="#7")], ["FIXME"])
+
+            os.remove(os.path.join(self.source, "a.py"))
+            self.write("b.c", "// FIXME\n")
+            self.assertEqual(index.update([self.source], 1), 1)
+            self.assertEqual(index.counts(), {"FIXME": 1})
+
+        with MarkerIndex("commenting_syntax.csv", ["FIXME", "NOTE"], cache_directory) as index:
+            self.assertEqual(index.update([self.source], 1), 1)
+
+    def testSharedIndex(self):
+        """ Test that the counts only cover the tree just updated and the markers being looked for, when other
+        trees and other markers share the index.
+        """
+        cache_directory = os.path.join(self.directory, "cache")
+        other = os.path.join(self.directory, "other")
+        os.mkdir(other)
+        with open(os.path.join(other, "c.py"), 'w') as file_handler:
+            file_handler.write("# TODO other tree\n# NOTE other markers\n")
+
+        with MarkerIndex("commenting_syntax.csv", directory=cache_directory) as index:
+            index.update([other], 1)
+        with MarkerIndex("commenting_syntax.csv", ["NOTE", "TODO"], cache_directory) as index:
+            index.update([self.source], 1)
+            self.assertEqual(index.counts(), {"TODO": 2})
+        with MarkerIndex("commenting_syntax.csv", directory=cache_directory) as index:
+            self.assertEqual(index.update([self.source], 1), 2)
+            self.assertEqual(index.counts(), {"FIXME": 1, "HACK": 1, "TODO": 2, "XXX": 2})
+
+
+class TestCommentDaemon(unittest.TestCase):
+
+    """ Test whether the daemon keeps the totals up to date and answers requests properly.
+    """
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.write("a.py", "# TODO one\nx = 1\n")
+        self.write("b.c", "/* a\nb */ int x;\n")
+        self.daemon = CommentDaemon("commenting_syntax.csv", [self.directory])
+
+    def tearDown(self):
+        self.daemon.stop()
+        shutil.rmtree(self.directory)
+
+    def write(self, name, contents):
+        """ Write contents to the file name in the temporary directory.
+        """
+        with open(os.path.join(self.directory, name), 'w') as file_handler:
+            file_handler.write(contents)
+
+    def testRefresh(self):
+        """ Test that only new and changed files are scanned and that the totals follow them.
+        """
+        self.assertEqual(self.daemon.refresh(), 2)
+        self.assertEqual(self.daemon.refresh(), 0)
+        self.assertEqual(self.daemon.totals()["comment_lines"], 3)
+
+        self.write("a.py", "# TODO one\n# two\nx = 1\n")
+        os.remove(os.path.join(self.directory, "b.c"))
+        with open(os.path.join(self.directory, "wide.py"), 'wb') as file_handler:
+            file_handler.write("# x\n".encode("utf-16")[:-1])
+        self.assertEqual(self.daemon.refresh(), 2)
+        totals = self.daemon.totals()
+        self.assertEqual((totals["files"], totals["comment_lines"], totals["failed"]), (1, 2, 1))
+        self.assertEqual(list(totals["extensions"]), [".py"])
+        self.assertEqual(list(self.daemon.failures()), [os.path.join(os.path.abspath(self.directory), "wide.py")])
+
+    def testRequests(self):
+        """ Test answering JSON-RPC requests, notifications and bad requests.
+        """
+        self.daemon.refresh()
+        file_name = os.path.join(self.directory, "a.py")
+        responses = [json.loads(self.daemon.handle(json.dumps(request))) for request in [
+            {"jsonrpc": "2.0", "id": 1, "method": "summary", "params": {"file": file_name}},
+            {"jsonrpc": "2.0", "id": 2, "method": "summary", "params": {"name": file_name}},
+            {"jsonrpc": "2.0", "id": 3, "method": "summary", "params": {"file": "README.txt"}},
+            {"jsonrpc": "2.0", "id": 4, "method": "missing"}]]
+        self.assertEqual(responses[0]["result"]["todos"], 1)
+        self.assertEqual([response.get("error", {}).get("code") for response in responses],
+                         [None, -32602, -32000, -32601])
+        self.assertEqual(json.loads(self.daemon.handle("{"))["error"]["code"], -32700)
+        self.assertIsNone(self.daemon.handle(json.dumps({"jsonrpc": "2.0", "method": "refresh"})))
+
+    def testServe(self):
+        """ Test answering requests from a stream until told to shut down.
+        """
+        self.daemon.start()
+        output = io.StringIO()
+        self.daemon.serve(io.StringIO('{"jsonrpc": "2.0", "id": 1, "method": "totals"}\n\n'
+                                      '{"jsonrpc": "2.0", "id": 2, "method": "shutdown"}\n'
+                                      '{"jsonrpc": "2.0", "id": 3, "method": "totals"}\n'), output)
+        responses = [json.loads(line) for line in output.getvalue().splitlines()]
+        self.assertEqual([response["id"] for response in responses], [1, 2])
+        self.assertEqual(responses[0]["result"]["files"], 2)
+        self.assertTrue(self.daemon.is_stopped())
+
+    @unittest.skipUnless(hasattr(socket, "AF_UNIX"), "needs Unix sockets")
+    def testSocket(self):
+        """ Test answering requests on a Unix socket.
+        """
+        self.daemon.refresh()
+        socket_path = os.path.join(self.directory, "daemon.sock")
+        server = threading.Thread(target=self.daemon.serve_socket, args=(socket_path,))
+        server.start()
+        for i in range(100):
+            if os.path.exists(socket_path):
+                break
+            time.sleep(0.01)
+
+        with socket.socket(socket.AF_UNIX) as client:
+            client.connect(socket_path)
+            client.sendall(b'{"jsonrpc": "2.0", "id": 1, "method": "totals"}\n'
+                           b'{"jsonrpc": "2.0", "id": 2, "method": "shutdown"}\n')
+            lines = client.makefile('rb').read().splitlines()
+        server.join(5)
+
+        self.assertEqual(json.loads(lines[0])["result"]["todos"], 1)
+        self.assertFalse(server.is_alive())
+        self.assertFalse(os.path.exists(socket_path))
+
+    @unittest.skipUnless(hasattr(socket, "AF_UNIX"), "needs Unix sockets")
+    def testSocketPathTaken(self):
+        """ Test that a file that isn't a socket is left alone rather than replaced by the socket.
+        """
+        socket_path = os.path.join(self.directory, "a.py")
+        self.assertRaises(CommentCheckerError, self.daemon.serve_socket, socket_path)
+        with open(socket_path) as file_handler:
+            self.assertEqual(file_handler.read(), "# TODO one\nx = 1\n")
+
+    def testSyntaxChange(self):
+        """ Test that files are scanned again with the new syntaxes when the csv file changes.
+        """
+        csv_file = os.path.join(self.directory, "syntax.csv")
+        with open(csv_file, 'w') as file_handler:
+            file_handler.write(".py,1,#,1,/* */\n")
+        daemon = CommentDaemon(csv_file, [os.path.join(self.directory, "a.py")])
+        self.assertEqual(daemon.refresh(), 1)
+        self.assertEqual(daemon.totals()["comment_lines"], 1)
+
+        with open(csv_file, 'w') as file_handler:
+            file_handler.write(".py,1,= ,1,/* */\n")
+        self.assertEqual(daemon.refresh(), 1)
+        self.assertEqual(daemon.totals()["comment_lines"], 1)
+        self.assertEqual(daemon.summary(os.path.join(self.directory, "a.py"))["todos"], 0)
+        self.assertEqual(daemon.refresh(), 0)
+
+    def testRefreshOneAtATime(self):
+        """ Test that a refresh waits for one that is already running.
+        """
+        self.daemon._refreshing.acquire()
+        refresh = threading.Thread(target=self.daemon.refresh)
+        refresh.start()
+        refresh.join(0.2)
+        self.assertTrue(refresh.is_alive())
+        self.assertEqual(self.daemon.totals()["files"], 0)
+        self.daemon._refreshing.release()
+        refresh.join(5)
+        self.assertEqual(self.daemon.totals()["files"], 2)
+
+
+class TestChunkedScan(unittest.TestCase):
+
+    """ Test whether scanning a file in chunks gives exactly the same summary as scanning it whole.
+    """
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.checker = CommentChecker("commenting_syntax.csv")
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def chunked_summary(self, contents, extension, chunk_size):
+        """ Scan contents in chunks of about chunk_size bytes in this process and merge them.
+        """
+        single_syntax, multi_syntax = self.checker.byte_syntax(extension)
+        chunks, start = [], 0
+        while start < len(contents):
+            end = contents.find(b"\n", start + chunk_size)
+            end = len(contents) if end == -1 else end + 1
+            chunks.append((start, end))
+            start = end
+        # Results come back from the workers in any order
+        results = [(start, scan_chunk(contents, start, end, single_syntax, multi_syntax)) for start, end in chunks]
+        return merge_chunks(contents, chunks, reversed(results), single_syntax, multi_syntax)
+
+    def testCrossingChunks(self):
+        """ Test block comments that cross chunk edges, with commenting syntax and a TODO after the edge.
+        """
+        contents = b"int x; /* one\n// two\n/* TODO */ int y;\n*/ int z; /*\n\n"
+        for chunk_size in range(1, len(contents)):
+            self.assertEqual(self.chunked_summary(contents, ".java", chunk_size),
+                             scan_buffer(contents, *self.checker.byte_syntax(".java")))
+
+    def testSameAsScan(self):
+        """ Test tiny chunks against the line by line scan on the synthetic corpus.
+        """
+        for file_name in generate_corpus(self.directory, seed=5):
+            with open(file_name, 'rb') as file_handler:
+                contents = file_handler.read()
+            extension = os.path.splitext(file_name)[1]
+            for chunk_size in [1, 50, 1000]:
+                self.assertEqual(self.chunked_summary(contents, extension, chunk_size),
+                                 scan_buffer(contents, *self.checker.byte_syntax(extension)))
+
+    def testWorkers(self):
+        """ Test that chunks scanned by worker processes give the same summary as file_summary.
+        """
+        for file_name in ["Test/Flight.Java", "Test/compare.c", "Test/gui_controller.py"]:
+            self.assertEqual(self.checker.chunked_file_summary(file_name, workers=2, chunk_size=500),
+                             self.checker.file_summary(file_name))
+
+    def testSmallResult(self):
+        """ Test that what a worker sends back for a chunk doesn't grow with the number of comments in it.
+        """
+        single_syntax, multi_syntax = self.checker.byte_syntax(".java")
+        sizes = [len(pickle.dumps(scan_chunk(contents, 0, len(contents), single_syntax, multi_syntax)))
+                 for contents in [b"x; // c\n/* a\n", b"x; // c\n" * 10000 + b"/* a\n"]]
+        self.assertLess(sizes[1], 2 * sizes[0])
+
+    def testThreshold(self):
+        """ Test that only files of at least CHUNK_THRESHOLD bytes scanned line by line are scanned in chunks,
+        including in a tree.
+        """
+        self.assertEqual(summary_method("Test/compare.c"), "file_summary")
+        self.assertEqual(summary_method("Test/compare.c", "lexer"), "lexer_file_summary")
+        whole = tree_summary("commenting_syntax.csv", ["Test"], 1)
+        threshold = automated_comment_checker.CHUNK_THRESHOLD
+        automated_comment_checker.CHUNK_THRESHOLD = 1
+        try:
+            self.assertEqual(summary_method("Test/compare.c"), "chunked_file_summary")
+            self.assertEqual(summary_method("Test/compare.c", "lexer"), "lexer_file_summary")
+            self.assertEqual(tree_summary("commenting_syntax.csv", ["Test"], 2), whole)
+        finally:
+            automated_comment_checker.CHUNK_THRESHOLD = threshold
+
+    def testWorkersPassed(self):
+        """ Test that the number of workers asked for reaches files scanned in chunks, in a tree and on their own.
+        """
+        used = []
+
+        def recorded(checker, file_name, engine="scan", workers=None):
+            if summary_method(file_name, engine) == "chunked_file_summary":
+                used.append(workers)
+            return summarize_file(checker, file_name, engine, workers)
+
+        threshold = automated_comment_checker.CHUNK_THRESHOLD
+        automated_comment_checker.CHUNK_THRESHOLD = 1
+        automated_comment_checker.summarize_file = recorded
+        try:
+            tree_summary("commenting_syntax.csv", ["Test"], 2)
+            with contextlib.redirect_stdout(io.StringIO()):
+                automated_comment_checker.main(["commenting_syntax.csv", "Test/compare.c", "-j", "3"])
+        finally:
+            automated_comment_checker.CHUNK_THRESHOLD = threshold
+            automated_comment_checker.summarize_file = summarize_file
+        self.assertTrue(used)
+        self.assertEqual(set(used[:-1]), {2})
+        self.assertEqual(used[-1], 3)
+
+
+class TestCountLines(unittest.TestCase):
+
+    """ Test whether both backends of count_lines count the lines that aren't blank the same way.
+    """
+
+    def setUp(self):
+        self.block_size = automated_comment_checker.NUMPY_BLOCK_SIZE
+
+    def tearDown(self):
+        automated_comment_checker.NUMPY_BLOCK_SIZE = self.block_size
+
+    def testRegex(self):
+        """ Test that only lines with something other than whitespace on them are counted.
+        """
+        self.assertEqual(count_lines(b"a\n \t\r\n\n\x0c\x1c b\nc", backend="regex"), 3)
+        self.assertEqual(count_lines(b"a\n\nb\n", 2, backend="regex"), 1)
+
+    @unittest.skipUnless(load_numpy(), "needs NumPy")
+    def testNumPy(self):
+        """ Test that NumPy counts the same lines as the regexes, with lines crossing the blocks it looks at.
+        """
+        rnd = random.Random(0)
+        for i in range(500):
+            buffer = bytes(rnd.choice(b" \t\r\n\x0b\x0c\x1c\x1fab\x85\xa0") for j in range(rnd.randint(0, 60)))
+            automated_comment_checker.NUMPY_BLOCK_SIZE = rnd.randint(1, 8)
+            self.assertEqual(count_lines(buffer, backend="numpy"), count_lines(buffer, backend="regex"))
+
+    @unittest.skipUnless(load_numpy(), "needs NumPy")
+    def testSummary(self):
+        """ Test that the summaries are the same whichever backend counts the lines.
+        """
+        checker = CommentChecker("commenting_syntax.csv")
+        threshold = automated_comment_checker.NUMPY_THRESHOLD
+        for file_name in ["Test/Flight.Java", "Test/compare.c", "Test/gui_controller.py", "Test/style.css"]:
+            summary = checker.mmap_file_summary(file_name)
+            automated_comment_checker.NUMPY_THRESHOLD = 0
+            try:
+                self.assertEqual(checker.mmap_file_summary(file_name), summary)
+            finally:
+                automated_comment_checker.NUMPY_THRESHOLD = threshold
+
+    @unittest.skipIf(load_numpy(), "needs NumPy not to be installed")
+    def testNoNumPy(self):
+        """ Test that asking for NumPy when it isn't installed is an error.
+        """
+        self.assertRaises(CommentCheckerError, count_lines, b"a\n", backend="numpy")
+
+
+class TestRollupTree(unittest.TestCase):
+
+    """ Test whether the rollup tree adds up the files under every directory and keeps them up to date.
+    """
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.tree = RollupTree()
+        self.tree.update("src/pkg/a.py", [10, 4, 2, 2, 1, 1])
+        self.tree.update("./src/b.c", [5, 1, 1, 0, 0, 0])
+        self.tree.update("docs/c.py", [2, 2, 2, 0, 0, 1])
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def testTotals(self):
+        """ Test the totals and comment density of the root, a directory and a file.
+        """
+        self.assertEqual([self.tree.totals()[field] for field in ["files", "total_lines", "todos"]], [3, 17, 2])
+        self.assertEqual(self.tree.totals("src")["comment_density"], 5 / 15)
+        self.assertEqual(self.tree.totals("src/pkg/a.py")["comment_lines"], 4)
+        self.assertIsNone(self.tree.totals("lib"))
+
+    def testUpdate(self):
+        """ Test that changing and removing a file updates its directories and removes the ones left empty.
+        """
+        self.tree.update("src/pkg/a.py", [20, 4, 2, 2, 1, 0])
+        self.assertEqual([self.tree.totals("src")[field] for field in ["files", "total_lines", "todos"]], [2, 25, 0])
+        self.assertTrue(self.tree.remove("src/pkg/a.py"))
+        self.assertFalse(self.tree.remove("src/pkg/a.py"))
+        self.assertIsNone(self.tree.node("src/pkg"))
+        self.assertEqual(self.tree.totals()["total_lines"], 7)
+        self.assertRaises(ValueError, self.tree.update, "src/b.c/d.py", [1, 0, 0, 0, 0, 0])
+
+    def testSerialize(self):
+        """ Test saving and loading the tree, and that a tree saved part of the way down isn't loaded.
+        """
+        file_name = os.path.join(self.directory, "rollup.json")
+        self.tree.save(file_name)
+        self.assertEqual(RollupTree.load(file_name).to_dict(), self.tree.to_dict())
+        self.assertEqual(list(self.tree.to_dict("src", 1)["children"]), ["b.c", "pkg"])
+        self.assertNotIn("children", self.tree.to_dict("src", 1)["children"]["pkg"])
+        self.assertRaises(CommentCheckerError, RollupTree.from_dict, self.tree.to_dict(depth=1))
+
+    def testTree(self):
+        """ Test that the root of a scanned tree has the same totals as tree_summary.
+        """
+        rollup = RollupTree()
+        with contextlib.redirect_stdout(io.StringIO()):
+            output_tree_summary("commenting_syntax.csv", ["Test"], 1, rollup=rollup)
+        extension_totals, grand_totals, file_count = tree_summary("commenting_syntax.csv", ["Test"], 1)
+        totals = rollup.totals("Test")
+        self.assertEqual([totals[field] for field in SUMMARY_FIELDS], grand_totals)
+        self.assertEqual(totals["files"], file_count)
+
+    def testDaemon(self):
+        """ Test that the daemon keeps a rollup of the files it watches.
+        """
+        os.makedirs(os.path.join(self.directory, "pkg"))
+        with open(os.path.join(self.directory, "pkg", "a.py"), 'w') as file_handler:
+            file_handler.write("# TODO one\nx = 1\n")
+        daemon = CommentDaemon("commenting_syntax.csv", [self.directory])
+        daemon.refresh()
+        response = json.loads(daemon.handle(json.dumps({"jsonrpc": "2.0", "id": 1, "method": "rollup",
+                                                        "params": {"directory": self.directory}})))
+        self.assertEqual(response["result"]["children"]["pkg"]["todos"], 1)
+        os.remove(os.path.join(self.directory, "pkg", "a.py"))
+        daemon.refresh()
+        self.assertIsNone(daemon.rollup(self.directory))
+
+
+class TestArchives(unittest.TestCase):
+
+    """ Test whether files are scanned straight out of tar and zip archives, the same as the extracted tree.
+    """
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.tree = os.path.join(self.directory, "src")
+        shutil.copytree("Test", self.tree)
+        os.makedirs(os.path.join(self.tree, ".git"))
+        with open(os.path.join(self.tree, ".git", "hook.py"), 'w') as file_handler:
+            file_handler.write("# hidden\n")
+        with open(os.path.join(self.tree, "run"), 'w') as file_handler:
+            file_handler.write("#!/usr/bin/env python\n# TODO run\n")
+
+        self.archives = [os.path.join(self.directory, name) for name in ["src.tar.gz", "src.tar.xz", "src.zip"]]
+        for archive_name, mode in zip(self.archives[:2], ["w:gz", "w:xz"]):
+            with tarfile.open(archive_name, mode) as archive:
+                archive.add(self.tree, "src")
+        with zipfile.ZipFile(self.archives[2], 'w') as archive:
+            for root, dirs, files in os.walk(self.tree):
+                for name in files:
+                    archive.write(os.path.join(root, name), os.path.relpath(os.path.join(root, name), self.directory))
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def testSameAsTree(self):
+        """ Test that every file in each archive has the same summary as the extracted file.
+        """
+        expected = {os.path.relpath(file_name, self.directory): summary for file_name, summary, failure
+                    in scan_tree("commenting_syntax.csv", [self.tree], 1, shebang=True)}
+        for archive_name in self.archives:
+            results = {os.path.relpath(file_name, archive_name): summary for file_name, summary, failure
+                       in scan_archives("commenting_syntax.csv", [archive_name], 1, shebang=True)}
+            self.assertEqual(results, expected)
+        self.assertIn(os.path.join("src", "run"), expected)
+
+    def testWorkers(self):
+        """ Test that the totals are the same when files are handed to worker processes in small batches, and that
+        every batch goes to the same pool.
+        """
+        pools = []
+
+        def counted(*args, **kwargs):
+            pools.append(args)
+            return pool_class(*args, **kwargs)
+
+        batch_size = comment_archive.ARCHIVE_BATCH_SIZE
+        pool_class = multiprocessing.Pool
+        comment_archive.ARCHIVE_BATCH_SIZE = 1000
+        multiprocessing.Pool = counted
+        try:
+            results = [(os.path.relpath(file_name, self.archives[0]), summary) for file_name, summary, failure
+                       in scan_archives("commenting_syntax.csv", self.archives[:1], 2)]
+        finally:
+            comment_archive.ARCHIVE_BATCH_SIZE = batch_size
+            multiprocessing.Pool = pool_class
+        self.assertEqual(merge_summaries(results)[1:], tree_summary("commenting_syntax.csv", ["Test"], 1)[1:])
+        self.assertEqual(len(pools), 1)
+
+    def testBadArchive(self):
+        """ Test that an archive that can't be read is an error, or a failure of that archive when keeping going.
+        """
+        file_name = os.path.join(self.directory, "bad.zip")
+        with open(file_name, 'w') as file_handler:
+            file_handler.write("not a zip file")
+        self.assertRaises(ArchiveError, list, scan_archives("commenting_syntax.csv", [file_name], 1))
+
+        # A tarball cut off part of the way through
+        truncated = os.path.join(self.directory, "truncated.tar.gz")
+        with open(self.archives[0], 'rb') as file_handler:
+            contents = file_handler.read()
+        with open(truncated, 'wb') as file_handler:
+            file_handler.write(contents[:len(contents) // 2])
+
+        results = list(scan_archives("commenting_syntax.csv", [file_name, truncated, self.archives[2]], 1,
+                                     keep_going=True))
+        failures = {file_name: failure for file_name, summary, failure in results if failure is not None}
+        self.assertEqual(sorted(failures), [file_name, truncated])
+        self.assertEqual({failure[0] for failure in failures.values()}, {"unreadable"})
+        self.assertEqual(merge_summaries((name, summary) for name, summary, failure in results
+                                         if failure is None and name.startswith(self.archives[2]))[1:],
+                         tree_summary("commenting_syntax.csv", ["Test"], 1)[1:])
+
+
+class TestShards(unittest.TestCase):
+
+    """ Test whether shards split the files the same way every time and merge into the totals of a single run.
+    """
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.file_names = list(find_source_files(["Test"], read_csv_file("commenting_syntax.csv")[2]))
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def partial(self, shard):
+        """ Return the name of the partial results file of shard in the temporary directory.
+        """
+        return os.path.join(self.directory, "shard-{}.json".format(shard))
+
+    def testPartition(self):
+        """ Test that every file is in exactly one shard and that the shards have about the same number of bytes.
+        """
+        partition = partition_files(self.file_names, 3)
+        self.assertEqual(sorted(sum(partition, [])), sorted(self.file_names))
+        self.assertEqual(partition_files(reversed(self.file_names), 3), partition)
+        self.assertEqual(shard_files(self.file_names, 2, 3), partition[1])
+        loads = [sum(os.path.getsize(file_name) for file_name in files) for files in partition]
+        self.assertLessEqual(max(loads) - min(loads), max(os.path.getsize(file_name) for file_name in self.file_names))
+        self.assertRaises(ShardError, parse_shard, "0/3")
+        self.assertRaises(ShardError, parse_shard, "two")
+
+    def testMerge(self):
+        """ Test that the partial results of processes running every shard at once, sharing one result cache, merge
+        into the same totals both when the cache is empty and when it is full.
+        """
+        program = os.path.abspath("automated_comment_checker.py")
+        for run in range(2):
+            processes = [subprocess.Popen([sys.executable, program, os.path.abspath("commenting_syntax.csv"),
+                                           os.path.abspath("Test"), "--shard", "{}/3".format(shard), "--partial",
+                                           self.partial(shard)], cwd=self.directory, stdout=subprocess.PIPE,
+                                          stderr=subprocess.PIPE) for shard in range(1, 4)]
+            for process in processes:
+                output, errors = process.communicate()
+                self.assertEqual((process.returncode, errors), (0, b""))
+
+            extension_totals, grand_totals, file_count, failures = merge_partials([self.partial(shard)
+                                                                                   for shard in range(1, 4)])
+            self.assertEqual((extension_totals, grand_totals, file_count),
+                             tree_summary("commenting_syntax.csv", ["Test"], 1))
+            self.assertEqual(failures, {})
+
+    def testGlobCharacters(self):
+        """ Test that a file whose name looks like a glob pattern is counted once, and the files it would match
+        aren't counted again.
+        """
+        tree = os.path.join(self.directory, "src")
+        os.makedirs(tree)
+        for name, contents in [("[id].js", "// TODO id\nx;\n"), ("i.js", "// i\n"), ("d.js", "d;\n")]:
+            with open(os.path.join(tree, name), 'w') as file_handler:
+                file_handler.write(contents)
+
+        with contextlib.redirect_stdout(io.StringIO()):
+            automated_comment_checker.main(["commenting_syntax.csv", tree, "--no-cache", "--shard", "1/1",
+                                            "--partial", self.partial(1)])
+        extension_totals, grand_totals, file_count, failures = merge_partials([self.partial(1)])
+        self.assertEqual((extension_totals, grand_totals, file_count),
+                         tree_summary("commenting_syntax.csv", [tree], 1))
+        self.assertEqual((file_count, grand_totals[0], grand_totals[5]), (3, 4, 1))
+
+    def testMergeErrors(self):
+        """ Test that partial results missing a shard or from different runs aren't merged.
+        """
+        for shard in range(1, 3):
+            writer = PartialWriter(self.partial(shard), shard, 2, "commenting_syntax.csv")
+            writer.write_totals({}, [0] * 6, 0, {})
+        self.assertRaises(ShardError, merge_partials, [self.partial(1)])
+        self.assertRaises(ShardError, merge_partials, [self.partial(1), self.partial(1)])
+        PartialWriter(self.partial(2), 2, 2, "commenting_syntax.csv", "lexer").write_totals({}, [0] * 6, 0, {})
+        self.assertRaises(ShardError, merge_partials, [self.partial(1), self.partial(2)])
+
+
 if __name__ == '__main__':
     unittest.main()
@@ -7,14 +7,108 @@ Author: Jeremy Shih
 
 # PLEASE READ THE "README.txt" FILE FOR FURTHER INSTRUCTIONS ON HOW TO RUN THE PROGRAM.
 
+import io
 import re
 import os
 import csv
+import glob
+import sys
+import codecs
+import json
+import mmap
+import time
+import signal
+import bisect
 import argparse
+import threading
+import itertools
+import contextlib
+import collections
 
-# Prevent printing stracktrace when raising an exception
-import sys
-sys.tracebacklimit = 0
+from comment_cache import hash_file
+from comment_cache import file_stamp
+from comment_cache import ResultCache
+from comment_metrics import ScanMetrics
+
+# Files at least this big (in bytes) are scanned through mmap instead of line by line, so that a huge file with
+# very long lines (such as minified JavaScript) never has a whole line copied into memory
+MMAP_THRESHOLD = 32 * 1024 * 1024
+
+# Files at least this big (in bytes) are split into chunks of about CHUNK_SIZE bytes, which are scanned in
+# parallel, when scanned from the command line
+CHUNK_THRESHOLD = 256 * 1024 * 1024
+CHUNK_SIZE = 32 * 1024 * 1024
+
+# Spans of at least this many bytes have their lines counted with NumPy, when it is installed, since for shorter
+# spans setting up the arrays costs more than it saves. Spans are looked at NUMPY_BLOCK_SIZE bytes at a time, so
+# that the arrays made from a huge file stay small
+NUMPY_THRESHOLD = 64 * 1024
+NUMPY_BLOCK_SIZE = 16 * 1024 * 1024
+
+# Changing what compile_syntax writes must change this, so that older precompiled syntax files aren't used
+SYNTAX_VERSION = 2
+
+# CommentChecker methods that scan a file with each engine: the line by line scan, which counts comments the
+# way the regexes from build_regex do, or the lexer, which knows about string literals and nesting
+ENGINES = {"scan": "file_summary", "lexer": "lexer_file_summary"}
+
+# Keys of the optional key=value cells after the multi line commenting syntaxes in a row of the .csv file, which
+# tell the lexer about string literals and block comments that nest
+LEXER_OPTIONS = ("strings", "escape", "nested")
+
+# Interpreters named on the "#!" line of scripts, and the file extension whose commenting syntax they use
+SHEBANG_EXTENSIONS = {"python": ".py", "node": ".js", "nodejs": ".js", "rscript": ".r"}
+
+# The interpreter on a "#!" line, and the program "env" runs when that is the interpreter (after any options)
+_SHEBANG = re.compile(r'#!\s*(\S+)(?:[ \t]+(?:-\S*[ \t]+)*([^\s-]\S*))?')
+
+# Stands in for a phase of ScanMetrics when no metrics are being collected
+_NO_PHASE = contextlib.nullcontext()
+
+# Byte order marks and the encoding they start, longest first since the UTF-32 marks start with the UTF-16 ones
+_BYTE_ORDER_MARKS = [(codecs.BOM_UTF32_LE, "utf-32"), (codecs.BOM_UTF32_BE, "utf-32"), (codecs.BOM_UTF8, "utf-8-sig"),
+                     (codecs.BOM_UTF16_LE, "utf-16"), (codecs.BOM_UTF16_BE, "utf-16")]
+
+# Encodings that don't keep ASCII as it is, so files in them have to be decoded before they are scanned
+_WIDE_ENCODINGS = {"utf-16", "utf-32"}
+
+# A line with something other than whitespace on it (the same whitespace that str.rstrip removes from ASCII text)
+_NON_BLANK_LINE = re.compile(rb'^[ \t\r\x0b\x0c\x1c-\x1f]*[^\s\x1c-\x1f]', re.M)
+
+# NumPy once load_numpy has imported it (False when it isn't installed), and whether each byte counts as something
+# on a line for _NON_BLANK_LINE, as a NumPy lookup table
+_numpy = None
+_CONTENT_BYTES = None
+
+
+class CommentCheckerError(Exception):
+    """ Base class for the errors raised by the comment checker.
+    """
+
+
+class CSVFileNotFoundError(CommentCheckerError):
+    """ The .csv file containing the commenting syntaxes could not be found.
+    """
+
+
+class CSVFormatError(CommentCheckerError):
+    """ The .csv file containing the commenting syntaxes is not in the right format.
+    """
+
+
+class UnknownSyntaxError(CommentCheckerError):
+    """ There is no commenting syntax for a file extension in the .csv file.
+    """
+
+
+class SourceFileNotFoundError(CommentCheckerError):
+    """ The file to scan could not be found.
+    """
+
+
+class ScanTimeoutError(CommentCheckerError):
+    """ Scanning a file took longer than the time limit.
+    """
 
 
 def read_csv_file(csv_file):
@@ -45,17 +139,17 @@ def read_csv_file(csv_file):
 
                 # Check if csv file is in right format, if not raise exception
                 if row[1].isdigit() is False:
-                    raise Exception("CSV file is in wrong format.")
+                    raise CSVFormatError("CSV file is in wrong format.")
                 if int(row[1]) == 0:
-                    raise Exception("Need to include single line commenting syntax.")
+                    raise CSVFormatError("Need to include single line commenting syntax.")
 
                 # Index that shows the number of ways to comment block comments
                 multi_num = int(row[1]) + 2
 
                 if row[multi_num].isdigit() is False:
-                    raise Exception("CSV file is in wrong format.")
+                    raise CSVFormatError("CSV file is in wrong format.")
                 if int(row[multi_num]) == 0:
-                    raise Exception("Need to include multi line commenting syntax.")
+                    raise CSVFormatError("Need to include multi line commenting syntax.")
 
                 # if there are more than one ways of single line commenting, add them in the dictionary
                 if int(row[1]) > 1:
@@ -76,12 +170,51 @@ def read_csv_file(csv_file):
                         multi_commenting_syntax[row[0]].append(syntax[1])
 
     except FileNotFoundError:
-        print("Please input csv file from the same folder.")
-        sys.exit(1)
+        raise CSVFileNotFoundError("Please input csv file from the same folder.")
+    except IndexError:
+        raise CSVFormatError("CSV file is in wrong format.")
 
     return single_commenting_syntax, multi_commenting_syntax, extension_list
 
 
+def read_lexer_options(csv_file):
+    """ Read the optional cells after the multi line commenting syntaxes in each row of a csv_file, which the lexer
+    uses to skip over string literals and to nest block comments. Each cell is one of:
+
+        strings=<string delimiters, separated by spaces>
+        escape=<character that escapes the character after it in a string>
+        nested=<starting syntaxes of multi line comments that nest, separated by spaces>
+
+    @param string csv_file:
+    @rtype: dict: the options of each file extension with any, with the strings and nested as lists
+    """
+
+    # Check the rest of the csv file first
+    single_commenting_syntax, multi_commenting_syntax, extension_list = read_csv_file(csv_file)
+    lexer_options = {}
+
+    with open(csv_file, 'r') as csvfile:
+        for row in csv.reader(csvfile, delimiter=','):
+            multi_num = int(row[1]) + 2
+            options = {}
+            for cell in row[multi_num + int(row[multi_num]) + 1:]:
+                if not cell:
+                    continue
+                key, separator, value = cell.partition('=')
+                if not separator or key not in LEXER_OPTIONS:
+                    raise CSVFormatError("CSV file is in wrong format.")
+                options[key] = value if key == "escape" else value.split(' ')
+
+            for syntax in options.get("nested", []):
+                if syntax not in multi_commenting_syntax[row[0]][0::2]:
+                    raise CSVFormatError("Nested commenting syntax must be a multi line commenting syntax.")
+
+            if options:
+                lexer_options[row[0]] = options
+
+    return lexer_options
+
+
 def build_regex(single_commenting_syntax, multi_commenting_syntax, extension):
     """ Build and return a regex for identifying single line comments and a regex for identifying
      both singlie line and multi line comments.
@@ -124,125 +257,2506 @@ def build_regex(single_commenting_syntax, multi_commenting_syntax, extension):
         regex += ")"
         single_line_regex += ")"
     except KeyError:
-        print("Please add the syntax for commenting for that specific langauge in the .csv file to proceed.")
-        sys.exit(1)
+        raise UnknownSyntaxError("Please add the syntax for commenting for that specific langauge in the .csv file "
+                                 "to proceed.")
 
     return single_line_regex, regex
 
 
-def file_summary(csv_file, file_name):
-    """ Scan a file and output the total number of lines, comment lines, single line comments,
-    comment lines within block comments, block line comments, and TODO's in the comments.
+def syntax_file_name(csv_file):
+    """ Return the name of the precompiled syntax file for csv_file, which is kept next to it.
 
     @param str csv_file:
-    @param str file_name:
-    @rtype: list summary:
+    @rtype: str:
+    """
+
+    return os.path.splitext(csv_file)[0] + ".syntax.json"
+
+
+def compile_syntax(csv_file, syntax_file=None):
+    """ Check the csv_file and write its commenting syntaxes, with the regexes for every file extension ready to be
+    compiled, to syntax_file, so that later runs don't have to parse the csv_file or build the regexes again.
+    Returns the name of the file written.
+
+    @param str csv_file:
+    @param str syntax_file: (defaults to syntax_file_name(csv_file))
+    @rtype: str:
     """
 
-    # Read csv file and keep commenting syntax in two dictionaries using helper function
+    syntax_file = syntax_file or syntax_file_name(csv_file)
     single_commenting_syntax, multi_commenting_syntax, extension_list = read_csv_file(csv_file)
 
-    # Import file and read lines without newline character and blank lines (for total number of lines)
+    patterns = {}
+    for extension in single_commenting_syntax:
+        single_line_regex, regex = build_regex(single_commenting_syntax, multi_commenting_syntax, extension)
+        regex = label_regex(single_line_regex, regex)
+        try:
+            re.compile(single_line_regex)
+            re.compile(regex)
+        except re.error:
+            # Leave it out, so that build_regex reports the syntax the regexes can't handle if they are ever used
+            continue
+        patterns[extension] = [single_line_regex, regex]
+
+    syntax = {"version": SYNTAX_VERSION, "csv_hash": hash_file(csv_file), "extension_list": extension_list,
+              "single_commenting_syntax": single_commenting_syntax,
+              "multi_commenting_syntax": multi_commenting_syntax, "patterns": patterns,
+              "lexer_options": read_lexer_options(csv_file)}
+
+    # Write to a temporary file first, so that a run starting at the same time never reads half a file
+    temporary_file = "{}.{}.tmp".format(syntax_file, os.getpid())
+    with open(temporary_file, 'w') as file_handler:
+        json.dump(syntax, file_handler, separators=(",", ":"))
+    os.replace(temporary_file, syntax_file)
+
+    return syntax_file
+
+
+def load_syntax(csv_file, syntax_file=None):
+    """ Return the precompiled syntax written by compile_syntax for csv_file, or None if there isn't one or the
+    csv_file has changed since it was written.
+
+    @param str csv_file:
+    @param str syntax_file: (defaults to syntax_file_name(csv_file))
+    @rtype: dict | NoneType:
+    """
+
     try:
-        with open(file_name) as file_handler:
-            contents = (line.rstrip() for line in file_handler)  # Strip the empty space at the end of each line
-            contents = list(line for line in contents if line)  # Non-blank lines in a list
-    except FileNotFoundError:
-        print("Please input program file from the same folder.")
-        sys.exit(1)
+        with open(syntax_file or syntax_file_name(csv_file), 'r') as file_handler:
+            syntax = json.load(file_handler)
+        csv_hash = hash_file(csv_file)
+    except (OSError, ValueError):
+        return None
+
+    if not isinstance(syntax, dict) or syntax.get("version") != SYNTAX_VERSION \
+            or syntax.get("csv_hash") != csv_hash:
+        return None
+
+    return syntax
+
+
+class SyntaxIndex:
+    """ Finds the key in the .csv file for a file name, ignoring case: the whole name for keys that aren't
+    extensions (such as "Makefile"), otherwise the longest extension the name ends with (so a row for ".d.ts" is
+    used before one for ".ts"). A key with exactly the same case is used before one that only matches when case is
+    ignored. Scripts can also be found from the interpreter on their "#!" line.
+
+    === Attributes ===
+    @param set keys: keys in the .csv file
+    @param dict folded: the first key in the .csv file for each lower case key
+    @param int longest: most dots in any extension in the .csv file
+    """
+
+    def __init__(self, extension_list):
+        """ Index the keys in extension_list.
+
+        @param SyntaxIndex self:
+        @param list extension_list:
+        @rtype: NoneType:
+        """
+
+        self.keys = set(extension_list)
+        self.folded = {}
+        self.longest = 1
+        for key in extension_list:
+            self.folded.setdefault(key.lower(), key)
+            if key.startswith('.'):
+                self.longest = max(self.longest, key.count('.'))
+
+    def _lookup(self, key):
+        """ Return the key in the .csv file for key, or None if there isn't one.
+
+        @param SyntaxIndex self:
+        @param str key:
+        @rtype: str | NoneType:
+        """
+
+        if key in self.keys:
+            return key
+        return self.folded.get(key.lower())
+
+    def resolve(self, file_name):
+        """ Return the key in the .csv file for file_name (or for an extension on its own), or None if there isn't
+        one. Only the last few extensions of the name are looked up, so this takes the same time for any name.
+
+        @param SyntaxIndex self:
+        @param str file_name:
+        @rtype: str | NoneType:
+        """
+
+        # The whole name, for keys such as "Makefile" and for extensions given on their own
+        name = os.path.basename(file_name)
+        key = self._lookup(name)
+        if key is not None:
+            return key
+
+        # Find where the longest extensions that could be in the .csv file start, leaving out a leading dot (as
+        # os.path.splitext does), then look them up from longest to shortest
+        starts = []
+        end = len(name)
+        while len(starts) < self.longest:
+            end = name.rfind('.', 1, end)
+            if end == -1:
+                break
+            starts.append(end)
+
+        for start in reversed(starts):
+            key = self._lookup(name[start:])
+            if key is not None:
+                return key
+
+        return None
+
+    def sniff(self, first_line):
+        """ Return the key in the .csv file for a script starting with first_line (as text or bytes), or None if
+        it doesn't start with a "#!" line naming an interpreter in SHEBANG_EXTENSIONS.
+
+        @param SyntaxIndex self:
+        @param str | bytes first_line:
+        @rtype: str | NoneType:
+        """
+
+        if isinstance(first_line, bytes):
+            first_line = first_line.decode('latin-1')
+        match = _SHEBANG.match(first_line)
+        if match is None:
+            return None
+
+        interpreter = os.path.basename(match.group(1))
+        if interpreter == "env" and match.group(2):
+            interpreter = os.path.basename(match.group(2))
+
+        # Versions such as "python3.11" use the same syntax as "python"
+        extension = SHEBANG_EXTENSIONS.get(re.match(r'[a-z]*', interpreter.lower()).group())
+        return self.resolve(extension) if extension else None
+
+
+def label_regex(single_line_regex, regex):
+    """ Combine the two regexes from build_regex into one regex for identifying both single line and multi line
+    comments, with the single line syntaxes in a group named "single" and the multi line syntaxes in a group named
+    "block", so that each match says which kind of comment it is.
+
+    @param str single_line_regex:
+    @param str regex:
+    @rtype: str:
+    """
 
-    # Identify type of file
-    name_extension = os.path.splitext(file_name)
-    extension = name_extension[1]
+    return "(?P<single>{})|(?P<block>{})".format(single_line_regex[1:-1], regex[len(single_line_regex):-1])
 
-    # Build Regex using helper function
-    single_line_regex, regex = build_regex(single_commenting_syntax, multi_commenting_syntax, extension)
 
-    # Create 5 lists that contain lines that meet the following criteria:
-    # comment_lines, single_line_comments, comment_lines_within_block, block_line_comments, and todos
-    comment_lines, single_line_comments, comment_lines_within_block, block_line_comments, todos = [], [], [], [], []
+def byte_order_mark_encoding(start):
+    """ Return the encoding named by the byte order mark at the start of a file, or None if it doesn't have one.
+
+    @param bytes start: at least the first four bytes of the file, when it has that many
+    @rtype: str | NoneType:
+    """
+
+    for mark, encoding in _BYTE_ORDER_MARKS:
+        if start.startswith(mark):
+            return encoding
+
+    return None
 
-    # Open file
-    file_handler = open(file_name)
 
-    # Create a string containing the whole file
-    whole_file = ''.join(file_handler.readlines())
+def detect_encoding(file_handler):
+    """ Return the encoding of a file opened as binary: the one named by its byte order mark, otherwise "ascii" if
+    it is all ASCII, "utf-8" if it is valid UTF-8, or "unknown-8bit" if it is neither. The file is read in blocks
+    (only checked as UTF-8 once a byte that isn't ASCII turns up) and rewound.
 
-    # Create list of all comments (single or block) for that langauge
-    all_comments = re.findall(regex, whole_file, re.M)
+    @param file file_handler:
+    @rtype: str:
+    """
+
+    block = file_handler.read(1 << 20)
+    encoding = byte_order_mark_encoding(block[:4])
+    decoder = None
 
-    # Comment Lines
-    for comment in all_comments:
-        # For comments with a new line characters, split into two comments
-        if '\n' in comment:
-            split_lines = comment.split("\n")
-            for line in split_lines:
-                comment_lines.append(line)
+    while block and encoding is None:
+        if decoder is None and not block.isascii():
+            decoder = codecs.getincrementaldecoder("utf-8")()
+        if decoder is not None:
+            try:
+                decoder.decode(block)
+            except UnicodeDecodeError:
+                encoding = "unknown-8bit"
+        block = file_handler.read(1 << 20)
+
+    if encoding is None:
+        if decoder is None:
+            encoding = "ascii"
         else:
-            comment_lines.append(comment)
-
-    # Single Line Comments
-    single_line_comments = re.findall(single_line_regex, whole_file, re.M)
-
-    # Block Line Comments
-    block_line_comments = []
-    for comment in all_comments:
-        if comment not in single_line_comments:
-            block_line_comments.append(comment)
-
-    # Comment Lines Within Block
-    for comment in block_line_comments:
-        split_lines = comment.split("\n")
-        for line in split_lines:
-            comment_lines_within_block.append(line)
-
-    # Comment lines with ToDos
-    for comment in all_comments:
-        if 'TODO' in comment:
-            todos.append(comment)
-
-    # Count number of items in each list
-    total_lines = len(contents)
-    comment_lines = len(comment_lines)
-    single_line_comments = len(single_line_comments)
-    comment_lines_within_block = len(comment_lines_within_block)
-    block_line_comments = len(block_line_comments)
-    todos = len(todos)
-
-    # Close File
-    file_handler.close()
-
-    summary =[total_lines, comment_lines, single_line_comments, comment_lines_within_block, block_line_comments,
-              todos]
+            try:
+                decoder.decode(b'', True)
+                encoding = "utf-8"
+            except UnicodeDecodeError:
+                encoding = "unknown-8bit"
 
-    return summary
+    file_handler.seek(0)
+    return encoding
 
 
-def output_file_summary(csv_file, file_name):
-    """ Scan a file and output the total number of lines, comment lines, single line comments,
+def _syntax_order(single_syntax, multi_syntax):
+    """ Return the commenting syntaxes in the order they are tried, each with its ending syntax (None for single
+    line comments).
+
+    @param list single_syntax:
+    @param list multi_syntax:
+    @rtype: list:
+    """
+
+    syntaxes = [(syntax, None) for syntax in single_syntax]
+    syntaxes += [(multi_syntax[i], multi_syntax[i + 1]) for i in range(0, len(multi_syntax), 2)]
+
+    return syntaxes
+
+
+def scan_comments(file_handler, single_syntax, multi_syntax):
+    """ Scan a file one line at a time and return the total number of lines, comment lines, single line comments,
     comment lines within block comments, block line comments, and TODO's in the comments.
 
-    @param str csv_file:
-    @param str file_name:
-    @rtype: NoneType:
+    Comments are found the same way the regex from build_regex finds them: at each position the single line
+    syntaxes are tried first and then the multi line syntaxes in order, and a multi line syntax only starts a
+    block comment if its ending syntax appears somewhere after it. Since that can't be known until the end of the
+    file, a block comment that is never closed sends the scan back to where it started, with that ending syntax
+    marked as missing. This happens at most once for each ending syntax, so the file is read a bounded number of
+    times and only one line is held in memory.
+
+    @param file file_handler: a seekable file opened for reading
+    @param list single_syntax: single line commenting syntaxes
+    @param list multi_syntax: starting and ending multi line commenting syntaxes, one after the other
+    @rtype: list summary:
     """
 
-    summary = file_summary(csv_file, file_name)
-    total_lines, comment_lines, single_line_comments, comment_lines_within_block, block_line_comments, todos\
-        = summary
+    total_lines, comment_lines, single_line_comments, comment_lines_within_block, block_line_comments, todos \
+        = 0, 0, 0, 0, 0, 0
 
-    # Print out Counts
-    print("Total # of lines: {}".format(total_lines))
-    print("Total # of comment lines: {}".format(comment_lines))
-    print("Total # of single line comments: {}".format(single_line_comments))
-    print("Total # of comment lines within block comments: {}".format(comment_lines_within_block))
-    print("Total # of block line comments: {}".format(block_line_comments))
-    print("Total # of TODO's : {}".format(todos))
+    # Commenting syntaxes in the order they are tried, with the ending syntax (None for single line comments)
+    syntaxes = _syntax_order(single_syntax, multi_syntax)
 
+    # Ending syntaxes that don't appear on any line after the one being scanned
+    missing = set()
+    # Lines before this one have already been counted for total lines and single line comments
+    counted = 0
+    # Line and column to start scanning from
+    start_line, start_column = 1, 0
 
-if __name__ == "__main__":
-    parser = argparse.ArgumentParser()
-    parser.add_argument("csv", help="please pass in .csv file containing commenting syntaxes", type=str)
-    parser.add_argument("file", help="please pass in file", type=str)
-    args = parser.parse_args()
-    output_file_summary(args.csv, args.file)
+    while True:
+        # The open block comment, as [ending syntax, line, column, line count, whether it has a TODO]
+        block = None
+
+        for line_number, line in enumerate(file_handler, 1):
+            if line_number < start_line:
+                continue
+            if line[-1:] == '\n':
+                line = line[:-1]
+
+            # Total lines and single line comments don't depend on where block comments are
+            if line_number > counted:
+                counted = line_number
+                if line and not line.isspace():
+                    total_lines += 1
+                for syntax in single_syntax:
+                    if syntax in line:
+                        single_line_comments += 1
+                        break
+
+            column = start_column if line_number == start_line else 0
+
+            if block is not None:
+                end = line.find(block[0])
+                if end == -1:
+                    block[3] += 1
+                    block[4] = block[4] or 'TODO' in line
+                    continue
+                end += len(block[0])
+                comment_lines += block[3] + 1
+                comment_lines_within_block += block[3] + 1
+                block_line_comments += 1
+                if block[4] or line.find('TODO', 0, end) != -1:
+                    todos += 1
+                block = None
+                column = end
+
+            # Next position of each commenting syntax on this line (past the end of the line when there are no
+            # more), only searched for again once the scan has gone past it so that long lines are searched once
+            next_found = [-1] * len(syntaxes)
+            none_found = len(line) + 1
+
+            while True:
+                # Find the commenting syntax that starts first, earlier syntaxes winning ties
+                index, choice = none_found, -1
+                for i, (candidate, candidate_ending) in enumerate(syntaxes):
+                    found = next_found[i]
+                    if found < column:
+                        found = line.find(candidate, column)
+                        if found == -1:
+                            found = none_found
+                        # A missing ending syntax can still close a block comment on the same line
+                        elif candidate_ending in missing \
+                                and line.find(candidate_ending, found + len(candidate)) == -1:
+                            found = none_found
+                        next_found[i] = found
+                    if found < index:
+                        index, choice = found, i
+
+                if choice == -1:
+                    break
+                syntax, ending = syntaxes[choice]
+
+                # Single line comment, the rest of the line is the comment
+                if ending is None:
+                    comment_lines += 1
+                    if line.find('TODO', index) != -1:
+                        todos += 1
+                    break
+
+                # Block comment that ends on the same line
+                end = line.find(ending, index + len(syntax))
+                if end != -1:
+                    end += len(ending)
+                    comment_lines += 1
+                    comment_lines_within_block += 1
+                    block_line_comments += 1
+                    if line.find('TODO', index, end) != -1:
+                        todos += 1
+                    column = end
+                    continue
+
+                # Block comment that continues on the next lines
+                block = [ending, line_number, index, 1, line.find('TODO', index) != -1]
+                break
+
+        if block is None:
+            break
+
+        # The block comment was never closed, so its ending syntax doesn't appear after it. Scan again from there.
+        missing.add(block[0])
+        start_line, start_column = block[1], block[2]
+        file_handler.seek(0)
+
+    summary = [total_lines, comment_lines, single_line_comments, comment_lines_within_block, block_line_comments,
+               todos]
+
+    return summary
+
+
+def scan_buffer(buffer, single_syntax, multi_syntax):
+    """ Scan the bytes of a whole file, such as an mmap, and return the same summary as scan_comments, without
+    copying lines or comments out of the buffer.
+
+    The next position of each commenting syntax is remembered and only searched for again once the scan has gone
+    past it, and an ending syntax that can't be found is remembered as missing from where it was searched for, so
+    the buffer is searched a bounded number of times.
+
+    @param bytes | mmap buffer:
+    @param list single_syntax: single line commenting syntaxes, as bytes
+    @param list multi_syntax: starting and ending multi line commenting syntaxes, one after the other, as bytes
+    @rtype: list summary:
+    """
+
+    size = len(buffer)
+    comment_lines, comment_lines_within_block, block_line_comments, todos = 0, 0, 0, 0
+
+    # Total lines and single line comments don't depend on where block comments are
+    total_lines = count_lines(buffer)
+    single_line_regex = re.compile(b'^[^\\n]*?(?:' + b'|'.join(re.escape(syntax) for syntax in single_syntax) + b')',
+                                   re.M)
+    single_line_comments = sum(1 for match in single_line_regex.finditer(buffer))
+
+    # Commenting syntaxes in the order they are tried, with the ending syntax (None for single line comments)
+    syntaxes = _syntax_order(single_syntax, multi_syntax)
+
+    # Next position of each commenting syntax (past the end of the buffer when there are no more)
+    next_found = [-1] * len(syntaxes)
+    # Ending syntaxes that don't appear from a position onwards
+    missing = {}
+    position = 0
+
+    while True:
+        for i, (syntax, ending) in enumerate(syntaxes):
+            if next_found[i] < position:
+                found = buffer.find(syntax, position)
+                next_found[i] = found if found != -1 else size + 1
+
+        index = min(next_found)
+        if index > size:
+            break
+
+        # Try the commenting syntaxes that start here in order, the way the regex alternatives are tried
+        end = -1
+        for i, (syntax, ending) in enumerate(syntaxes):
+            if next_found[i] != index:
+                continue
+
+            # Single line comment, the rest of the line is the comment
+            if ending is None:
+                end = buffer.find(b'\n', index)
+                if end == -1:
+                    end = size
+                comment_lines += 1
+                if buffer.find(b'TODO', index, end) != -1:
+                    todos += 1
+                break
+
+            start = index + len(syntax)
+            if start >= missing.get(ending, size + 1):
+                continue
+            end = buffer.find(ending, start)
+            if end == -1:
+                missing[ending] = start
+                continue
+
+            # Block comment, counting the lines it is on
+            end += len(ending)
+            lines = _count_newlines(buffer, index, end) + 1
+            comment_lines += lines
+            comment_lines_within_block += lines
+            block_line_comments += 1
+            if buffer.find(b'TODO', index, end) != -1:
+                todos += 1
+            break
+
+        # Nothing matched here, so carry on from the next position
+        position = end if end != -1 else index + 1
+
+    summary = [total_lines, comment_lines, single_line_comments, comment_lines_within_block, block_line_comments,
+               todos]
+
+    return summary
+
+
+# A comment found by iter_comments: kind is "single" or "block", lines count from 1, start and end are the byte
+# offsets of its first byte and just past its last byte, and is_todo is whether it contains a TODO
+Comment = collections.namedtuple("Comment", ["kind", "start_line", "end_line", "start", "end", "is_todo"])
+
+
+def load_numpy():
+    """ Return NumPy, or None when it isn't installed. NumPy is optional, and it is only imported the first time a
+    span big enough to be worth it is counted, since importing it takes longer than scanning a small file.
+
+    @rtype: module | NoneType:
+    """
+
+    global _numpy, _CONTENT_BYTES
+
+    if _numpy is None:
+        try:
+            import numpy
+        except ImportError:
+            # Lines are counted with regexes and searches without it
+            _numpy = False
+        else:
+            _CONTENT_BYTES = numpy.ones(256, dtype=bool)
+            _CONTENT_BYTES[list(b' \t\r\n\x0b\x0c\x1c\x1d\x1e\x1f')] = False
+            _numpy = numpy
+
+    return _numpy or None
+
+
+def count_lines(buffer, start=0, end=None, backend=None):
+    """ Return the number of lines in buffer from start up to end that aren't blank, which is the total number of
+    lines in a summary. start has to be at the start of a line.
+
+    backend is "numpy", which looks at every byte at once in arrays, or "regex", which finds each line with
+    _NON_BLANK_LINE. By default NumPy is used for spans of at least NUMPY_THRESHOLD bytes when it is installed.
+
+    @param bytes | mmap buffer:
+    @param int start:
+    @param int end: (defaults to the end of buffer)
+    @param str backend:
+    @rtype: int:
+    """
+
+    end = len(buffer) if end is None else end
+    if backend is None:
+        backend = "numpy" if end - start >= NUMPY_THRESHOLD and load_numpy() is not None else "regex"
+    elif backend == "numpy" and load_numpy() is None:
+        raise CommentCheckerError("NumPy is not installed.")
+
+    if backend == "regex":
+        return sum(1 for match in _NON_BLANK_LINE.finditer(buffer, start, end))
+
+    numpy = load_numpy()
+
+    # Leaving out blank bytes, each run of bytes with something on them between line feeds is one line
+    lines, previous = 0, False
+    for block in range(start, end, NUMPY_BLOCK_SIZE):
+        data = numpy.frombuffer(buffer, numpy.uint8, min(NUMPY_BLOCK_SIZE, end - block), block)
+        content = _CONTENT_BYTES[data]
+        runs = content[content | (data == 10)]
+        if runs.size:
+            lines += int(runs[0] and not previous) + int(numpy.count_nonzero(runs[1:] > runs[:-1]))
+            previous = bool(runs[-1])
+
+    return lines
+
+
+def _count_newlines(buffer, start, end):
+    """ Return the number of line feeds in buffer from start up to end.
+
+    @param bytes | mmap buffer:
+    @param int start:
+    @param int end:
+    @rtype: int:
+    """
+
+    if isinstance(buffer, bytes):
+        return buffer.count(b'\n', start, end)
+
+    # An mmap has no count, so long spans are looked at with NumPy, or counted a block at a time without it
+    numpy = load_numpy() if end - start >= NUMPY_THRESHOLD else None
+    if numpy is not None:
+        return sum(int(numpy.count_nonzero(numpy.frombuffer(buffer, numpy.uint8, min(NUMPY_BLOCK_SIZE, end - block),
+                                                            block) == 10))
+                   for block in range(start, end, NUMPY_BLOCK_SIZE))
+    if end - start >= NUMPY_THRESHOLD:
+        return sum(buffer[block:min(block + NUMPY_THRESHOLD, end)].count(b'\n')
+                   for block in range(start, end, NUMPY_THRESHOLD))
+
+    newlines = 0
+    newline = buffer.find(b'\n', start, end)
+    while newline != -1:
+        newlines += 1
+        newline = buffer.find(b'\n', newline + 1, end)
+
+    return newlines
+
+
+def iter_comments(buffer, single_syntax, multi_syntax):
+    """ Find the same comments as scan_buffer in the bytes of a whole file and yield a Comment for each one, in the
+    order they are in the file. Nothing is kept once a comment has been yielded, so a caller that stops early or
+    only looks at some comments never pays for the rest. scan_buffer should be used for only the counts, since it
+    doesn't create anything for each comment.
+
+    @param bytes | mmap buffer:
+    @param list single_syntax: single line commenting syntaxes, as bytes
+    @param list multi_syntax: starting and ending multi line commenting syntaxes, one after the other, as bytes
+    @rtype: generator:
+    """
+
+    size = len(buffer)
+
+    # Commenting syntaxes in the order they are tried, with the ending syntax (None for single line comments)
+    syntaxes = _syntax_order(single_syntax, multi_syntax)
+
+    # Next position of each commenting syntax (past the end of the buffer when there are no more)
+    next_found = [-1] * len(syntaxes)
+    # Ending syntaxes that don't appear from a position onwards
+    missing = {}
+    position = 0
+    # Line of the position lines have been counted up to
+    line, counted = 1, 0
+
+    while True:
+        for i, (syntax, ending) in enumerate(syntaxes):
+            if next_found[i] < position:
+                found = buffer.find(syntax, position)
+                next_found[i] = found if found != -1 else size + 1
+
+        index = min(next_found)
+        if index > size:
+            return
+
+        # Try the commenting syntaxes that start here in order, the way the regex alternatives are tried
+        end = -1
+        for i, (syntax, ending) in enumerate(syntaxes):
+            if next_found[i] != index:
+                continue
+
+            if ending is None:
+                end = buffer.find(b'\n', index)
+                if end == -1:
+                    end = size
+            else:
+                start = index + len(syntax)
+                if start >= missing.get(ending, size + 1):
+                    continue
+                end = buffer.find(ending, start)
+                if end == -1:
+                    missing[ending] = start
+                    continue
+                end += len(ending)
+
+            line += _count_newlines(buffer, counted, index)
+            end_line = line + _count_newlines(buffer, index, end)
+            yield Comment("single" if ending is None else "block", line, end_line, index, end,
+                          buffer.find(b'TODO', index, end) != -1)
+            line, counted = end_line, end
+            break
+
+        # Nothing matched here, so carry on from the next position
+        position = end if end != -1 else index + 1
+
+
+# What scan_chunk found in a chunk of a file: its counts, where its first comment starts (the end of the chunk if
+# it has none), and the first block comment it gave up on for each ending syntax, as
+# {ending syntax: (position, order of its commenting syntax, start of its ending search, counts before it)}
+ChunkResult = collections.namedtuple("ChunkResult", ["total_lines", "single_line_comments", "comment_lines",
+                                                     "comment_lines_within_block", "block_line_comments", "todos",
+                                                     "first_start", "gave_up"])
+
+
+def scan_chunk(buffer, start, end, single_syntax, multi_syntax):
+    """ Scan the part of buffer from start up to end the way scan_buffer scans a whole file, as if the file
+    started in code at start. Both have to be at the start of a line or the end of the buffer, so that no line or
+    single line comment crosses them. A block comment whose ending syntax isn't in the chunk is given up on, and
+    merge_chunks works out whether it should have been. Only counts are kept, so what is sent back from a worker
+    is the same size however many comments the chunk has.
+
+    @param bytes | mmap buffer:
+    @param int start:
+    @param int end:
+    @param list single_syntax: single line commenting syntaxes, as bytes
+    @param list multi_syntax: starting and ending multi line commenting syntaxes, one after the other, as bytes
+    @rtype: ChunkResult:
+    """
+
+    total_lines = count_lines(buffer, start, end)
+    single_line_regex = re.compile(b'^[^\\n]*?(?:' + b'|'.join(re.escape(syntax) for syntax in single_syntax) + b')',
+                                   re.M)
+    single_line_comments = sum(1 for match in single_line_regex.finditer(buffer, start, end))
+
+    comment_lines, comment_lines_within_block, block_line_comments, todos = 0, 0, 0, 0
+    first_start = end
+    gave_up = {}
+
+    syntaxes = _syntax_order(single_syntax, multi_syntax)
+    next_found = [-1] * len(syntaxes)
+    missing = {}
+    position = start
+
+    while True:
+        for i, (syntax, ending) in enumerate(syntaxes):
+            if next_found[i] < position:
+                found = buffer.find(syntax, position, end)
+                next_found[i] = found if found != -1 else end + 1
+
+        index = min(next_found)
+        if index > end:
+            break
+
+        comment_end = -1
+        for i, (syntax, ending) in enumerate(syntaxes):
+            if next_found[i] != index:
+                continue
+
+            if ending is None:
+                comment_end = buffer.find(b'\n', index, end)
+                if comment_end == -1:
+                    comment_end = end
+                comment_lines += 1
+                if buffer.find(b'TODO', index, comment_end) != -1:
+                    todos += 1
+                break
+
+            after = index + len(syntax)
+            if after < missing.get(ending, end + 1):
+                comment_end = buffer.find(ending, after, end)
+                if comment_end != -1:
+                    comment_end += len(ending)
+                    lines = _count_newlines(buffer, index, comment_end) + 1
+                    comment_lines += lines
+                    comment_lines_within_block += lines
+                    block_line_comments += 1
+                    if buffer.find(b'TODO', index, comment_end) != -1:
+                        todos += 1
+                    break
+                missing[ending] = after
+            # If the ending syntax is after the chunk, the first block comment given up on for it is where the
+            # chunk's scan first goes wrong because of it
+            if ending not in gave_up:
+                gave_up[ending] = (index, i, after, (comment_lines, comment_lines_within_block, block_line_comments,
+                                                     todos))
+
+        if comment_end == -1:
+            position = index + 1
+            continue
+
+        if first_start == end:
+            first_start = index
+        position = comment_end
+
+    return ChunkResult(total_lines, single_line_comments, comment_lines, comment_lines_within_block,
+                       block_line_comments, todos, first_start, gave_up)
+
+
+def merge_chunks(buffer, chunks, results, single_syntax, multi_syntax):
+    """ Put the ChunkResults of scanning the (start, end) chunks of the whole of buffer with scan_chunk together into
+    the same summary as scan_buffer. results are (start of the chunk, ChunkResult) in any order, such as when they
+    come back from a process pool, and each one is merged as soon as the chunks before it have been.
+
+    Where the scan goes next only depends on where it is, so when the scan of the whole buffer reaches a chunk in
+    code before the chunk's first comment, the chunk's counts are taken, up to the first block comment the chunk
+    gave up on whose ending syntax is after the chunk. That comment is found in the whole buffer instead, and a
+    chunk the scan reaches anywhere else, such as in the middle after a comment crossing into it, is scanned from
+    there in the whole buffer.
+
+    @param bytes | mmap buffer:
+    @param list chunks:
+    @param iterable results:
+    @param list single_syntax: single line commenting syntaxes, as bytes
+    @param list multi_syntax: starting and ending multi line commenting syntaxes, one after the other, as bytes
+    @rtype: list summary:
+    """
+
+    size = len(buffer)
+    syntaxes = _syntax_order(single_syntax, multi_syntax)
+    summary = [0, 0, 0, 0, 0, 0]
+
+    # The state of scanning the whole buffer, as in scan_buffer
+    next_found = [-1] * len(syntaxes)
+    missing = {}
+    position = 0
+    # Where each ending syntax was last searched for after a chunk, and where it was found (-1 if it wasn't)
+    closing = {}
+
+    def find_closing(ending, search):
+        searched, found = closing.get(ending, (size + 1, -1))
+        if search < searched or search > found != -1:
+            found = buffer.find(ending, search)
+            closing[ending] = search, found
+        return found
+
+    def add(start, end, block):
+        lines = _count_newlines(buffer, start, end) + 1
+        summary[1] += lines
+        summary[3] += lines if block else 0
+        summary[4] += block
+        summary[5] += buffer.find(b'TODO', start, end) != -1
+
+    def merge(chunk_end, result):
+        nonlocal position
+        summary[0] += result.total_lines
+        summary[2] += result.single_line_comments
+
+        # The first block comment the chunk shouldn't have given up on, as (position, order, end, counts before it)
+        wrong = None
+        for ending, (index, order, after, counts) in result.gave_up.items():
+            found = find_closing(ending, max(after, chunk_end - len(ending) + 1))
+            if found != -1 and (wrong is None or (index, order) < wrong[:2]):
+                wrong = index, order, found + len(ending), counts
+
+        if position <= result.first_start and (wrong is None or position <= wrong[0]):
+            counts = (result.comment_lines, result.comment_lines_within_block, result.block_line_comments,
+                      result.todos) if wrong is None else wrong[3]
+            for i, count in zip((1, 3, 4, 5), counts):
+                summary[i] += count
+            if wrong is None:
+                position = chunk_end
+            else:
+                add(wrong[0], wrong[2], True)
+                position = wrong[2]
+
+        # Scan one comment at a time in the whole buffer until the scan leaves the chunk
+        while position < chunk_end:
+            for i, (syntax, ending) in enumerate(syntaxes):
+                if next_found[i] < position:
+                    found = buffer.find(syntax, position)
+                    next_found[i] = found if found != -1 else size + 1
+
+            index = min(next_found)
+            if index > size:
+                position = size
+                break
+
+            end = -1
+            for i, (syntax, ending) in enumerate(syntaxes):
+                if next_found[i] != index:
+                    continue
+                if ending is None:
+                    end = buffer.find(b'\n', index)
+                    end = size if end == -1 else end
+                    break
+                after = index + len(syntax)
+                if after >= missing.get(ending, size + 1):
+                    continue
+                end = buffer.find(ending, after)
+                if end != -1:
+                    end += len(ending)
+                    break
+                missing[ending] = after
+
+            if end == -1:
+                position = index + 1
+            else:
+                add(index, end, ending is not None)
+                position = end
+
+    chunk_ends = dict(chunks)
+    pending = {}
+    chunk_start = chunks[0][0] if chunks else 0
+    for start, result in results:
+        pending[start] = result
+        while chunk_start in pending:
+            merge(chunk_ends[chunk_start], pending.pop(chunk_start))
+            chunk_start = chunk_ends[chunk_start]
+
+    return summary
+
+
+class Lexer:
+    """ Finds comments in the bytes of a file the way a compiler would, rather than the way the regex from
+    build_regex does: the longest commenting syntax or string delimiter starting at a position wins, string
+    literals are skipped over (ending at their delimiter or the end of their line), block comments that nest count
+    their nested comments, and a block comment that is never closed runs to the end of the file.
+
+    The lexer is driven by a transition table built when it is created. For each state (code, inside each kind of
+    block comment and inside each kind of string literal) it holds a regex matching the tokens that change the
+    state, with one group per token, and what each token does. Every search carries on from where the last one
+    stopped, so scanning takes time linear in the size of the file.
+
+    === Attributes ===
+    @param dict transitions: (regex, actions) for each state, where actions[i] is what group i + 1 of regex does
+    """
+
+    def __init__(self, single_syntax, multi_syntax, options=None):
+        """ Build the transition table for the commenting syntaxes, given as bytes, and the options from
+        read_lexer_options.
+
+        @param Lexer self:
+        @param list single_syntax:
+        @param list multi_syntax:
+        @param dict options:
+        @rtype: NoneType:
+        """
+
+        options = options or {}
+        strings = [syntax.encode() for syntax in options.get("strings", [])]
+        escape = options.get("escape", "").encode()
+        nested = {syntax.encode() for syntax in options.get("nested", [])}
+        self.transitions = {}
+
+        # Tokens that leave code, single line syntaxes first so that they win ties with the same token
+        tokens = [(syntax, ("single", None)) for syntax in single_syntax]
+        for i in range(0, len(multi_syntax), 2):
+            tokens.append((multi_syntax[i], ("block", i // 2)))
+            ending = [(multi_syntax[i + 1], "close")]
+            if multi_syntax[i] in nested and multi_syntax[i] != multi_syntax[i + 1]:
+                ending.append((multi_syntax[i], "open"))
+            self._add_state(("block", i // 2), ending)
+        for i, delimiter in enumerate(strings):
+            tokens.append((delimiter, ("string", i)))
+            ending = [(re.escape(escape) + b'.', "escape")] if escape else []
+            self._add_state(("string", i), ending + [(re.escape(delimiter), "end"), (b'\n', "end")], escaped=True)
+
+        self._add_state("code", tokens)
+
+    def _add_state(self, state, tokens, escaped=False):
+        """ Add the regex and actions for leaving state through one of tokens, as (token, action) pairs. Longer
+        tokens are tried first, so that the longest token starting at a position wins, and the first of two equal
+        tokens is kept.
+
+        @param Lexer self:
+        @param object state:
+        @param list tokens:
+        @param bool escaped: whether the tokens are already regexes
+        @rtype: NoneType:
+        """
+
+        kept = {}
+        for token, action in tokens:
+            kept.setdefault(token, action)
+        ordered = sorted(kept, key=len, reverse=True) if not escaped else list(kept)
+
+        regex = re.compile(b'|'.join(b'(' + (token if escaped else re.escape(token)) + b')' for token in ordered),
+                           re.S)
+        self.transitions[state] = regex, [kept[token] for token in ordered]
+
+    def scan(self, buffer):
+        """ Scan the bytes of a whole file and return the same summary as scan_comments, where single line comments
+        are the lines with a single line comment that the lexer found.
+
+        @param Lexer self:
+        @param bytes | mmap buffer:
+        @rtype: list summary:
+        """
+
+        size = len(buffer)
+        total_lines = count_lines(buffer)
+        comment_lines, single_line_comments, comment_lines_within_block, block_line_comments, todos = 0, 0, 0, 0, 0
+
+        code_regex, code_actions = self.transitions["code"]
+        position = 0
+
+        while True:
+            match = code_regex.search(buffer, position)
+            if match is None:
+                break
+            kind, index = code_actions[match.lastindex - 1]
+            start = match.start()
+
+            if kind == "single":
+                # Single line comment, the rest of the line is the comment
+                position = buffer.find(b'\n', start)
+                if position == -1:
+                    position = size
+                comment_lines += 1
+                single_line_comments += 1
+                if buffer.find(b'TODO', start, position) != -1:
+                    todos += 1
+                continue
+
+            regex, actions = self.transitions[(kind, index)]
+            position = match.end()
+
+            if kind == "string":
+                # Skip over the string literal, and anything escaped in it
+                while True:
+                    match = regex.search(buffer, position)
+                    if match is None:
+                        position = size
+                        break
+                    position = match.end()
+                    if actions[match.lastindex - 1] == "end":
+                        break
+                continue
+
+            # Block comment, which runs to the end of the file if it is never closed
+            depth = 1
+            while depth:
+                match = regex.search(buffer, position)
+                if match is None:
+                    position = size
+                    if buffer[size - 1:size] == b'\n':
+                        position -= 1
+                    break
+                position = match.end()
+                depth += 1 if actions[match.lastindex - 1] == "open" else -1
+
+            lines = _count_newlines(buffer, start, position) + 1
+            comment_lines += lines
+            comment_lines_within_block += lines
+            block_line_comments += 1
+            if buffer.find(b'TODO', start, position) != -1:
+                todos += 1
+
+        summary = [total_lines, comment_lines, single_line_comments, comment_lines_within_block, block_line_comments,
+                   todos]
+
+        return summary
+
+
+class DelimiterTrie:
+    """ Finds the same comments as scan_buffer, finding every commenting syntax in a file in one pass.
+
+    The commenting syntaxes of a file extension are put in a trie, which is compiled into a single regex whose
+    alternatives share their common prefixes (so "/+", "/++", "/*", "/**" and "//" are tried as "/" followed by
+    one of "+", "*" or "/", rather than one after the other), inside a lookahead so that syntaxes overlapping each
+    other are all found. The longest syntax found at each position gives every other syntax starting there, which
+    are its prefixes in the trie. The positions of ending syntaxes are kept, so that whether a block comment is
+    ever closed is a binary search rather than another search of the file, however many block comments are never
+    closed.
+
+    === Attributes ===
+    @param list delimiters: every commenting syntax, starting and ending, as bytes, each once
+    @param re.Pattern regex: regex finding the longest syntax starting at every position
+    """
+
+    def __init__(self, single_syntax, multi_syntax):
+        """ Build the trie for the commenting syntaxes, given as bytes.
+
+        @param DelimiterTrie self:
+        @param list single_syntax:
+        @param list multi_syntax:
+        @rtype: NoneType:
+        """
+
+        self.delimiters = list(dict.fromkeys(single_syntax + multi_syntax))
+        endings = multi_syntax[1::2]
+
+        # Each node is a dict from the next byte to the node after it, with None for the syntax ending there
+        trie = {}
+        for delimiter in self.delimiters:
+            node = trie
+            for byte in delimiter:
+                node = node.setdefault(byte, {})
+            node[None] = delimiter
+        self.regex = re.compile(b'(?=(' + self._node_regex(trie) + b'))', re.S)
+
+        # For the longest syntax found at a position, the commenting syntaxes to try there in the order the regex
+        # from build_regex tries them, as (length of the starting syntax, ending syntax or None), and the ending
+        # syntaxes found there
+        syntaxes = _syntax_order(single_syntax, multi_syntax)
+        self._candidates = {delimiter: [(len(syntax), ending) for syntax, ending in syntaxes
+                                        if delimiter.startswith(syntax)] for delimiter in self.delimiters}
+        self._endings = {delimiter: [ending for ending in dict.fromkeys(endings) if delimiter.startswith(ending)]
+                         for delimiter in self.delimiters}
+        self._single = {delimiter: any(delimiter.startswith(syntax) for syntax in single_syntax)
+                        for delimiter in self.delimiters}
+
+    def _node_regex(self, node):
+        """ Return the regex for the syntaxes below node in the trie, trying longer syntaxes first.
+
+        @param DelimiterTrie self:
+        @param dict node:
+        @rtype: bytes:
+        """
+
+        branches = [re.escape(bytes([byte])) + self._node_regex(node[byte]) for byte in node if byte is not None]
+        if not branches:
+            return b''
+        regex = branches[0] if len(branches) == 1 else b'(?:' + b'|'.join(branches) + b')'
+        if None in node:
+            return b'(?:' + regex + b')?'
+
+        return regex
+
+    def scan(self, buffer):
+        """ Scan the bytes of a whole file and return the same summary as scan_buffer.
+
+        @param DelimiterTrie self:
+        @param bytes | mmap buffer:
+        @rtype: list summary:
+        """
+
+        size = len(buffer)
+        total_lines = count_lines(buffer)
+        comment_lines, single_line_comments, comment_lines_within_block, block_line_comments, todos = 0, 0, 0, 0, 0
+
+        # The one pass, keeping the longest syntax at each position and where each ending syntax is
+        found = []
+        ending_positions = {ending: [] for endings in self._endings.values() for ending in endings}
+        for match in self.regex.finditer(buffer):
+            start, delimiter = match.start(), match.group(1)
+            found.append((start, delimiter))
+            for ending in self._endings[delimiter]:
+                ending_positions[ending].append(start)
+
+        position, line_end = 0, -1
+        for start, delimiter in found:
+            # Single line comments are the lines with a single line commenting syntax anywhere on them
+            if start > line_end and self._single[delimiter]:
+                single_line_comments += 1
+                line_end = buffer.find(b'\n', start)
+                if line_end == -1:
+                    line_end = size
+
+            if start < position:
+                continue
+
+            # Try the commenting syntaxes that start here in order, the way the regex alternatives are tried
+            for length, ending in self._candidates[delimiter]:
+                # Single line comment, the rest of the line is the comment
+                if ending is None:
+                    position = buffer.find(b'\n', start)
+                    if position == -1:
+                        position = size
+                    comment_lines += 1
+                    if buffer.find(b'TODO', start, position) != -1:
+                        todos += 1
+                    break
+
+                positions = ending_positions[ending]
+                closing = bisect.bisect_left(positions, start + length)
+                if closing == len(positions):
+                    continue
+
+                # Block comment, counting the lines it is on
+                position = positions[closing] + len(ending)
+                lines = _count_newlines(buffer, start, position) + 1
+                comment_lines += lines
+                comment_lines_within_block += lines
+                block_line_comments += 1
+                if buffer.find(b'TODO', start, position) != -1:
+                    todos += 1
+                break
+
+        summary = [total_lines, comment_lines, single_line_comments, comment_lines_within_block, block_line_comments,
+                   todos]
+
+        return summary
+
+
+class CommentChecker:
+    """ A comment checker for the commenting syntaxes in a csv_file. The csv_file is read once when the checker
+    is created (from the precompiled syntax file if compile_syntax has been run on it and it hasn't changed since),
+    and the regexes for each file extension are compiled the first time a file with that extension is scanned and
+    kept for every file after it.
+
+    === Attributes ===
+    @param str csv_file: the .csv file containing the commenting syntaxes
+    @param dict single_commenting_syntax: single line commenting syntaxes for each file extension
+    @param dict multi_commenting_syntax: multi line commenting syntaxes for each file extension
+    @param list extension_list: file extensions in the .csv file
+    @param SyntaxIndex index: finds the file extension in the .csv file for each file
+    @param dict lexer_options: options for the lexer from read_lexer_options, or None until they are needed
+    @param ScanMetrics metrics: timings and counters collected while scanning, or None to not collect any
+    """
+
+    def __init__(self, csv_file, metrics=None):
+        """ Create a comment checker for the commenting syntaxes in csv_file.
+
+        @param CommentChecker self:
+        @param str csv_file:
+        @param ScanMetrics metrics:
+        @rtype: NoneType:
+        """
+
+        self.csv_file = csv_file
+        self.metrics = metrics
+        with self._phase("read_csv_file"):
+            syntax = load_syntax(csv_file)
+            if syntax is None:
+                self.single_commenting_syntax, self.multi_commenting_syntax, self.extension_list \
+                    = read_csv_file(csv_file)
+                self._regexes = {}
+                # Only read when a file is first lexed, since most runs don't
+                self.lexer_options = None
+            else:
+                self.single_commenting_syntax = syntax["single_commenting_syntax"]
+                self.multi_commenting_syntax = syntax["multi_commenting_syntax"]
+                self.extension_list = syntax["extension_list"]
+                self._regexes = syntax["patterns"]
+                self.lexer_options = syntax["lexer_options"]
+            self.index = SyntaxIndex(self.extension_list)
+        # Compiled (single_line_regex, regex) for each file extension
+        self._patterns = {}
+        # Commenting syntaxes as bytes, (single line, multi line), for each file extension
+        self._byte_syntaxes = {}
+        # Lexer for each file extension
+        self._lexers = {}
+        # DelimiterTrie for each file extension
+        self._tries = {}
+
+    def _phase(self, name):
+        """ Return a context manager timing the phase called name, which does nothing when no metrics are being
+        collected.
+
+        @param CommentChecker self:
+        @param str name:
+        @rtype: contextlib.AbstractContextManager:
+        """
+
+        return _NO_PHASE if self.metrics is None else self.metrics.phase(name)
+
+    def language(self, file_name, file_handler=None):
+        """ Return the file extension in the .csv file for file_name, found by self.index. When the name isn't
+        enough and file_handler is given, the first line read from it is sniffed for a "#!" line and it is then
+        rewound.
+
+        @param CommentChecker self:
+        @param str file_name:
+        @param io.IOBase file_handler:
+        @rtype: str:
+        """
+
+        extension = self.index.resolve(file_name)
+        if extension is None and file_handler is not None:
+            extension = self.index.sniff(file_handler.readline(256))
+            file_handler.seek(0)
+
+        if extension not in self.single_commenting_syntax or extension not in self.multi_commenting_syntax:
+            raise UnknownSyntaxError("Please add the syntax for commenting for that specific langauge in the .csv "
+                                     "file to proceed.")
+
+        return extension
+
+    def patterns(self, extension):
+        """ Return the compiled regex for identifying single line comments and the compiled regex from
+        label_regex for identifying and labelling both single line and multi line comments in files with extension.
+
+        @param CommentChecker self:
+        @param str extension:
+        @rtype: re.Pattern single_line_regex:
+        @rtype: re.Pattern regex:
+        """
+
+        if extension not in self._patterns:
+            with self._phase("build_regex"):
+                if extension in self._regexes:
+                    single_line_regex, regex = self._regexes[extension]
+                else:
+                    single_line_regex, regex = build_regex(self.single_commenting_syntax,
+                                                           self.multi_commenting_syntax, extension)
+                    regex = label_regex(single_line_regex, regex)
+                self._patterns[extension] = re.compile(single_line_regex, re.M), re.compile(regex, re.M)
+
+        return self._patterns[extension]
+
+    def byte_syntax(self, extension):
+        """ Return the single line and multi line commenting syntaxes for extension as bytes, for scanning files
+        without decoding them.
+
+        @param CommentChecker self:
+        @param str extension:
+        @rtype: list single_syntax:
+        @rtype: list multi_syntax:
+        """
+
+        if extension not in self._byte_syntaxes:
+            self._byte_syntaxes[extension] = [syntax.encode() for syntax in self.single_commenting_syntax[extension]], \
+                [syntax.encode() for syntax in self.multi_commenting_syntax[extension]]
+
+        return self._byte_syntaxes[extension]
+
+    def lexer(self, extension):
+        """ Return the Lexer for files with extension.
+
+        @param CommentChecker self:
+        @param str extension:
+        @rtype: Lexer:
+        """
+
+        if extension not in self._lexers:
+            with self._phase("build_lexer"):
+                if self.lexer_options is None:
+                    self.lexer_options = read_lexer_options(self.csv_file)
+                self._lexers[extension] = Lexer(*self.byte_syntax(extension), self.lexer_options.get(extension))
+
+        return self._lexers[extension]
+
+    def delimiter_trie(self, extension):
+        """ Return the DelimiterTrie for files with extension.
+
+        @param CommentChecker self:
+        @param str extension:
+        @rtype: DelimiterTrie:
+        """
+
+        if extension not in self._tries:
+            with self._phase("build_trie"):
+                self._tries[extension] = DelimiterTrie(*self.byte_syntax(extension))
+
+        return self._tries[extension]
+
+    @contextlib.contextmanager
+    def open_buffer(self, file_name):
+        """ Open a file and give its extension in the .csv file and its contents as bytes for as long as the with
+        statement runs, through mmap when it is at least MMAP_THRESHOLD bytes. Files with a UTF-16 or UTF-32 byte
+        order mark are decoded and encoded as UTF-8.
+
+        @param CommentChecker self:
+        @param str file_name:
+        @rtype: generator:
+        """
+
+        try:
+            file_handler = open(file_name, 'rb')
+        except FileNotFoundError:
+            raise SourceFileNotFoundError("Please input program file from the same folder.")
+
+        with file_handler:
+            extension = self.language(file_name, file_handler)
+
+            if os.fstat(file_handler.fileno()).st_size < MMAP_THRESHOLD:
+                contents = file_handler.read()
+                encoding = byte_order_mark_encoding(contents[:4])
+                if encoding in _WIDE_ENCODINGS:
+                    contents = contents.decode(encoding).encode("utf-8")
+                yield extension, contents
+                return
+
+            with mmap.mmap(file_handler.fileno(), 0, access=mmap.ACCESS_READ) as buffer:
+                encoding = byte_order_mark_encoding(buffer[:4])
+                if encoding in _WIDE_ENCODINGS:
+                    yield extension, buffer[:].decode(encoding).encode("utf-8")
+                else:
+                    yield extension, buffer
+
+    def comments(self, file_name):
+        """ Yield a Comment for each comment in a file, found the same way as by file_summary, as the file is
+        scanned. The file is kept open until the generator is finished or closed. Offsets in files with a UTF-16 or
+        UTF-32 byte order mark are offsets in the file decoded and encoded as UTF-8.
+
+        @param CommentChecker self:
+        @param str file_name:
+        @rtype: generator:
+        """
+
+        with self.open_buffer(file_name) as (extension, contents):
+            yield from iter_comments(contents, *self.byte_syntax(extension))
+
+    def file_summary(self, file_name):
+        """ Scan a file and return the total number of lines, comment lines, single line comments,
+        comment lines within block comments, block line comments, and TODO's in the comments.
+
+        @param CommentChecker self:
+        @param str file_name:
+        @rtype: list summary:
+        """
+
+        if self.metrics is not None:
+            return self.metrics.time_file(self._file_summary, file_name)
+
+        return self._file_summary(file_name)
+
+    def _file_summary(self, file_name):
+        """ Scan a file and return its summary for file_summary.
+
+        @param CommentChecker self:
+        @param str file_name:
+        @rtype: list summary:
+        """
+
+        # The file is scanned as bytes, so that files that aren't UTF-8 can be scanned and nothing has to be decoded
+        try:
+            file_handler = open(file_name, 'rb')
+        except FileNotFoundError:
+            raise SourceFileNotFoundError("Please input program file from the same folder.")
+
+        with file_handler:
+            # Identify type of file
+            extension = self.language(file_name, file_handler)
+
+            if self.metrics is not None:
+                with self._phase("detect_encoding"):
+                    self.metrics.add_encoding(detect_encoding(file_handler))
+
+            if os.fstat(file_handler.fileno()).st_size >= MMAP_THRESHOLD:
+                return self._mmap_file_summary(file_name)
+
+            with self._phase("scan"):
+                return self._bytes_summary(file_handler.read(), extension)
+
+    def _bytes_summary(self, contents, extension):
+        """ Scan the contents of a file with extension, which has already been found, as bytes and return its
+        summary. Files in encodings that don't keep ASCII as it is, which are only found from their byte order
+        mark, are decoded first.
+
+        @param CommentChecker self:
+        @param bytes | mmap.mmap contents:
+        @param str extension:
+        @rtype: list summary:
+        """
+
+        encoding = byte_order_mark_encoding(contents[:4])
+        if encoding in _WIDE_ENCODINGS:
+            return scan_comments(io.StringIO(contents[:].decode(encoding), newline=None),
+                                 self.single_commenting_syntax[extension], self.multi_commenting_syntax[extension])
+
+        return scan_buffer(contents, *self.byte_syntax(extension))
+
+    def text_file_summary(self, file_name, encoding=None):
+        """ Scan a file decoded as text in encoding (defaulting to the platform's encoding) and return the same
+        summary as file_summary. Only text files treat a lone carriage return as the end of a line, but decoding
+        makes this slower than file_summary.
+
+        @param CommentChecker self:
+        @param str file_name:
+        @param str encoding:
+        @rtype: list summary:
+        """
+
+        if self.metrics is not None:
+            return self.metrics.time_file(lambda name: self._text_file_summary(name, encoding), file_name)
+
+        return self._text_file_summary(file_name, encoding)
+
+    def _text_file_summary(self, file_name, encoding):
+        """ Scan a file decoded as text and return its summary for text_file_summary.
+
+        @param CommentChecker self:
+        @param str file_name:
+        @param str encoding:
+        @rtype: list summary:
+        """
+
+        try:
+            file_handler = open(file_name, encoding=encoding)
+        except FileNotFoundError:
+            raise SourceFileNotFoundError("Please input program file from the same folder.")
+
+        with file_handler, self._phase("scan"):
+            extension = self.language(file_name, file_handler)
+            return scan_comments(file_handler, self.single_commenting_syntax[extension],
+                                 self.multi_commenting_syntax[extension])
+
+    def mmap_file_summary(self, file_name):
+        """ Scan a file through mmap and return the same summary as file_summary. Only the parts of the file being
+        searched are in memory at any time, however long its lines are.
+
+        @param CommentChecker self:
+        @param str file_name:
+        @rtype: list summary:
+        """
+
+        if self.metrics is not None:
+            return self.metrics.time_file(self._mmap_file_summary, file_name)
+
+        return self._mmap_file_summary(file_name)
+
+    def _mmap_file_summary(self, file_name):
+        """ Scan a file through mmap and return its summary for mmap_file_summary.
+
+        @param CommentChecker self:
+        @param str file_name:
+        @rtype: list summary:
+        """
+
+        with open(file_name, 'rb') as file_handler, self._phase("scan"):
+            extension = self.language(file_name, file_handler)
+
+            # An empty file can't be mapped
+            if os.fstat(file_handler.fileno()).st_size == 0:
+                return self._bytes_summary(b'', extension)
+            with mmap.mmap(file_handler.fileno(), 0, access=mmap.ACCESS_READ) as buffer:
+                return self._bytes_summary(buffer, extension)
+
+    def chunked_file_summary(self, file_name, workers=None, chunk_size=CHUNK_SIZE):
+        """ Scan a file in chunks of about chunk_size bytes, split at line feeds, in a pool of worker processes and
+        return the same summary as file_summary. This is for files big enough that scanning them on one CPU is
+        what takes the time. With one worker, or a file that fits in one chunk, the file is scanned whole.
+
+        @param CommentChecker self:
+        @param str file_name:
+        @param int workers: number of worker processes (defaults to the number of CPUs)
+        @param int chunk_size:
+        @rtype: list summary:
+        """
+
+        if self.metrics is not None:
+            return self.metrics.time_file(lambda name: self._chunked_file_summary(name, workers, chunk_size),
+                                          file_name)
+
+        return self._chunked_file_summary(file_name, workers, chunk_size)
+
+    def _chunked_file_summary(self, file_name, workers, chunk_size):
+        """ Scan a file in chunks and return its summary for chunked_file_summary.
+
+        @param CommentChecker self:
+        @param str file_name:
+        @param int workers:
+        @param int chunk_size:
+        @rtype: list summary:
+        """
+
+        try:
+            file_handler = open(file_name, 'rb')
+        except FileNotFoundError:
+            raise SourceFileNotFoundError("Please input program file from the same folder.")
+
+        with file_handler:
+            extension = self.language(file_name, file_handler)
+
+            # Files that have to be decoded first can't be split into chunks of bytes
+            if os.fstat(file_handler.fileno()).st_size == 0 or \
+                    byte_order_mark_encoding(file_handler.read(4)) in _WIDE_ENCODINGS:
+                return self._file_summary(file_name)
+
+            single_syntax, multi_syntax = self.byte_syntax(extension)
+            with mmap.mmap(file_handler.fileno(), 0, access=mmap.ACCESS_READ) as buffer, self._phase("scan"):
+                chunks = []
+                start = 0
+                while start < len(buffer):
+                    end = buffer.find(b'\n', start + chunk_size)
+                    end = len(buffer) if end == -1 else end + 1
+                    chunks.append((start, end))
+                    start = end
+
+                # A worker process can't start workers of its own, and one process is faster scanning the whole
+                # buffer than scanning it in chunks and merging them
+                if workers is None:
+                    workers = os.cpu_count() or 1
+                if workers > 1 and len(chunks) > 1:
+                    import multiprocessing
+                    if multiprocessing.current_process().daemon:
+                        workers = 1
+                if workers == 1 or len(chunks) == 1:
+                    return scan_buffer(buffer, single_syntax, multi_syntax)
+
+                jobs = [(file_name, start, end, single_syntax, multi_syntax) for start, end in chunks]
+                return merge_chunks(buffer, chunks, scan_files(jobs, workers, _scan_chunk_job), single_syntax,
+                                    multi_syntax)
+
+    def text_summary(self, text, extension):
+        """ Scan the text of a file with extension (or the file's name) that is already in memory and return the
+        same summary as file_summary.
+
+        @param CommentChecker self:
+        @param str text:
+        @param str extension:
+        @rtype: list summary:
+        """
+
+        file_handler = io.StringIO(text, newline=None)
+        extension = self.language(extension, file_handler)
+
+        with self._phase("scan"):
+            return scan_comments(file_handler, self.single_commenting_syntax[extension],
+                                 self.multi_commenting_syntax[extension])
+
+    def buffer_summary(self, extension, contents):
+        """ Scan the contents of a file with extension, as bytes or text, and return the same summary as
+        file_summary. Bytes are scanned without decoding them, the same way file_summary scans files.
+
+        @param CommentChecker self:
+        @param str extension:
+        @param bytes | str contents:
+        @rtype: list summary:
+        """
+
+        if not isinstance(contents, bytes):
+            return self.text_summary(contents, extension)
+
+        extension = self.language(extension, io.BytesIO(contents))
+        with self._phase("scan"):
+            return self._bytes_summary(contents, extension)
+
+    def lexer_file_summary(self, file_name):
+        """ Scan a file with the Lexer for its extension and return its summary. Unlike file_summary, commenting
+        syntax inside string literals isn't counted, block comments that nest are counted whole and single line
+        comments are only counted where they really start a comment.
+
+        @param CommentChecker self:
+        @param str file_name:
+        @rtype: list summary:
+        """
+
+        if self.metrics is not None:
+            return self.metrics.time_file(self._lexer_file_summary, file_name)
+
+        return self._lexer_file_summary(file_name)
+
+    def _lexer_file_summary(self, file_name):
+        """ Scan a file with the lexer and return its summary for lexer_file_summary.
+
+        @param CommentChecker self:
+        @param str file_name:
+        @rtype: list summary:
+        """
+
+        try:
+            file_handler = open(file_name, 'rb')
+        except FileNotFoundError:
+            raise SourceFileNotFoundError("Please input program file from the same folder.")
+
+        with file_handler:
+            extension = self.language(file_name, file_handler)
+            lexer = self.lexer(extension)
+
+            with self._phase("scan"):
+                if os.fstat(file_handler.fileno()).st_size < MMAP_THRESHOLD:
+                    return self._lexer_bytes_summary(file_handler.read(), lexer)
+                with mmap.mmap(file_handler.fileno(), 0, access=mmap.ACCESS_READ) as buffer:
+                    return self._lexer_bytes_summary(buffer, lexer)
+
+    def _lexer_bytes_summary(self, contents, lexer):
+        """ Scan the contents of a file with lexer and return its summary, first recoding files in encodings that
+        don't keep ASCII as it is to UTF-8.
+
+        @param CommentChecker self:
+        @param bytes | mmap.mmap contents:
+        @param Lexer lexer:
+        @rtype: list summary:
+        """
+
+        encoding = byte_order_mark_encoding(contents[:4])
+        if encoding in _WIDE_ENCODINGS:
+            contents = contents[:].decode(encoding).encode("utf-8")
+
+        return lexer.scan(contents)
+
+    def trie_file_summary(self, file_name):
+        """ Scan a file with the DelimiterTrie for its extension and return the same summary as file_summary.
+
+        @param CommentChecker self:
+        @param str file_name:
+        @rtype: list summary:
+        """
+
+        if self.metrics is not None:
+            return self.metrics.time_file(self._trie_file_summary, file_name)
+
+        return self._trie_file_summary(file_name)
+
+    def _trie_file_summary(self, file_name):
+        """ Scan a file with the trie and return its summary for trie_file_summary.
+
+        @param CommentChecker self:
+        @param str file_name:
+        @rtype: list summary:
+        """
+
+        try:
+            file_handler = open(file_name, 'rb')
+        except FileNotFoundError:
+            raise SourceFileNotFoundError("Please input program file from the same folder.")
+
+        with file_handler:
+            extension = self.language(file_name, file_handler)
+            trie = self.delimiter_trie(extension)
+
+            with self._phase("scan"):
+                contents = file_handler.read()
+                # Files in encodings that don't keep ASCII as it is are decoded and scanned the same way as by
+                # file_summary
+                if byte_order_mark_encoding(contents[:4]) in _WIDE_ENCODINGS:
+                    return self._bytes_summary(contents, extension)
+                return trie.scan(contents)
+
+    def regex_file_summary(self, file_name):
+        """ Scan a file and return the same summary as file_summary by running the regexes from build_regex over
+        the whole file. This is slower and uses more memory than file_summary, and is kept to check it against.
+
+        @param CommentChecker self:
+        @param str file_name:
+        @rtype: list summary:
+        """
+
+        if self.metrics is not None:
+            return self.metrics.time_file(self._regex_file_summary, file_name)
+
+        return self._regex_file_summary(file_name)
+
+    def _regex_file_summary(self, file_name):
+        """ Scan a file with the regexes and return its summary for regex_file_summary.
+
+        @param CommentChecker self:
+        @param str file_name:
+        @rtype: list summary:
+        """
+
+        # Create a string containing the whole file, identifying the type of file first
+        try:
+            with open(file_name) as file_handler, self._phase("read"):
+                extension = self.language(file_name, file_handler)
+                whole_file = file_handler.read()
+        except FileNotFoundError:
+            raise SourceFileNotFoundError("Please input program file from the same folder.")
+
+        # Get the compiled regexes for this type of file
+        single_line_regex, regex = self.patterns(extension)
+
+        # Create list of all comments (single or block) for that langauge, and count single line comments
+        with self._phase("findall"):
+            all_comments = list(regex.finditer(whole_file))
+            single_line_comments = sum(1 for match in single_line_regex.finditer(whole_file))
+
+        with self._phase("classification"):
+            # Total lines are the non-blank lines
+            total_lines = sum(1 for line in whole_file.split('\n') if line.strip())
+            comment_lines, comment_lines_within_block, block_line_comments, todos = 0, 0, 0, 0
+
+            # Go through the comments once, using the group that matched to tell them apart
+            for match in all_comments:
+                comment = match.group()
+                lines = comment.count('\n') + 1
+                comment_lines += lines
+                if match.lastgroup == 'block':
+                    block_line_comments += 1
+                    comment_lines_within_block += lines
+                if 'TODO' in comment:
+                    todos += 1
+
+        summary = [total_lines, comment_lines, single_line_comments, comment_lines_within_block, block_line_comments,
+                   todos]
+
+        return summary
+
+
+# Comment checkers that have already been created in this process, keyed on the .csv file
+_checkers = {}
+
+
+def get_checker(csv_file):
+    """ Return the comment checker for csv_file, creating it only the first time it is needed in this process
+    or when the csv_file has been modified since.
+
+    @param str csv_file:
+    @rtype: CommentChecker:
+    """
+
+    try:
+        stat = os.stat(csv_file)
+        key = (os.path.abspath(csv_file), stat.st_mtime_ns, stat.st_size)
+    except OSError:
+        # Let CommentChecker report the missing csv file
+        return CommentChecker(csv_file)
+
+    if key not in _checkers:
+        _checkers[key] = CommentChecker(csv_file)
+
+    return _checkers[key]
+
+
+def file_summary(csv_file, file_name):
+    """ Scan a file and output the total number of lines, comment lines, single line comments,
+    comment lines within block comments, block line comments, and TODO's in the comments.
+
+    @param str csv_file:
+    @param str file_name:
+    @rtype: list summary:
+    """
+
+    return get_checker(csv_file).file_summary(file_name)
+
+
+def file_comments(csv_file, file_name):
+    """ Yield a Comment for each comment in a file, using the commenting syntaxes in csv_file.
+
+    @param str csv_file:
+    @param str file_name:
+    @rtype: generator:
+    """
+
+    return get_checker(csv_file).comments(file_name)
+
+
+def buffer_summary(csv_file, extension, contents):
+    """ Scan the contents of a file with extension, as bytes or text, and return the total number of lines,
+    comment lines, single line comments, comment lines within block comments, block line comments, and TODO's in
+    the comments.
+
+    @param str csv_file:
+    @param str extension:
+    @param bytes | str contents:
+    @rtype: list summary:
+    """
+
+    return get_checker(csv_file).buffer_summary(extension, contents)
+
+
+def buffer_summaries(csv_file, buffers):
+    """ Scan a list of (extension, contents) pairs and return the summary of each.
+
+    @param str csv_file:
+    @param list buffers:
+    @rtype: list:
+    """
+
+    checker = get_checker(csv_file)
+    return [checker.buffer_summary(extension, contents) for extension, contents in buffers]
+
+
+def print_summary(summary):
+    """ Print the six counts of a summary list to standard out.
+
+    @param list summary:
+    @rtype: NoneType:
+    """
+
+    total_lines, comment_lines, single_line_comments, comment_lines_within_block, block_line_comments, todos\
+        = summary
+
+    # Print out Counts
+    print("Total # of lines: {}".format(total_lines))
+    print("Total # of comment lines: {}".format(comment_lines))
+    print("Total # of single line comments: {}".format(single_line_comments))
+    print("Total # of comment lines within block comments: {}".format(comment_lines_within_block))
+    print("Total # of block line comments: {}".format(block_line_comments))
+    print("Total # of TODO's : {}".format(todos))
+
+
+def output_file_summary(csv_file, file_name, metrics=None, engine="scan", workers=None):
+    """ Scan a file and output the total number of lines, comment lines, single line comments,
+    comment lines within block comments, block line comments, and TODO's in the comments.
+
+    @param str csv_file:
+    @param str file_name:
+    @param ScanMetrics metrics: metrics to collect while scanning
+    @param str engine: engine in ENGINES to scan the file with
+    @param int workers: number of worker processes for a file scanned in chunks (defaults to the number of CPUs)
+    @rtype: NoneType:
+    """
+
+    # The checker the csv file was already read into collects the metrics, rather than reading it again
+    checker = get_checker(csv_file)
+    checker.metrics = metrics
+    try:
+        summary = summarize_file(checker, file_name, engine, workers)
+    finally:
+        checker.metrics = None
+
+    print_summary(summary)
+
+
+def find_source_files(paths, extension_list, shebang=False):
+    """ Expand a list of files, directories and glob patterns into the files whose extension (or name) has
+    commenting syntax in the .csv file, ignoring case. Directories are walked recursively, skipping hidden
+    directories such as .git. When shebang is true, other files whose "#!" line names an interpreter with
+    commenting syntax are found as well.
+
+    @param list paths:
+    @param list extension_list:
+    @param bool shebang:
+    @rtype: generator:
+    """
+
+    index = SyntaxIndex(extension_list)
+    for path in paths:
+        # Expand glob patterns (including ** for recursive patterns)
+        if glob.has_magic(path):
+            matches = sorted(glob.glob(path, recursive=True))
+        else:
+            matches = [path]
+
+        for match in matches:
+            if os.path.isdir(match):
+                for root, dirs, files in os.walk(match):
+                    dirs[:] = sorted(directory for directory in dirs if not directory.startswith('.'))
+                    for name in sorted(files):
+                        if _has_syntax(index, os.path.join(root, name), shebang):
+                            yield os.path.join(root, name)
+            elif _has_syntax(index, match, shebang):
+                yield match
+
+
+def _has_syntax(index, file_name, shebang):
+    """ Return whether index finds commenting syntax for file_name, sniffing its "#!" line when shebang is true.
+
+    @param SyntaxIndex index:
+    @param str file_name:
+    @param bool shebang:
+    @rtype: bool:
+    """
+
+    if index.resolve(file_name) is not None:
+        return True
+    if not shebang:
+        return False
+
+    try:
+        with open(file_name, 'rb') as file_handler:
+            return index.sniff(file_handler.readline(256)) is not None
+    except OSError:
+        return False
+
+
+@contextlib.contextmanager
+def time_limit(seconds):
+    """ Raise ScanTimeoutError in the with statement if it runs for longer than seconds. Only the main thread of
+    a process can be interrupted, and not on Windows, so there is no limit anywhere else (or when seconds is None).
+
+    @param float seconds:
+    @rtype: generator:
+    """
+
+    if not seconds or not hasattr(signal, "setitimer") or threading.current_thread() is not threading.main_thread():
+        yield
+        return
+
+    def interrupt(signal_number, frame):
+        raise ScanTimeoutError("Scanning took longer than {} seconds.".format(seconds))
+
+    previous = signal.signal(signal.SIGALRM, interrupt)
+    signal.setitimer(signal.ITIMER_REAL, seconds)
+    try:
+        yield
+    finally:
+        signal.setitimer(signal.ITIMER_REAL, 0)
+        signal.signal(signal.SIGALRM, previous)
+
+
+def failure_kind(error):
+    """ Return what kind of failure error is when scanning a file: "timeout", "unknown_syntax", "decode_error"
+    or "unreadable".
+
+    @param Exception error:
+    @rtype: str:
+    """
+
+    if isinstance(error, ScanTimeoutError):
+        return "timeout"
+    if isinstance(error, UnknownSyntaxError):
+        return "unknown_syntax"
+    if isinstance(error, UnicodeDecodeError):
+        return "decode_error"
+    return "unreadable"
+
+
+def _file_summary_job(job, workers=None):
+    """ Run the file summary method of engine for a (csv_file, file_name, hashed, profiled, keep_going, timeout,
+    engine) job and return the file name with its summary, so that results coming back from a process pool in any
+    order can be matched with their file. A file scanned in chunks is scanned by workers worker processes. When
+    hashed is true, the (file_stamp, hash) of the contents that were scanned is returned as well for the result
+    cache, or None if the file changed while it was being scanned, and when profiled is true, the metrics collected
+    while scanning it. Scanning is stopped after timeout seconds.
+
+    When keep_going is true, a file that can't be scanned is returned with a summary of None and its failure as
+    (failure_kind, message) instead of raising an error, so that one bad file doesn't stop the other files.
+
+    @param tuple job:
+    @param int workers:
+    @rtype: tuple:
+    """
+
+    csv_file, file_name, hashed, profiled, keep_going, timeout, engine = job
+    cached, metrics = None, None
+
+    try:
+        with time_limit(timeout):
+            checker = get_checker(csv_file)
+            if hashed:
+                stamp = file_stamp(file_name)
+            if profiled:
+                checker.metrics = metrics = ScanMetrics()
+            try:
+                summary = summarize_file(checker, file_name, engine, workers)
+            finally:
+                checker.metrics = None
+
+            # The contents hashed are the ones scanned only if the file is the same after hashing it as it was
+            # before scanning it
+            if hashed:
+                content_hash = hash_file(file_name)
+                if file_stamp(file_name) == stamp:
+                    cached = stamp, content_hash
+    except (CommentCheckerError, OSError, UnicodeDecodeError) as error:
+        if not keep_going:
+            raise
+        return file_name, None, None, metrics, (failure_kind(error), str(error))
+
+    return file_name, summary, cached, metrics, None
+
+
+def _scan_chunk_job(job):
+    """ Run scan_chunk for a (file_name, start, end, single_syntax, multi_syntax) job and return the start of the
+    chunk with its ChunkResult, so that results coming back from a process pool in any order can be put back in
+    order. The file is mapped again in the worker rather than the chunk being sent to it.
+
+    @param tuple job:
+    @rtype: tuple:
+    """
+
+    file_name, start, end, single_syntax, multi_syntax = job
+    with open(file_name, 'rb') as file_handler:
+        with mmap.mmap(file_handler.fileno(), 0, access=mmap.ACCESS_READ) as buffer:
+            return start, scan_chunk(buffer, start, end, single_syntax, multi_syntax)
+
+
+def summary_method(file_name, engine="scan"):
+    """ Return the name of the CommentChecker method that scans file_name with engine: the one in ENGINES, except
+    for files of at least CHUNK_THRESHOLD bytes scanned line by line, which are scanned in chunks.
+
+    @param str file_name:
+    @param str engine:
+    @rtype: str:
+    """
+
+    try:
+        chunked = engine == "scan" and os.path.getsize(file_name) >= CHUNK_THRESHOLD
+    except OSError:
+        chunked = False
+
+    return "chunked_file_summary" if chunked else ENGINES[engine]
+
+
+def summarize_file(checker, file_name, engine="scan", workers=None):
+    """ Scan file_name with the method summary_method picks and return its summary. A file scanned in chunks is
+    scanned by workers worker processes.
+
+    @param CommentChecker checker:
+    @param str file_name:
+    @param str engine: engine in ENGINES to scan the file with
+    @param int workers: number of worker processes for a file scanned in chunks (defaults to the number of CPUs)
+    @rtype: list summary:
+    """
+
+    method = summary_method(file_name, engine)
+    if method == "chunked_file_summary":
+        return checker.chunked_file_summary(file_name, workers)
+
+    return getattr(checker, method)(file_name)
+
+
+def merge_summaries(results, index=None):
+    """ Merge (file_name, summary) pairs into per extension totals and grand totals. Files are put under the
+    extension index finds for them, when an index is given, so that ".JAVA" and ".java" files are added up
+    together.
+
+    @param iterable results:
+    @param SyntaxIndex index:
+    @rtype: dict extension_totals:
+    @rtype: list grand_totals:
+    @rtype: int file_count:
+    """
+
+    extension_totals = {}
+    grand_totals = [0, 0, 0, 0, 0, 0]
+    file_count = 0
+
+    for file_name, summary in results:
+        extension = _extension(file_name, index)
+        totals = extension_totals.setdefault(extension, [0, 0, 0, 0, 0, 0])
+        for i, count in enumerate(summary):
+            totals[i] += count
+            grand_totals[i] += count
+        file_count += 1
+
+    return extension_totals, grand_totals, file_count
+
+
+def _extension(file_name, index=None):
+    """ Return the extension that file_name is counted under: the one index finds for it, or otherwise the
+    extension of its name.
+
+    @param str file_name:
+    @param SyntaxIndex index:
+    @rtype: str:
+    """
+
+    extension = index.resolve(file_name) if index is not None else None
+    return os.path.splitext(file_name)[1] if extension is None else extension
+
+
+def worker_pool(workers=None):
+    """ Return a context manager giving a pool of worker processes for scan_files to share between several lists of
+    jobs, so that the processes are only started once, or None when there is only one worker.
+
+    @param int workers: number of worker processes (defaults to the number of CPUs)
+    @rtype: contextlib.AbstractContextManager:
+    """
+
+    if workers is None:
+        workers = os.cpu_count() or 1
+    if workers <= 1:
+        return contextlib.nullcontext()
+
+    import multiprocessing
+    return multiprocessing.Pool(workers)
+
+
+def scan_files(jobs, workers=None, job_function=_file_summary_job, pool=None):
+    """ Run job_function on every job using a pool of worker processes and yield the results as they complete.
+
+    @param list jobs:
+    @param int workers: number of worker processes (defaults to the number of CPUs)
+    @param function job_function:
+    @param multiprocessing.pool.Pool pool: pool from worker_pool to use rather than starting one for these jobs
+    @rtype: generator:
+    """
+
+    if workers is None:
+        workers = os.cpu_count() or 1
+    workers = max(1, min(workers, len(jobs)))
+
+    # No point paying for process start up when there is only one worker
+    if workers == 1:
+        yield from map(job_function, jobs)
+        return
+
+    # Hand files out in chunks so that the workers are not waiting on the parent for every single file
+    chunksize = max(1, min(256, len(jobs) // (workers * 4)))
+    if pool is not None:
+        yield from pool.imap_unordered(job_function, jobs, chunksize)
+        return
+
+    # Only imported when it is needed, since it is slow to import and most runs scan a single file
+    import multiprocessing
+
+    with multiprocessing.Pool(workers) as pool:
+        yield from pool.imap_unordered(job_function, jobs, chunksize)
+
+
+def scan_tree(csv_file, paths, workers=None, cache=None, metrics=None, shebang=False, keep_going=False,
+              timeout=None, engine="scan"):
+    """ Scan every file found under a list of files, directories and glob patterns using a pool of worker
+    processes, and yield (file_name, summary, failure) for each file as the results complete. When a result cache
+    is given, only files that changed since they were cached are scanned, and files that no longer exist are
+    evicted.
+
+    failure is None, unless keep_going is true and the file couldn't be scanned, when it is (failure_kind, message)
+    and summary is None.
+
+    @param str csv_file:
+    @param list paths:
+    @param int workers: number of worker processes (defaults to the number of CPUs)
+    @param ResultCache cache:
+    @param ScanMetrics metrics: metrics to add the metrics collected by the workers to
+    @param bool shebang: also scan files found from their "#!" line
+    @param bool keep_going: carry on with the other files when a file can't be scanned
+    @param float timeout: most seconds spent scanning any one file (defaults to no limit)
+    @param str engine: engine in ENGINES to scan files with, which the cache should have been opened for
+    @rtype: generator:
+    """
+
+    checker = get_checker(csv_file)
+
+    # Files big enough to be scanned in chunks are scanned last, by this process, so that their chunks get every
+    # worker to themselves
+    jobs, chunked_jobs = [], []
+    for file_name in find_source_files(paths, checker.extension_list, shebang):
+        summary = cache.lookup(file_name) if cache is not None else None
+        if summary is None:
+            job = (csv_file, file_name, cache is not None, metrics is not None, keep_going, timeout, engine)
+            (chunked_jobs if summary_method(file_name, engine) == "chunked_file_summary" else jobs).append(job)
+        else:
+            yield file_name, summary, None
+
+    results = itertools.chain(scan_files(jobs, workers), (_file_summary_job(job, workers) for job in chunked_jobs))
+    for file_name, summary, cached, file_metrics, failure in results:
+        if cache is not None and cached is not None:
+            cache.store(file_name, summary, *cached)
+        if metrics is not None and file_metrics is not None:
+            metrics.merge(file_metrics)
+        yield file_name, summary, failure
+
+    if cache is not None:
+        cache.evict_missing()
+
+
+def _scan_paths(csv_file, paths, workers, cache, metrics, shebang, keep_going, timeout, engine, archives):
+    """ Yield (file_name, summary, failure) for every file scanned by scan_tree, or by scan_archives from
+    comment_archive when archives is true, where the cache, metrics, timeout and engine don't apply.
+
+    @param str csv_file:
+    @param list paths:
+    @param int workers:
+    @param ResultCache cache:
+    @param ScanMetrics metrics:
+    @param bool shebang:
+    @param bool keep_going:
+    @param float timeout:
+    @param str engine:
+    @param bool archives:
+    @rtype: generator:
+    """
+
+    if archives:
+        from comment_archive import scan_archives
+        return scan_archives(csv_file, paths, workers, keep_going, shebang)
+
+    return scan_tree(csv_file, paths, workers, cache, metrics, shebang, keep_going, timeout, engine)
+
+
+def tree_summary(csv_file, paths, workers=None, cache=None, metrics=None, shebang=False):
+    """ Scan every file found under a list of files, directories and glob patterns with scan_tree, and merge the
+    results into per extension totals and grand totals.
+
+    @param str csv_file:
+    @param list paths:
+    @param int workers: number of worker processes (defaults to the number of CPUs)
+    @param ResultCache cache:
+    @param ScanMetrics metrics: metrics to add the metrics collected by the workers to
+    @param bool shebang: also scan files found from their "#!" line
+    @rtype: dict extension_totals:
+    @rtype: list grand_totals:
+    @rtype: int file_count:
+    """
+
+    results = scan_tree(csv_file, paths, workers, cache, metrics, shebang)
+    return merge_summaries(((file_name, summary) for file_name, summary, failure in results),
+                           get_checker(csv_file).index)
+
+
+def output_tree_summary(csv_file, paths, workers=None, cache=None, metrics=None, shebang=False, keep_going=False,
+                        timeout=None, engine="scan", rollup=None, archives=False):
+    """ Scan every file found under a list of files, directories and glob patterns and output the counts for
+    each file extension followed by the grand totals. When keep_going is true, files that can't be scanned are
+    reported on standard error as they fail and left out of the totals, and the failures and the number of files
+    scanned per second are output at the end. Returns the number of files that failed.
+
+    @param str csv_file:
+    @param list paths:
+    @param int workers:
+    @param ResultCache cache:
+    @param ScanMetrics metrics:
+    @param bool shebang:
+    @param bool keep_going:
+    @param float timeout:
+    @param str engine:
+    @param RollupTree rollup: rollup tree from comment_rollup to add every file scanned to
+    @param bool archives: paths are tar and zip archives, whose files are scanned without extracting them
+    @rtype: int:
+    """
+
+    failures = collections.Counter()
+    start = time.perf_counter()
+
+    def scanned():
+        for file_name, summary, failure in _scan_paths(csv_file, paths, workers, cache, metrics, shebang,
+                                                       keep_going, timeout, engine, archives):
+            if failure is None:
+                if rollup is not None:
+                    rollup.update(file_name, summary)
+                yield file_name, summary
+            else:
+                failures[failure[0]] += 1
+                print("{}: {}: {}".format(file_name, failure[0], failure[1]), file=sys.stderr)
+
+    extension_totals, grand_totals, file_count = merge_summaries(scanned(), get_checker(csv_file).index)
+    seconds = time.perf_counter() - start
+
+    for extension in sorted(extension_totals):
+        print("[{}]".format(extension))
+        print_summary(extension_totals[extension])
+        print()
+
+    print("Total # of files: {}".format(file_count))
+    print_summary(grand_totals)
+
+    if keep_going:
+        failed = sum(failures.values())
+        print()
+        print("Total # of failed files: {}{}".format(failed, "".join(
+            "\n  {}: {}".format(kind, failures[kind]) for kind in sorted(failures))))
+        print("Scanned {} files in {:.2f} s ({:.1f} files/s)".format(file_count + failed, seconds,
+                                                                     (file_count + failed) / seconds
+                                                                     if seconds else 0.0))
+
+    return sum(failures.values())
+
+
+def write_tree_records(csv_file, paths, writer, workers=None, cache=None, metrics=None, shebang=False,
+                       keep_going=False, timeout=None, engine="scan", rollup=None, archives=False):
+    """ Scan every file found under a list of files, directories and glob patterns with scan_tree, and write a
+    record for each file to writer (one of the writers in comment_output) as soon as its result comes back,
+    followed by the totals. Returns the number of files that failed.
+
+    @param str csv_file:
+    @param list paths:
+    @param object writer:
+    @param int workers:
+    @param ResultCache cache:
+    @param ScanMetrics metrics:
+    @param bool shebang:
+    @param bool keep_going:
+    @param float timeout:
+    @param str engine:
+    @param RollupTree rollup: rollup tree from comment_rollup to add every file scanned to
+    @param bool archives: paths are tar and zip archives, whose files are scanned without extracting them
+    @rtype: int:
+    """
+
+    index = get_checker(csv_file).index
+    failures = collections.Counter()
+
+    def scanned():
+        for file_name, summary, failure in _scan_paths(csv_file, paths, workers, cache, metrics, shebang,
+                                                       keep_going, timeout, engine, archives):
+            writer.write_file(file_name, _extension(file_name, index), summary, failure)
+            if failure is None:
+                if rollup is not None:
+                    rollup.update(file_name, summary)
+                yield file_name, summary
+            else:
+                failures[failure[0]] += 1
+
+    extension_totals, grand_totals, file_count = merge_summaries(scanned(), index)
+    writer.write_totals(extension_totals, grand_totals, file_count, dict(failures))
+
+    return sum(failures.values())
+
+
+def main(argv=None):
+    """ Parse the command line arguments and output the summary for a single file, or the per extension and
+    grand totals when given several files, directories or glob patterns. "merge" followed by the partial results
+    files of every shard of a --shard run outputs the totals of the whole run instead.
+
+    @param list argv:
+    @rtype: NoneType:
+    """
+
+    argv = sys.argv[1:] if argv is None else argv
+    if argv[:1] == ["merge"]:
+        parser = argparse.ArgumentParser(prog="automated_comment_checker.py merge",
+                                         description="merge the partial results of every shard of a --shard run")
+        parser.add_argument("partial", help="please pass in the partial results file of every shard", nargs='+')
+        args = parser.parse_args(argv[1:])
+
+        from comment_shard import output_merged
+        try:
+            failed = output_merged(args.partial)
+        except CommentCheckerError as error:
+            print(error)
+            sys.exit(1)
+        if failed:
+            sys.exit(1)
+        return
+
+    parser = argparse.ArgumentParser()
+    parser.add_argument("csv", help="please pass in .csv file containing commenting syntaxes", type=str)
+    parser.add_argument("file", help="please pass in file, or any number of files, directories and glob patterns",
+                        type=str, nargs='*')
+    parser.add_argument("-j", "--workers", help="number of worker processes used for directories, glob "
+                                                "patterns and files big enough to be scanned in chunks (defaults "
+                                                "to the number of CPUs)", type=int)
+    parser.add_argument("--no-cache", help="scan every file again instead of using the results cached in "
+                                           "the .comment-counter-cache folder", action="store_true")
+    parser.add_argument("--shebang", help="also count files in directories and glob patterns whose extension "
+                                          "isn't in the .csv file when their \"#!\" line names an interpreter "
+                                          "that is", action="store_true")
+    parser.add_argument("--keep-going", help="carry on when a file can't be scanned, reporting it on standard "
+                                             "error, and output the failures and files scanned per second at the "
+                                             "end", action="store_true")
+    parser.add_argument("--timeout", help="most seconds spent scanning any one file of directories and glob "
+                                          "patterns", type=float, metavar="SECONDS")
+    parser.add_argument("--engine", help="scan files line by line, counting comments the way the original "
+                                         "regexes did, or with a lexer that skips over string literals and counts "
+                                         "nested block comments whole (defaults to scan)", choices=sorted(ENGINES),
+                        default="scan")
+    parser.add_argument("--archive", help="the files are tar or zip archives (such as .tar.gz, .whl or .jar), whose "
+                                          "files are scanned straight out of the archive without extracting them",
+                        action="store_true")
+    parser.add_argument("--format", help="output a record for each file as it is scanned, followed by the totals, "
+                                         "as JSON Lines, CSV or a compact columnar binary file, instead of the "
+                                         "totals as text", choices=["text", "jsonl", "csv", "columnar"],
+                        default="text")
+    parser.add_argument("--output", help="file to write the --format records to (defaults to standard out)",
+                        metavar="PATH")
+    parser.add_argument("--git-diff", help="only count the files that changed between two git revisions, given "
+                                           "as A..B, and output how their counts changed", metavar="A..B")
+    parser.add_argument("--markers", help="index the markers (TODO, FIXME, HACK and XXX unless --marker-tags is "
+                                          "given) in the comments of the files, scanning only the files that changed "
+                                          "since they were last indexed, and output the number of each",
+                        action="store_true")
+    parser.add_argument("--marker-tags", help="markers to look for with --markers and --find-marker", nargs='+',
+                        metavar="TAG")
+    parser.add_argument("--find-marker", help="output every marker with TAG in the index from --markers, without "
+                                              "scanning any files, optionally only those with --owner or --issue",
+                        metavar="TAG")
+    parser.add_argument("--owner", help="only find markers with this owner, as in \"TODO(owner)\"")
+    parser.add_argument("--issue", help="only find markers referring to this issue, such as #123 or PROJ-123")
+    parser.add_argument("--shard", help="only scan shard i of N, splitting the files between the shards by size "
+                                        "the same way every time, and write its totals to a partial results file "
+                                        "for the \"merge\" command", metavar="i/N")
+    parser.add_argument("--partial", help="file to write the --shard partial results to (defaults to "
+                                          "comment-counter.shard-i-of-N.json)", metavar="PATH")
+    parser.add_argument("--rollup", help="write the totals of every directory the files are in to this file as "
+                                         "JSON, or read them from it with --rollup-query", metavar="PATH")
+    parser.add_argument("--rollup-query", help="output the totals and comment density of a directory in the "
+                                               "--rollup file and of what is under it, without scanning any files",
+                        metavar="DIR")
+    parser.add_argument("--rollup-depth", help="levels under the --rollup-query directory to output (defaults to 1)",
+                        type=int, default=1, metavar="LEVELS")
+    parser.add_argument("--daemon", help="keep running, watching the files for changes, and answer JSON-RPC "
+                                         "requests for the totals on standard in and out (see comment_daemon.py)",
+                        action="store_true")
+    parser.add_argument("--socket", help="answer --daemon requests on a Unix socket at this path instead",
+                        metavar="PATH")
+    parser.add_argument("--interval", help="seconds between looking for changes with --daemon (defaults to 1)",
+                        type=float, default=1.0, metavar="SECONDS")
+    parser.add_argument("--profile", help="write the time spent in each phase of scanning and counters for each "
+                                          "file to this file", metavar="PATH")
+    parser.add_argument("--profile-format", help="format of the --profile file (defaults to json)",
+                        choices=["json", "prometheus"], default="json")
+    parser.add_argument("--compile-syntax", help="check the .csv file and write its commenting syntaxes to a "
+                                                 "precompiled syntax file next to it, which later runs load instead "
+                                                 "of the .csv file until it changes", action="store_true")
+    args = parser.parse_args(argv)
+
+    try:
+        failed = _run_command(args, parser)
+    except CommentCheckerError as error:
+        print(error)
+        sys.exit(1)
+
+    # Still fail a run that kept going, since its totals are missing the files that failed
+    if failed:
+        sys.exit(1)
+
+
+def _run_command(args, parser):
+    """ Output the summaries asked for by the parsed command line arguments and return the number of files that
+    failed with --keep-going.
+
+    @param argparse.Namespace args:
+    @param argparse.ArgumentParser parser:
+    @rtype: int:
+    """
+
+    if args.compile_syntax:
+        print("Wrote precompiled syntax to {}".format(compile_syntax(args.csv)))
+        return 0
+
+    # Read the csv file first, so that a bad csv file is reported before anything else is done
+    metrics = ScanMetrics() if args.profile else None
+    with _NO_PHASE if metrics is None else metrics.phase("read_csv_file"):
+        get_checker(args.csv)
+
+    if args.git_diff:
+        from comment_git import output_diff_summary
+        output_diff_summary(args.csv, args.git_diff)
+        return 0
+
+    if args.find_marker:
+        from comment_markers import output_marker_query
+        output_marker_query(args.csv, args.find_marker, args.owner, args.issue, args.marker_tags)
+        return 0
+
+    if args.rollup_query is not None:
+        if not args.rollup:
+            parser.error("--rollup-query needs --rollup")
+        from comment_rollup import output_rollup
+        output_rollup(args.rollup, args.rollup_query, args.rollup_depth)
+        return 0
+
+    if not args.file:
+        parser.error("please pass in file")
+
+    if args.daemon:
+        from comment_daemon import run_daemon
+        run_daemon(args.csv, args.file, args.socket, args.interval, args.shebang, args.engine)
+        return 0
+
+    if args.markers:
+        from comment_markers import output_markers
+        output_markers(args.csv, args.file, args.marker_tags, args.workers, args.shebang)
+        return 0
+
+    if args.output and args.format == "text":
+        parser.error("--output needs a --format other than text")
+    if args.archive and args.engine != "scan":
+        parser.error("--archive only scans files line by line")
+    if args.shard and args.format != "text":
+        parser.error("--shard writes partial results instead of --format records")
+
+    paths = args.file
+    if args.shard:
+        from comment_shard import parse_shard
+        from comment_shard import shard_files
+        shard, shards = parse_shard(args.shard)
+        # Archives are split whole, since the files in them can't be found without reading them
+        paths = shard_files(args.file if args.archive else
+                            find_source_files(args.file, get_checker(args.csv).extension_list, args.shebang),
+                            shard, shards)
+        # The files found are looked for again when they are scanned, so names such as "[id].js" mustn't be read
+        # as glob patterns
+        if not args.archive:
+            paths = [glob.escape(path) for path in paths]
+
+    failed = 0
+    if args.format == "text" and len(args.file) == 1 and os.path.isfile(args.file[0]) and not args.rollup and \
+            not args.archive and not args.shard:
+        output_file_summary(args.csv, args.file[0], metrics, args.engine, args.workers)
+    else:
+        rollup = None
+        if args.rollup:
+            from comment_rollup import RollupTree
+            rollup = RollupTree()
+
+        with contextlib.ExitStack() as stack:
+            # Files in archives aren't files the cache can check for changes
+            cache = None if args.no_cache or args.archive else stack.enter_context(ResultCache(args.csv,
+                                                                                               engine=args.engine))
+            if args.shard:
+                from comment_shard import PartialWriter
+                from comment_shard import partial_file_name
+                writer = PartialWriter(args.partial or partial_file_name(shard, shards), shard, shards, args.csv,
+                                       args.engine)
+                failed = write_tree_records(args.csv, paths, writer, args.workers, cache, metrics, args.shebang,
+                                            args.keep_going, args.timeout, args.engine, rollup, args.archive)
+                print("Wrote the partial results of shard {}/{} ({} {}) to {}".format(
+                    shard, shards, len(paths), "archives" if args.archive else "files", writer.file_name))
+            elif args.format == "text":
+                failed = output_tree_summary(args.csv, args.file, args.workers, cache, metrics, args.shebang,
+                                             args.keep_going, args.timeout, args.engine, rollup, args.archive)
+            else:
+                from comment_output import WRITERS
+                writer_class = WRITERS[args.format]
+                if args.output:
+                    file_handler = stack.enter_context(open(args.output, 'wb') if writer_class.binary
+                                                       else open(args.output, 'w', newline=''))
+                else:
+                    file_handler = sys.stdout.buffer if writer_class.binary else sys.stdout
+                failed = write_tree_records(args.csv, args.file, writer_class(file_handler), args.workers, cache,
+                                            metrics, args.shebang, args.keep_going, args.timeout, args.engine,
+                                            rollup, args.archive)
+
+        if rollup is not None:
+            rollup.save(args.rollup)
+
+    if metrics is not None:
+        with open(args.profile, 'w') as file_handler:
+            file_handler.write(metrics.to_json() if args.profile_format == "json" else metrics.to_prometheus())
+
+    return failed
+
+
+if __name__ == "__main__":
+    # Prevent printing stracktrace when raising an exception
+    sys.tracebacklimit = 0
+    # The other modules import this one by name, which would otherwise load it a second time with its own
+    # exception classes and checkers
+    sys.modules.setdefault("automated_comment_checker", sys.modules[__name__])
+    main()
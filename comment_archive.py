@@ -0,0 +1,131 @@
+"""
+Comment Archive: Scan the files in tar and zip archives, such as release tarballs, wheels and jars, straight out
+of the archive without extracting them to disk. Each file is read into memory, scanned by a pool of worker
+processes and counted as "archive/path/in/archive", so the totals are the same as for the extracted tree.
+"""
+
+import io
+import os
+import tarfile
+import zipfile
+
+from automated_comment_checker import CommentCheckerError
+from automated_comment_checker import get_checker
+from automated_comment_checker import failure_kind
+from automated_comment_checker import scan_files
+from automated_comment_checker import worker_pool
+
+# Files that are opened as zip archives; anything else is opened as a tar archive, compressed or not
+ZIP_EXTENSIONS = (".zip", ".whl", ".jar", ".war", ".egg")
+
+# Bytes of files read out of archives before they are handed to the workers, so that a huge archive is never in
+# memory all at once
+ARCHIVE_BATCH_SIZE = 64 * 1024 * 1024
+
+
+class ArchiveError(CommentCheckerError):
+    """ Raised when an archive can't be read.
+    """
+
+
+def iter_archive(archive_name, index, shebang=False):
+    """ Yield (member name, contents) for every regular file in a tar or zip archive whose name (or "#!" line,
+    when shebang is true) index finds commenting syntax for, in the order they are in the archive. Members are
+    read one at a time, and compressed tarballs are read from start to end without seeking.
+
+    @param str archive_name:
+    @param SyntaxIndex index:
+    @param bool shebang:
+    @rtype: generator:
+    """
+
+    # (name, function reading the contents) of every regular file, so that only the files with syntax are read
+    try:
+        if archive_name.lower().endswith(ZIP_EXTENSIONS):
+            with zipfile.ZipFile(archive_name) as archive:
+                members = ((info.filename, lambda info=info: archive.read(info)) for info in archive.infolist()
+                           if not info.is_dir())
+                yield from _wanted_members(members, index, shebang)
+        else:
+            with tarfile.open(archive_name, "r|*") as archive:
+                members = ((member.name, lambda member=member: archive.extractfile(member).read())
+                           for member in archive if member.isfile())
+                yield from _wanted_members(members, index, shebang)
+    except (OSError, EOFError, tarfile.TarError, zipfile.BadZipFile) as error:
+        raise ArchiveError("Couldn't read the archive {}: {}".format(archive_name, error))
+
+
+def _wanted_members(members, index, shebang):
+    """ Yield (name, contents) for the (name, function reading the contents) members that index finds commenting
+    syntax for, from their name or, when shebang is true, from their "#!" line.
+
+    @param iterable members:
+    @param SyntaxIndex index:
+    @param bool shebang:
+    @rtype: generator:
+    """
+
+    for name, read in members:
+        # Hidden directories such as .git are skipped, the same as in find_source_files
+        if any(directory.startswith('.') for directory in name.split("/")[:-1] if directory not in ("", ".")):
+            continue
+        if index.resolve(name) is not None:
+            yield name, read()
+        elif shebang:
+            contents = read()
+            if index.sniff(io.BytesIO(contents).readline(256)) is not None:
+                yield name, contents
+
+
+def _archive_member_job(job):
+    """ Scan the contents of a (csv_file, file_name, contents, keep_going) job and return (file_name, summary,
+    failure), the way scan_tree yields files.
+
+    @param tuple job:
+    @rtype: tuple:
+    """
+
+    csv_file, file_name, contents, keep_going = job
+    try:
+        return file_name, get_checker(csv_file).buffer_summary(file_name, contents), None
+    except (CommentCheckerError, UnicodeDecodeError) as error:
+        if not keep_going:
+            raise
+        return file_name, None, (failure_kind(error), str(error))
+
+
+def scan_archives(csv_file, archives, workers=None, keep_going=False, shebang=False):
+    """ Scan every file with commenting syntax in a list of tar and zip archives using a pool of worker processes,
+    and yield (file_name, summary, failure) for each file like scan_tree, where file_name is the archive's name
+    joined with the file's path in the archive. When keep_going is true, an archive that can't be read is yielded
+    as a failure under its own name, after the files read out of it before that.
+
+    @param str csv_file:
+    @param list archives:
+    @param int workers: number of worker processes (defaults to the number of CPUs)
+    @param bool keep_going: carry on with the other files and archives when one can't be scanned
+    @param bool shebang: also scan files found from their "#!" line
+    @rtype: generator:
+    """
+
+    index = get_checker(csv_file).index
+    jobs, size = [], 0
+
+    # The files are handed to the same workers a batch at a time
+    with worker_pool(workers) as pool:
+        for archive_name in archives:
+            try:
+                for member_name, contents in iter_archive(archive_name, index, shebang):
+                    # Members with absolute paths still go under the archive's name
+                    jobs.append((csv_file, os.path.join(archive_name, member_name.lstrip("/")), contents,
+                                 keep_going))
+                    size += len(contents)
+                    if size >= ARCHIVE_BATCH_SIZE:
+                        yield from scan_files(jobs, workers, _archive_member_job, pool)
+                        jobs, size = [], 0
+            except ArchiveError as error:
+                if not keep_going:
+                    raise
+                yield archive_name, None, (failure_kind(error), str(error))
+
+        yield from scan_files(jobs, workers, _archive_member_job, pool)
@@ -0,0 +1,94 @@
+"""
+Comment Async: Count comments in files that are already in memory from asyncio code, without blocking the event
+loop. The scanning is done in an executor, with a limit on how many buffers are scanned at once.
+"""
+
+import os
+import asyncio
+import collections
+
+from automated_comment_checker import buffer_summary
+from automated_comment_checker import get_checker
+
+
+class AsyncCommentChecker:
+    """ A comment checker for asyncio code. Buffers are scanned in an executor (the event loop's default thread
+    pool unless another executor, such as a ProcessPoolExecutor, is given) and at most max_concurrency are scanned
+    at the same time.
+
+    === Attributes ===
+    @param str csv_file: the .csv file containing the commenting syntaxes
+    @param int max_concurrency: the most buffers scanned at the same time
+    """
+
+    def __init__(self, csv_file, executor=None, max_concurrency=None):
+        """ Create an asyncio comment checker for the commenting syntaxes in csv_file.
+
+        @param AsyncCommentChecker self:
+        @param str csv_file:
+        @param concurrent.futures.Executor executor:
+        @param int max_concurrency: (defaults to the number of CPUs)
+        @rtype: NoneType:
+        """
+
+        # Read the csv file now so that a bad csv file is reported here, rather than on the first buffer
+        get_checker(csv_file)
+
+        self.csv_file = csv_file
+        self.max_concurrency = max_concurrency or os.cpu_count() or 1
+        self._executor = executor
+        self._semaphore = asyncio.Semaphore(self.max_concurrency)
+
+    async def summary(self, extension, contents):
+        """ Scan the contents of a file with extension, as bytes or text, and return its summary. Waits while
+        max_concurrency other buffers are being scanned.
+
+        @param AsyncCommentChecker self:
+        @param str extension:
+        @param bytes | str contents:
+        @rtype: list summary:
+        """
+
+        async with self._semaphore:
+            loop = asyncio.get_running_loop()
+            return await loop.run_in_executor(self._executor, buffer_summary, self.csv_file, extension, contents)
+
+    async def summaries(self, buffers):
+        """ Scan (extension, contents) pairs from an iterable or async iterable and yield their summaries in the
+        same order. The next pair is only taken from buffers once fewer than max_concurrency are being scanned, so
+        a slow consumer holds back the producer.
+
+        @param AsyncCommentChecker self:
+        @param iterable buffers:
+        @rtype: async generator:
+        """
+
+        pending = collections.deque()
+
+        try:
+            async for extension, contents in _iterate(buffers):
+                if len(pending) >= self.max_concurrency:
+                    yield await pending.popleft()
+                pending.append(asyncio.ensure_future(self.summary(extension, contents)))
+
+            while pending:
+                yield await pending.popleft()
+        finally:
+            # Don't leave buffers being scanned when the caller stops early or a scan fails
+            for task in pending:
+                task.cancel()
+
+
+async def _iterate(buffers):
+    """ Iterate over an iterable or an async iterable.
+
+    @param iterable buffers:
+    @rtype: async generator:
+    """
+
+    if hasattr(buffers, "__aiter__"):
+        async for item in buffers:
+            yield item
+    else:
+        for item in buffers:
+            yield item
@@ -0,0 +1,184 @@
+"""
+Comment Cache: An on-disk cache of file summaries, so that files which haven't changed since the last run
+aren't scanned again.
+"""
+
+import os
+import hashlib
+import sqlite3
+
+# Folder the cache is kept in, relative to where the program is run
+CACHE_DIRECTORY = ".comment-counter-cache"
+
+# Changing how files are counted must change this, so that summaries from older versions aren't used
+CACHE_VERSION = 2
+
+# Summaries are saved this many at a time, so that other runs sharing the cache aren't locked out of it until
+# this one is done
+CACHE_BATCH_SIZE = 256
+
+# Most seconds to wait for another run that is saving its changes to the cache
+CACHE_TIMEOUT = 30
+
+
+def hash_file(file_name):
+    """ Return a hash of the contents of a file.
+
+    @param str file_name:
+    @rtype: str:
+    """
+
+    digest = hashlib.blake2b(digest_size=20)
+    with open(file_name, 'rb') as file_handler:
+        for block in iter(lambda: file_handler.read(1 << 20), b''):
+            digest.update(block)
+
+    return digest.hexdigest()
+
+
+def file_stamp(file_name):
+    """ Return the (size, modification time) of a file, which ResultCache checks to tell whether it has changed.
+
+    @param str file_name:
+    @rtype: tuple:
+    """
+
+    stat = os.stat(file_name)
+    return stat.st_size, stat.st_mtime_ns
+
+
+class ResultCache:
+    """ A cache of file summaries kept in an SQLite database. A summary is used again when the file has the same
+    size and modification time as when it was scanned, or failing that the same contents, and the .csv file
+    has the same contents as well.
+
+    Several runs can share the cache at once: it is kept in write-ahead log mode, so reading it never waits on a
+    run saving its changes, and summaries are saved CACHE_BATCH_SIZE at a time in short transactions.
+
+    === Attributes ===
+    @param str syntax_hash: hash of the .csv file, the cache version and the engine the summaries come from
+    """
+
+    def __init__(self, csv_file, directory=CACHE_DIRECTORY, engine="scan"):
+        """ Open (or create) the cache in directory for the commenting syntaxes in csv_file, scanned with engine.
+
+        @param ResultCache self:
+        @param str csv_file:
+        @param str directory:
+        @param str engine:
+        @rtype: NoneType:
+        """
+
+        os.makedirs(directory, exist_ok=True)
+        self.syntax_hash = "{}:{}:{}".format(CACHE_VERSION, hash_file(csv_file), engine)
+        self._connection = sqlite3.connect(os.path.join(directory, "results.sqlite"), timeout=CACHE_TIMEOUT)
+        self._connection.execute("PRAGMA journal_mode=WAL")
+        self._connection.execute("CREATE TABLE IF NOT EXISTS results (path TEXT PRIMARY KEY, size INTEGER, "
+                                 "mtime INTEGER, content_hash TEXT, syntax_hash TEXT, total_lines INTEGER, "
+                                 "comment_lines INTEGER, single_line_comments INTEGER, "
+                                 "comment_lines_within_block INTEGER, block_line_comments INTEGER, todos INTEGER)")
+        self._connection.commit()
+        self._rows = []
+
+    def lookup(self, file_name):
+        """ Return the cached summary of file_name, or None if it has changed or was never scanned.
+
+        @param ResultCache self:
+        @param str file_name:
+        @rtype: list | NoneType:
+        """
+
+        path = os.path.abspath(file_name)
+        row = self._connection.execute("SELECT size, mtime, content_hash, syntax_hash, total_lines, comment_lines, "
+                                       "single_line_comments, comment_lines_within_block, block_line_comments, "
+                                       "todos FROM results WHERE path = ?", (path,)).fetchone()
+        if row is None or row[3] != self.syntax_hash:
+            return None
+
+        try:
+            stat = os.stat(path)
+        except OSError:
+            return None
+
+        if stat.st_size != row[0]:
+            return None
+
+        # The file was touched (for example by a checkout) but may still have the same contents
+        if stat.st_mtime_ns != row[1]:
+            if hash_file(path) != row[2]:
+                return None
+            self._save([path, stat.st_size, stat.st_mtime_ns] + list(row[2:]))
+
+        return list(row[4:])
+
+    def store(self, file_name, summary, stamp, content_hash):
+        """ Store the summary of file_name in the cache, with the file_stamp taken before it was scanned and the
+        hash of the contents that were scanned, so that a file changed while it was being scanned is scanned
+        again next time.
+
+        @param ResultCache self:
+        @param str file_name:
+        @param list summary:
+        @param tuple stamp: (size, modification time) of the file from file_stamp
+        @param str content_hash: hash of the file from hash_file
+        @rtype: NoneType:
+        """
+
+        size, mtime = stamp
+        self._save([os.path.abspath(file_name), size, mtime, content_hash, self.syntax_hash] + summary)
+
+    def _save(self, row):
+        """ Add a row to the rows waiting to be saved, saving them all every CACHE_BATCH_SIZE rows.
+
+        @param ResultCache self:
+        @param list row:
+        @rtype: NoneType:
+        """
+
+        self._rows.append(row)
+        if len(self._rows) >= CACHE_BATCH_SIZE:
+            self.flush()
+
+    def flush(self):
+        """ Save the rows waiting to be saved. They are written in one short transaction, so that other runs are
+        only ever kept waiting for as long as that takes.
+
+        @param ResultCache self:
+        @rtype: NoneType:
+        """
+
+        with self._connection:
+            self._connection.executemany("INSERT OR REPLACE INTO results VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                                         self._rows)
+        self._rows = []
+
+    def evict_missing(self):
+        """ Remove the summaries of files that no longer exist and return how many were removed.
+
+        @param ResultCache self:
+        @rtype: int:
+        """
+
+        self.flush()
+        missing = [(path,) for (path,) in self._connection.execute("SELECT path FROM results")
+                   if not os.path.isfile(path)]
+        with self._connection:
+            self._connection.executemany("DELETE FROM results WHERE path = ?", missing)
+
+        return len(missing)
+
+    def close(self):
+        """ Save the changes to the cache and close it.
+
+        @param ResultCache self:
+        @rtype: NoneType:
+        """
+
+        self.flush()
+        self._connection.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
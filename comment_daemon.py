@@ -0,0 +1,430 @@
+"""
+Comment Daemon: Keep the commenting syntaxes and the summary of every file in a tree in memory, watch the tree
+for changes and answer JSON-RPC requests for the totals over standard in and out or a Unix socket, so that
+editors and dashboards don't have to run the program again for every update.
+
+Requests and responses are JSON-RPC 2.0 objects, one per line. The methods are:
+
+    "totals": the totals for each extension and the grand totals, as in the "totals" record of comment_output
+    "summary": the summary of {"file": file name}, scanning it if it isn't being watched
+    "rollup": the totals of {"directory": directory name} (the current directory by default) and of each file and
+        directory directly in it, as in RollupTree.to_dict, or null if no file being watched is under it
+    "failures": the absolute paths of the files that couldn't be scanned, with their failure as [kind, message]
+    "refresh": look for changes now rather than waiting for the next poll, returning {"scanned": files}
+    "shutdown": stop the daemon
+"""
+
+import os
+import sys
+import json
+import stat
+import threading
+import collections
+import socketserver
+
+from automated_comment_checker import CommentCheckerError
+from automated_comment_checker import ENGINES
+from automated_comment_checker import get_checker
+from automated_comment_checker import find_source_files
+from automated_comment_checker import failure_kind
+from comment_cache import hash_file
+from comment_output import SUMMARY_FIELDS
+from comment_output import totals_record
+from comment_rollup import RollupTree
+
+# Seconds between looking for changes in the tree when no other interval is given
+POLL_INTERVAL = 1.0
+
+# JSON-RPC error codes
+PARSE_ERROR = -32700
+INVALID_REQUEST = -32600
+METHOD_NOT_FOUND = -32601
+INVALID_PARAMS = -32602
+SCAN_ERROR = -32000
+
+
+class CommentDaemon:
+    """ The summaries of every file under a list of files, directories and glob patterns, kept up to date by
+    polling the tree. Only files whose size or modification time changed are scanned again, and the totals are
+    updated as each file is, so asking for them doesn't go through every file. (The standard library has no way of
+    being told about changes to files, so the tree is polled.)
+
+    === Attributes ===
+    @param str csv_file: the .csv file containing the commenting syntaxes
+    @param list paths: files, directories and glob patterns being watched
+    @param float interval: seconds between polls
+    @param bool shebang: also watch files found from their "#!" line
+    @param str engine: engine in ENGINES files are scanned with
+    """
+
+    def __init__(self, csv_file, paths, interval=POLL_INTERVAL, shebang=False, engine="scan"):
+        """ Create a daemon watching paths. Nothing is scanned until refresh or start is called.
+
+        @param CommentDaemon self:
+        @param str csv_file:
+        @param list paths:
+        @param float interval:
+        @param bool shebang:
+        @param str engine:
+        @rtype: NoneType:
+        """
+
+        self.csv_file = csv_file
+        self.paths = paths
+        self.interval = interval
+        self.shebang = shebang
+        self.engine = engine
+
+        # (stamp, extension, summary) of each file scanned, and (stamp, failure) of each file that couldn't be,
+        # keyed on their absolute paths, where the stamp is the file's size and modification time and the hash of
+        # the .csv file it was scanned with
+        self._files = {}
+        self._failures = {}
+        self._extension_files = collections.Counter()
+        self._extension_totals = {}
+        self._grand_totals = [0] * len(SUMMARY_FIELDS)
+        self._rollup = RollupTree()
+
+        # Held while the files and totals change, since requests are answered while the tree is being polled
+        self._lock = threading.Lock()
+        # Held for the whole of a refresh, since a "refresh" request can come in while the tree is being polled
+        self._refreshing = threading.Lock()
+        self._stopped = threading.Event()
+        self._watcher = None
+
+    def _add(self, extension, summary, sign):
+        """ Add summary to (or with a sign of -1, take it away from) the totals.
+
+        @param CommentDaemon self:
+        @param str extension:
+        @param list summary:
+        @param int sign:
+        @rtype: NoneType:
+        """
+
+        totals = self._extension_totals.setdefault(extension, [0] * len(SUMMARY_FIELDS))
+        for i, count in enumerate(summary):
+            totals[i] += sign * count
+            self._grand_totals[i] += sign * count
+
+    def _forget(self, file_name):
+        """ Take a file out of the files and totals.
+
+        @param CommentDaemon self:
+        @param str file_name:
+        @rtype: NoneType:
+        """
+
+        self._failures.pop(file_name, None)
+        if file_name in self._files:
+            stamp, extension, summary = self._files.pop(file_name)
+            self._add(extension, summary, -1)
+            self._rollup.remove(file_name)
+            self._extension_files[extension] -= 1
+            if not self._extension_files[extension]:
+                del self._extension_files[extension]
+                del self._extension_totals[extension]
+
+    def refresh(self):
+        """ Scan the files that are new or changed since the last refresh and forget the ones that are gone.
+        Returns the number of files scanned.
+
+        @param CommentDaemon self:
+        @rtype: int:
+        """
+
+        # Two refreshes at once could each forget the files the other just scanned
+        with self._refreshing:
+            return self._refresh()
+
+    def _refresh(self):
+        """ Scan the new and changed files and forget the ones that are gone for refresh, which holds
+        self._refreshing.
+
+        @param CommentDaemon self:
+        @rtype: int:
+        """
+
+        # Files are scanned again when the .csv file changes, since their summaries depend on its syntaxes
+        syntax_hash = hash_file(self.csv_file)
+        checker = get_checker(self.csv_file)
+        summary = getattr(checker, ENGINES[self.engine])
+        scanned = 0
+        seen = set()
+
+        for file_name in find_source_files(self.paths, checker.extension_list, self.shebang):
+            path = os.path.abspath(file_name)
+            seen.add(path)
+            try:
+                stat = os.stat(path)
+            except OSError:
+                continue
+            stamp = stat.st_size, stat.st_mtime_ns, syntax_hash
+            entry = self._files.get(path) or self._failures.get(path)
+            if entry is not None and entry[0] == stamp:
+                continue
+
+            # Scanned outside of the lock, so that requests are still answered while a big file is scanned
+            scanned += 1
+            try:
+                result = summary(path)
+            except (CommentCheckerError, OSError, UnicodeDecodeError) as error:
+                with self._lock:
+                    self._forget(path)
+                    self._failures[path] = stamp, (failure_kind(error), str(error))
+                continue
+
+            with self._lock:
+                self._forget(path)
+                extension = checker.index.resolve(path) or os.path.splitext(path)[1]
+                self._files[path] = stamp, extension, result
+                self._extension_files[extension] += 1
+                self._add(extension, result, 1)
+                self._rollup.update(path, result)
+
+        with self._lock:
+            for path in [path for path in list(self._files) + list(self._failures) if path not in seen]:
+                self._forget(path)
+
+        return scanned
+
+    def totals(self):
+        """ Return the totals record for the files being watched.
+
+        @param CommentDaemon self:
+        @rtype: dict:
+        """
+
+        with self._lock:
+            failures = {}
+            for stamp, (kind, message) in self._failures.values():
+                failures[kind] = failures.get(kind, 0) + 1
+            return totals_record({extension: list(totals) for extension, totals in self._extension_totals.items()},
+                                 list(self._grand_totals), len(self._files), failures)
+
+    def summary(self, file):
+        """ Return the summary of a file as a dict, from memory when it is being watched. The parameter is called
+        file to match the "summary" request.
+
+        @param CommentDaemon self:
+        @param str file:
+        @rtype: dict:
+        """
+
+        with self._lock:
+            entry = self._files.get(os.path.abspath(file))
+        if entry is None:
+            result = getattr(get_checker(self.csv_file), ENGINES[self.engine])(file)
+        else:
+            result = entry[2]
+
+        return dict(zip(SUMMARY_FIELDS, result))
+
+    def rollup(self, directory="."):
+        """ Return the totals of a directory and of each file and directory directly in it, or None if no file
+        being watched is under it. The parameter is called directory to match the "rollup" request.
+
+        @param CommentDaemon self:
+        @param str directory:
+        @rtype: dict | NoneType:
+        """
+
+        with self._lock:
+            return self._rollup.to_dict(os.path.abspath(directory), 1)
+
+    def failures(self):
+        """ Return the failure of each file that couldn't be scanned, as [kind, message].
+
+        @param CommentDaemon self:
+        @rtype: dict:
+        """
+
+        with self._lock:
+            return {file_name: list(failure) for file_name, (stamp, failure) in self._failures.items()}
+
+    def start(self):
+        """ Scan the tree and then keep polling it every self.interval seconds in a background thread.
+
+        @param CommentDaemon self:
+        @rtype: NoneType:
+        """
+
+        self.refresh()
+        self._watcher = threading.Thread(target=self._watch, daemon=True)
+        self._watcher.start()
+
+    def _watch(self):
+        """ Poll the tree until the daemon is stopped.
+
+        @param CommentDaemon self:
+        @rtype: NoneType:
+        """
+
+        while not self._stopped.wait(self.interval):
+            self.refresh()
+
+    def stop(self):
+        """ Stop polling the tree.
+
+        @param CommentDaemon self:
+        @rtype: NoneType:
+        """
+
+        self._stopped.set()
+        if self._watcher is not None:
+            self._watcher.join()
+
+    def is_stopped(self):
+        """ Return whether the daemon has been stopped.
+
+        @param CommentDaemon self:
+        @rtype: bool:
+        """
+
+        return self._stopped.is_set()
+
+    def handle(self, line):
+        """ Answer one JSON-RPC request and return the response as a line of JSON, or None for a notification.
+
+        @param CommentDaemon self:
+        @param str | bytes line:
+        @rtype: str | NoneType:
+        """
+
+        try:
+            request = json.loads(line)
+        except ValueError:
+            return _response(None, error=(PARSE_ERROR, "Parse error"))
+
+        if not isinstance(request, dict) or not isinstance(request.get("method"), str):
+            return _response(None, error=(INVALID_REQUEST, "Invalid Request"))
+
+        request_id = request.get("id")
+        params = request.get("params") or {}
+        methods = {"totals": self.totals, "summary": self.summary, "rollup": self.rollup, "failures": self.failures,
+                   "refresh": lambda: {"scanned": self.refresh()}, "shutdown": self.stop}
+
+        if request["method"] not in methods:
+            response = _response(request_id, error=(METHOD_NOT_FOUND, "Method not found"))
+        elif not isinstance(params, dict) or not all(isinstance(value, str) for value in params.values()):
+            response = _response(request_id, error=(INVALID_PARAMS, "Invalid params"))
+        else:
+            try:
+                result = methods[request["method"]](**params)
+            except TypeError:
+                response = _response(request_id, error=(INVALID_PARAMS, "Invalid params"))
+            except (CommentCheckerError, OSError, UnicodeDecodeError) as error:
+                response = _response(request_id, error=(SCAN_ERROR, str(error), failure_kind(error)))
+            else:
+                response = _response(request_id, result)
+
+        # Notifications, which have no id, aren't answered
+        return response if "id" in request else None
+
+    def serve(self, input_file=None, output_file=None):
+        """ Answer requests, one per line, from input_file on output_file (standard in and out by default) until
+        input_file ends or a "shutdown" request is answered.
+
+        @param CommentDaemon self:
+        @param io.TextIOBase input_file:
+        @param io.TextIOBase output_file:
+        @rtype: NoneType:
+        """
+
+        input_file = input_file or sys.stdin
+        output_file = output_file or sys.stdout
+
+        for line in input_file:
+            if not line.strip():
+                continue
+            response = self.handle(line)
+            if response is not None:
+                output_file.write(response + "\n")
+                output_file.flush()
+            if self.is_stopped():
+                break
+
+    def serve_socket(self, socket_path):
+        """ Answer requests from any number of clients connected to a Unix socket at socket_path, one per line on
+        each connection, until a "shutdown" request is answered. A socket left at socket_path by an earlier daemon
+        is replaced, but anything else there is an error.
+
+        @param CommentDaemon self:
+        @param str socket_path:
+        @rtype: NoneType:
+        """
+
+        daemon = self
+
+        class Handler(socketserver.StreamRequestHandler):
+            def handle(self):
+                for line in self.rfile:
+                    if not line.strip():
+                        continue
+                    response = daemon.handle(line)
+                    if response is not None:
+                        self.wfile.write(response.encode() + b"\n")
+                    if daemon.is_stopped():
+                        threading.Thread(target=server.shutdown).start()
+                        break
+
+        try:
+            mode = os.stat(socket_path).st_mode
+        except FileNotFoundError:
+            pass
+        else:
+            if not stat.S_ISSOCK(mode):
+                raise CommentCheckerError("{} already exists and isn't a socket.".format(socket_path))
+            os.remove(socket_path)
+        server = socketserver.ThreadingUnixStreamServer(socket_path, Handler)
+        server.daemon_threads = True
+        try:
+            server.serve_forever()
+        finally:
+            server.server_close()
+            os.remove(socket_path)
+
+
+def _response(request_id, result=None, error=None):
+    """ Return a JSON-RPC response as a line of JSON, with the result or the error as (code, message) or
+    (code, message, data).
+
+    @param object request_id:
+    @param object result:
+    @param tuple error:
+    @rtype: str:
+    """
+
+    response = {"jsonrpc": "2.0", "id": request_id}
+    if error is None:
+        response["result"] = result
+    else:
+        response["error"] = {"code": error[0], "message": error[1]}
+        if len(error) > 2:
+            response["error"]["data"] = error[2]
+
+    return json.dumps(response)
+
+
+def run_daemon(csv_file, paths, socket_path=None, interval=POLL_INTERVAL, shebang=False, engine="scan"):
+    """ Scan paths, then watch them and answer requests on standard in and out, or on a Unix socket when
+    socket_path is given, until told to shut down.
+
+    @param str csv_file:
+    @param list paths:
+    @param str socket_path:
+    @param float interval:
+    @param bool shebang:
+    @param str engine:
+    @rtype: NoneType:
+    """
+
+    daemon = CommentDaemon(csv_file, paths, interval, shebang, engine)
+    daemon.start()
+    try:
+        if socket_path is None:
+            daemon.serve()
+        else:
+            daemon.serve_socket(socket_path)
+    finally:
+        daemon.stop()
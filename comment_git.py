@@ -0,0 +1,134 @@
+"""
+Comment Git: Count comments only in the files that changed between two git revisions, reading both versions of
+each file straight from the repository so that neither revision has to be checked out.
+"""
+
+import os
+import subprocess
+
+from automated_comment_checker import get_checker
+
+
+def changed_files(first, second, repository="."):
+    """ Return the paths of the files that changed between two revisions, relative to the top of the repository.
+
+    @param str first:
+    @param str second:
+    @param str repository:
+    @rtype: list:
+    """
+
+    output = subprocess.run(["git", "-C", repository, "diff", "--name-only", "--no-renames", "-z",
+                             "{}..{}".format(first, second)], stdout=subprocess.PIPE, check=True).stdout
+    return [os.fsdecode(path) for path in output.split(b'\0') if path]
+
+
+class BlobReader:
+    """ Read the contents of files at any revision through one long running "git cat-file --batch" process.
+    """
+
+    def __init__(self, repository="."):
+        """ Start reading blobs from repository.
+
+        @param BlobReader self:
+        @param str repository:
+        @rtype: NoneType:
+        """
+
+        self._process = subprocess.Popen(["git", "-C", repository, "cat-file", "--batch"], stdin=subprocess.PIPE,
+                                         stdout=subprocess.PIPE)
+
+    def read(self, revision, path):
+        """ Return the contents of path at revision, or None if the file doesn't exist at that revision.
+
+        @param BlobReader self:
+        @param str revision:
+        @param str path:
+        @rtype: bytes | NoneType:
+        """
+
+        self._process.stdin.write("{}:{}\n".format(revision, path).encode())
+        self._process.stdin.flush()
+
+        # The header is "<object> <type> <size>", or "<object> missing" when there is no such file
+        header = self._process.stdout.readline().split()
+        if header[-1] == b'missing':
+            return None
+        contents = self._process.stdout.read(int(header[2]))
+        self._process.stdout.read(1)
+
+        return contents if header[1] == b'blob' else None
+
+    def close(self):
+        """ Stop the git process.
+
+        @param BlobReader self:
+        @rtype: NoneType:
+        """
+
+        self._process.stdin.close()
+        self._process.wait()
+        self._process.stdout.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+
+def diff_summary(csv_file, first, second, repository="."):
+    """ Yield the path, the summary at the first revision and the summary at the second revision of every file
+    with commenting syntax in the .csv file that changed between the two revisions. A file that doesn't exist at
+    one of the revisions has a summary of all zeros there.
+
+    @param str csv_file:
+    @param str first:
+    @param str second:
+    @param str repository:
+    @rtype: generator:
+    """
+
+    checker = get_checker(csv_file)
+
+    with BlobReader(repository) as reader:
+        for path in changed_files(first, second, repository):
+            extension = checker.index.resolve(path)
+            if extension is None:
+                continue
+
+            summaries = []
+            for revision in (first, second):
+                contents = reader.read(revision, path)
+                if contents is None:
+                    summaries.append([0, 0, 0, 0, 0, 0])
+                else:
+                    summaries.append(checker.buffer_summary(extension, contents))
+
+            yield path, summaries[0], summaries[1]
+
+
+def output_diff_summary(csv_file, revisions, repository="."):
+    """ Output how the counts of each changed file went from the first to the second of revisions ("A..B").
+
+    @param str csv_file:
+    @param str revisions:
+    @param str repository:
+    @rtype: NoneType:
+    """
+
+    first, separator, second = revisions.partition("..")
+    names = ["lines", "comment lines", "single line comments", "comment lines within block comments",
+             "block line comments", "TODO's"]
+    grand_deltas = [0, 0, 0, 0, 0, 0]
+
+    for path, old_summary, new_summary in diff_summary(csv_file, first, second or "HEAD", repository):
+        print(path)
+        for i, name in enumerate(names):
+            delta = new_summary[i] - old_summary[i]
+            grand_deltas[i] += delta
+            print("Total # of {}: {} -> {} ({:+d})".format(name, old_summary[i], new_summary[i], delta))
+        print()
+
+    for i, name in enumerate(names):
+        print("Change in total # of {}: {:+d}".format(name, grand_deltas[i]))
@@ -0,0 +1,323 @@
+"""
+Comment Markers: Find markers such as TODO, FIXME, HACK and XXX in comments, with the owner in "TODO(owner)" and
+any issue they refer to, and keep them in an index that can be queried without scanning the files again.
+"""
+
+import os
+import re
+import sqlite3
+import collections
+
+from comment_cache import CACHE_BATCH_SIZE
+from comment_cache import CACHE_DIRECTORY
+from comment_cache import CACHE_TIMEOUT
+from comment_cache import file_stamp
+from comment_cache import hash_file
+from automated_comment_checker import get_checker
+from automated_comment_checker import iter_comments
+from automated_comment_checker import find_source_files
+from automated_comment_checker import scan_files
+
+# Markers looked for when no others are given
+DEFAULT_MARKERS = ("TODO", "FIXME", "HACK", "XXX")
+
+# Changing how markers are found must change this, so that markers found by older versions are found again
+MARKER_INDEX_VERSION = 1
+
+# Issues referred to after a marker, such as "#123" or "PROJ-123"
+ISSUE = re.compile(rb'#\d+|\b[A-Z][A-Z0-9]+-\d+\b')
+
+# A marker found in a comment: the marker's tag, the line and column (both counting from 1) it starts at, the owner
+# in parentheses straight after the tag, the first issue after it on its line, and the rest of its line
+Marker = collections.namedtuple("Marker", ["tag", "line", "column", "owner", "issue", "text"])
+
+
+class MarkerMatcher:
+    """ Finds every one of a list of markers in a comment with a single regex, so that the comment is searched once
+    however many markers there are. A marker is only found as a whole word, so "TODOS" isn't a "TODO".
+
+    === Attributes ===
+    @param tuple tags: the markers looked for
+    @param re.Pattern regex: regex matching any of the markers, with the owner after it in a group
+    """
+
+    def __init__(self, tags=DEFAULT_MARKERS):
+        """ Create a matcher for tags.
+
+        @param MarkerMatcher self:
+        @param iterable tags:
+        @rtype: NoneType:
+        """
+
+        self.tags = tuple(tags)
+        # Longer markers first, so that a marker that starts with another one is found whole
+        alternatives = b'|'.join(re.escape(tag.encode()) for tag in sorted(self.tags, key=len, reverse=True))
+        self.regex = re.compile(rb'(?<!\w)(' + alternatives + rb')(?!\w)(?:\(([^()\n]*)\))?')
+
+    def find(self, buffer, comments):
+        """ Yield a Marker for every marker in comments (Comments from iter_comments) in the bytes of a file.
+
+        @param MarkerMatcher self:
+        @param bytes | mmap buffer:
+        @param iterable comments:
+        @rtype: generator:
+        """
+
+        for comment in comments:
+            line, counted = comment.start_line, comment.start
+            for match in self.regex.finditer(buffer, comment.start, comment.end):
+                start = match.start()
+                line += buffer[counted:start].count(b'\n')
+                counted = start
+                line_start = buffer.rfind(b'\n', 0, start) + 1
+                line_end = buffer.find(b'\n', match.end(), comment.end)
+                if line_end == -1:
+                    line_end = comment.end
+
+                # Only the rest of the marker's line is decoded, never the whole comment
+                rest = buffer[match.end():line_end]
+                issue = ISSUE.search(rest)
+                owner = match.group(2)
+                yield Marker(match.group(1).decode(), line, start - line_start + 1,
+                             None if owner is None else owner.decode("utf-8", "replace").strip(),
+                             None if issue is None else issue.group().decode(),
+                             rest.decode("utf-8", "replace").strip(" \t\r:-"))
+
+
+def file_markers(csv_file, file_name, tags=DEFAULT_MARKERS):
+    """ Return a list of the Markers in the comments of a file, using the commenting syntaxes in csv_file.
+
+    @param str csv_file:
+    @param str file_name:
+    @param iterable tags:
+    @rtype: list:
+    """
+
+    checker = get_checker(csv_file)
+    with checker.open_buffer(file_name) as (extension, contents):
+        return list(MarkerMatcher(tags).find(contents, iter_comments(contents, *checker.byte_syntax(extension))))
+
+
+def count_markers(markers):
+    """ Return the number of markers with each tag.
+
+    @param iterable markers:
+    @rtype: collections.Counter:
+    """
+
+    return collections.Counter(marker.tag for marker in markers)
+
+
+def _file_markers_job(job):
+    """ Run file_markers for a (csv_file, file_name, tags) job and return the file name with its file_stamp from
+    before it was scanned and its markers, so that results coming back from a process pool in any order can be
+    matched with their file, and a file changed while it was being scanned is scanned again next time.
+
+    @param tuple job:
+    @rtype: tuple:
+    """
+
+    csv_file, file_name, tags = job
+    stamp = file_stamp(file_name)
+    return file_name, stamp, file_markers(csv_file, file_name, tags)
+
+
+class MarkerIndex:
+    """ An index of the markers in a tree of files, kept in an SQLite database. Updating it only scans the files
+    that changed since they were indexed, and queries are answered from the database without scanning anything.
+    Like ResultCache, the database is kept in write-ahead log mode and written in short transactions, so that
+    several runs can share it.
+
+    === Attributes ===
+    @param str syntax_hash: hash of the .csv file, the index version and the markers looked for
+    @param tuple tags: the markers looked for
+    """
+
+    def __init__(self, csv_file, tags=DEFAULT_MARKERS, directory=CACHE_DIRECTORY):
+        """ Open (or create) the index in directory for the markers tags in files with the commenting syntaxes in
+        csv_file.
+
+        @param MarkerIndex self:
+        @param str csv_file:
+        @param iterable tags:
+        @param str directory:
+        @rtype: NoneType:
+        """
+
+        os.makedirs(directory, exist_ok=True)
+        self.csv_file = csv_file
+        self.tags = tuple(tags)
+        self.syntax_hash = "{}:{}:{}".format(MARKER_INDEX_VERSION, hash_file(csv_file), ",".join(sorted(self.tags)))
+        self._connection = sqlite3.connect(os.path.join(directory, "markers.sqlite"), timeout=CACHE_TIMEOUT)
+        self._connection.execute("PRAGMA journal_mode=WAL")
+        self._connection.execute("CREATE TABLE IF NOT EXISTS files (path TEXT PRIMARY KEY, size INTEGER, "
+                                 "mtime INTEGER, syntax_hash TEXT)")
+        self._connection.execute("CREATE TABLE IF NOT EXISTS markers (path TEXT, tag TEXT, line INTEGER, "
+                                 "column INTEGER, owner TEXT, issue TEXT, text TEXT)")
+        for column in ["path", "tag", "owner", "issue"]:
+            self._connection.execute("CREATE INDEX IF NOT EXISTS markers_{0} ON markers ({0})".format(column))
+        self._connection.commit()
+        # Names of the files found by the last update by their absolute paths, which are the files counts covers
+        self._paths = {}
+
+    def _changed(self, path):
+        """ Return whether the file at path has changed since it was indexed, or was never indexed.
+
+        @param MarkerIndex self:
+        @param str path:
+        @rtype: bool:
+        """
+
+        row = self._connection.execute("SELECT size, mtime, syntax_hash FROM files WHERE path = ?",
+                                       (path,)).fetchone()
+        stat = os.stat(path)
+        return row is None or list(row) != [stat.st_size, stat.st_mtime_ns, self.syntax_hash]
+
+    def update(self, paths, workers=None, shebang=False):
+        """ Index the markers in every file found under a list of files, directories and glob patterns that changed
+        since it was last indexed, and remove files that no longer exist. Returns the number of files scanned.
+
+        @param MarkerIndex self:
+        @param list paths:
+        @param int workers: number of worker processes (defaults to the number of CPUs)
+        @param bool shebang: also scan files found from their "#!" line
+        @rtype: int:
+        """
+
+        file_names = find_source_files(paths, get_checker(self.csv_file).extension_list, shebang)
+        self._paths = {os.path.abspath(file_name): file_name for file_name in file_names}
+        jobs = [(self.csv_file, file_name, self.tags) for path, file_name in self._paths.items()
+                if self._changed(path)]
+
+        results = []
+        for file_name, stamp, markers in scan_files(jobs, workers, _file_markers_job):
+            results.append((os.path.abspath(file_name), stamp, markers))
+            if len(results) >= CACHE_BATCH_SIZE:
+                self._save(results)
+                results = []
+        self._save(results)
+
+        missing = [(path,) for (path,) in self._connection.execute("SELECT path FROM files")
+                   if not os.path.isfile(path)]
+        with self._connection:
+            self._connection.executemany("DELETE FROM files WHERE path = ?", missing)
+            self._connection.executemany("DELETE FROM markers WHERE path = ?", missing)
+
+        return len(jobs)
+
+    def _save(self, results):
+        """ Save the (path, file_stamp, markers) of files that were scanned in one short transaction.
+
+        @param MarkerIndex self:
+        @param list results:
+        @rtype: NoneType:
+        """
+
+        with self._connection:
+            for path, (size, mtime), markers in results:
+                self._connection.execute("DELETE FROM markers WHERE path = ?", (path,))
+                self._connection.executemany("INSERT INTO markers VALUES (?, ?, ?, ?, ?, ?, ?)",
+                                             [(path,) + tuple(marker) for marker in markers])
+                self._connection.execute("INSERT OR REPLACE INTO files VALUES (?, ?, ?, ?)",
+                                         (path, size, mtime, self.syntax_hash))
+
+    def query(self, tag=None, owner=None, issue=None, path=None):
+        """ Return (path, Marker) for every indexed marker with tag, owner, issue and path, leaving out any that
+        aren't given, sorted by path and line. path may end with "/" to match every file under a directory.
+
+        @param MarkerIndex self:
+        @param str tag:
+        @param str owner:
+        @param str issue:
+        @param str path:
+        @rtype: list:
+        """
+
+        conditions, parameters = [], []
+        for column, value in [("tag", tag), ("owner", owner), ("issue", issue)]:
+            if value is not None:
+                conditions.append("{} = ?".format(column))
+                parameters.append(value)
+        if path is not None:
+            conditions.append("path LIKE ? ESCAPE '\\'")
+            directory = os.path.abspath(path) + (os.sep if path.endswith(("/", os.sep)) else "")
+            parameters.append(re.sub(r'([%_\\])', r'\\\1', directory) + ("%" if directory.endswith(os.sep) else ""))
+
+        rows = self._connection.execute("SELECT path, tag, line, column, owner, issue, text FROM markers" +
+                                        (" WHERE " + " AND ".join(conditions) if conditions else "") +
+                                        " ORDER BY path, line, column", parameters)
+        return [(row[0], Marker(*row[1:])) for row in rows]
+
+    def counts(self):
+        """ Return the number of markers with each tag in the files found by the last update, leaving out files
+        from other trees and files indexed for other markers or commenting syntaxes that share the database.
+
+        @param MarkerIndex self:
+        @rtype: dict:
+        """
+
+        counts = collections.Counter()
+        for path, tag, count in self._connection.execute(
+                "SELECT markers.path, tag, COUNT(*) FROM markers JOIN files ON files.path = markers.path "
+                "WHERE files.syntax_hash = ? GROUP BY markers.path, tag", (self.syntax_hash,)):
+            if path in self._paths:
+                counts[tag] += count
+
+        return dict(sorted(counts.items()))
+
+    def close(self):
+        """ Save the changes to the index and close it.
+
+        @param MarkerIndex self:
+        @rtype: NoneType:
+        """
+
+        self._connection.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+
+def output_markers(csv_file, paths, tags=None, workers=None, shebang=False):
+    """ Update the marker index with the files found under a list of files, directories and glob patterns, and
+    output the number of markers with each tag in the index.
+
+    @param str csv_file:
+    @param list paths:
+    @param list tags: (defaults to DEFAULT_MARKERS)
+    @param int workers:
+    @param bool shebang:
+    @rtype: NoneType:
+    """
+
+    with MarkerIndex(csv_file, tags or DEFAULT_MARKERS) as index:
+        scanned = index.update(paths, workers, shebang)
+        counts = index.counts()
+
+    for tag in index.tags:
+        print("Total # of {}'s: {}".format(tag, counts.get(tag, 0)))
+    print("Files scanned: {}".format(scanned))
+
+
+def output_marker_query(csv_file, tag, owner=None, issue=None, tags=None):
+    """ Output every marker with tag in the marker index, and owner and issue when they are given, as
+    "path:line:column: TAG(owner) text".
+
+    @param str csv_file:
+    @param str tag:
+    @param str owner:
+    @param str issue:
+    @param list tags: (defaults to DEFAULT_MARKERS)
+    @rtype: NoneType:
+    """
+
+    with MarkerIndex(csv_file, tags or DEFAULT_MARKERS) as index:
+        results = index.query(tag, owner, issue)
+
+    for path, marker in results:
+        print("{}:{}:{}: {}{} {}".format(os.path.relpath(path), marker.line, marker.column, marker.tag,
+                                         "" if marker.owner is None else "({})".format(marker.owner),
+                                         marker.text).rstrip())
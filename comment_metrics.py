@@ -0,0 +1,152 @@
+"""
+Comment Metrics: Timings of each phase of scanning and counters for each file, for finding out where the time
+goes when a scan is slow.
+"""
+
+import json
+import time
+import contextlib
+
+
+class ScanMetrics:
+    """ Metrics collected by a CommentChecker that is given them. Phases are "read_csv_file", "build_regex", "read",
+    "findall" and "classification" for the regexes, "build_lexer" for the lexers, "scan" for the engines that read,
+    match and classify in one pass, and "detect_encoding" for finding the encoding of each file scanned by
+    file_summary.
+
+    === Attributes ===
+    @param dict phase_seconds: total seconds spent in each phase
+    @param dict phase_calls: number of times each phase was run
+    @param list files: a dict of counters for each file scanned
+    @param dict encodings: number of files found to be in each encoding
+    """
+
+    def __init__(self):
+        """ Create empty metrics.
+
+        @param ScanMetrics self:
+        @rtype: NoneType:
+        """
+
+        self.phase_seconds = {}
+        self.phase_calls = {}
+        self.files = []
+        self.encodings = {}
+
+    def add_phase(self, name, seconds):
+        """ Add seconds spent in the phase called name.
+
+        @param ScanMetrics self:
+        @param str name:
+        @param float seconds:
+        @rtype: NoneType:
+        """
+
+        self.phase_seconds[name] = self.phase_seconds.get(name, 0.0) + seconds
+        self.phase_calls[name] = self.phase_calls.get(name, 0) + 1
+
+    @contextlib.contextmanager
+    def phase(self, name):
+        """ Time the phase called name for as long as the with statement runs.
+
+        @param ScanMetrics self:
+        @param str name:
+        @rtype: generator:
+        """
+
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add_phase(name, time.perf_counter() - start)
+
+    def add_encoding(self, encoding):
+        """ Count a file found to be in encoding.
+
+        @param ScanMetrics self:
+        @param str encoding:
+        @rtype: NoneType:
+        """
+
+        self.encodings[encoding] = self.encodings.get(encoding, 0) + 1
+
+    def time_file(self, summary, file_name):
+        """ Run summary on file_name, record the counters for the file and return the summary.
+
+        @param ScanMetrics self:
+        @param function summary:
+        @param str file_name:
+        @rtype: list summary:
+        """
+
+        start = time.perf_counter()
+        result = summary(file_name)
+        self.files.append({"file": file_name, "seconds": time.perf_counter() - start, "lines": result[0],
+                           "comment_lines": result[1], "todos": result[5]})
+
+        return result
+
+    def merge(self, other):
+        """ Add the metrics from other, such as the metrics collected by a worker process, to these metrics.
+
+        @param ScanMetrics self:
+        @param ScanMetrics other:
+        @rtype: NoneType:
+        """
+
+        for name, seconds in other.phase_seconds.items():
+            self.phase_seconds[name] = self.phase_seconds.get(name, 0.0) + seconds
+            self.phase_calls[name] = self.phase_calls.get(name, 0) + other.phase_calls[name]
+        self.files.extend(other.files)
+        for encoding, files in other.encodings.items():
+            self.encodings[encoding] = self.encodings.get(encoding, 0) + files
+
+    def to_json(self):
+        """ Return the metrics as JSON.
+
+        @param ScanMetrics self:
+        @rtype: str:
+        """
+
+        return json.dumps({"phases": {name: {"seconds": self.phase_seconds[name], "calls": self.phase_calls[name]}
+                                      for name in sorted(self.phase_seconds)},
+                           "encodings": {encoding: self.encodings[encoding] for encoding in sorted(self.encodings)},
+                           "files": self.files}, indent=2)
+
+    def to_prometheus(self):
+        """ Return the metrics in the Prometheus text format. Counters for each file are added up, so that there is
+        one series per phase rather than one per file.
+
+        @param ScanMetrics self:
+        @rtype: str:
+        """
+
+        lines = ["# HELP comment_checker_phase_seconds_total Seconds spent in each phase of scanning.",
+                 "# TYPE comment_checker_phase_seconds_total counter"]
+        for name in sorted(self.phase_seconds):
+            lines.append('comment_checker_phase_seconds_total{{phase="{}"}} {}'.format(name,
+                                                                                      self.phase_seconds[name]))
+        lines += ["# HELP comment_checker_phase_calls_total Number of times each phase of scanning was run.",
+                  "# TYPE comment_checker_phase_calls_total counter"]
+        for name in sorted(self.phase_calls):
+            lines.append('comment_checker_phase_calls_total{{phase="{}"}} {}'.format(name, self.phase_calls[name]))
+
+        lines += ["# HELP comment_checker_encoding_files_total Files scanned in each encoding.",
+                  "# TYPE comment_checker_encoding_files_total counter"]
+        for encoding in sorted(self.encodings):
+            lines.append('comment_checker_encoding_files_total{{encoding="{}"}} {}'.format(encoding,
+                                                                                         self.encodings[encoding]))
+
+        totals = [("comment_checker_files_total", "Files scanned.", len(self.files))]
+        for counter, name, description in [
+                ("seconds", "comment_checker_file_seconds_total", "Seconds spent scanning files."),
+                ("lines", "comment_checker_lines_total", "Lines in the files scanned."),
+                ("comment_lines", "comment_checker_comment_lines_total", "Comment lines in the files scanned."),
+                ("todos", "comment_checker_todos_total", "TODO's in the files scanned.")]:
+            totals.append((name, description, sum(record[counter] for record in self.files)))
+
+        for name, description, value in totals:
+            lines += ["# HELP {} {}".format(name, description), "# TYPE {} counter".format(name),
+                      "{} {}".format(name, value)]
+
+        return "\n".join(lines) + "\n"
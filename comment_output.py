@@ -0,0 +1,305 @@
+"""
+Comment Output: Machine readable output of the summaries of a tree of files, as JSON Lines, CSV or a compact
+columnar binary format. Each file is written as soon as its result comes back, followed by a final record with
+the totals, so that nothing but the totals has to be kept in memory however many files there are.
+"""
+
+import csv
+import sys
+import json
+import array
+import struct
+
+# Names of the counts in a summary, in order
+SUMMARY_FIELDS = ["total_lines", "comment_lines", "single_line_comments", "comment_lines_within_block",
+                  "block_line_comments", "todos"]
+
+# Start of a columnar file: the format's name and version
+COLUMNAR_MAGIC = b"CCCOL\x00\x01\x00"
+
+# Files kept in memory by ColumnarWriter before they are written out as a batch
+COLUMNAR_BATCH_SIZE = 4096
+
+
+def totals_record(extension_totals, grand_totals, file_count, failures):
+    """ Return the final record with the totals for each extension, the grand totals and the number of files
+    scanned and failed.
+
+    @param dict extension_totals:
+    @param list grand_totals:
+    @param int file_count:
+    @param dict failures: number of failures of each kind
+    @rtype: dict:
+    """
+
+    record = {"type": "totals", "files": file_count, "failed": sum(failures.values()), "failures": failures}
+    record.update(zip(SUMMARY_FIELDS, grand_totals))
+    record["extensions"] = {extension: dict(zip(SUMMARY_FIELDS, extension_totals[extension]))
+                            for extension in sorted(extension_totals)}
+
+    return record
+
+
+class JSONLinesWriter:
+    """ Writes one JSON object per line: a record with "type" "file" for each file, then one with "type"
+    "totals" from totals_record.
+    """
+
+    binary = False
+
+    def __init__(self, file_handler):
+        """ Write records to the text file_handler.
+
+        @param JSONLinesWriter self:
+        @param io.TextIOBase file_handler:
+        @rtype: NoneType:
+        """
+
+        self._file_handler = file_handler
+
+    def write_file(self, file_name, extension, summary, failure=None):
+        """ Write the record for a file. A file that failed has a summary of None and its failure as
+        (kind, message).
+
+        @param JSONLinesWriter self:
+        @param str file_name:
+        @param str extension:
+        @param list summary:
+        @param tuple failure:
+        @rtype: NoneType:
+        """
+
+        record = {"type": "file", "file": file_name, "extension": extension}
+        if failure is None:
+            record.update(zip(SUMMARY_FIELDS, summary))
+        else:
+            record["failure"], record["message"] = failure
+        self._file_handler.write(json.dumps(record) + "\n")
+
+    def write_totals(self, extension_totals, grand_totals, file_count, failures):
+        """ Write the final record with the totals.
+
+        @param JSONLinesWriter self:
+        @param dict extension_totals:
+        @param list grand_totals:
+        @param int file_count:
+        @param dict failures:
+        @rtype: NoneType:
+        """
+
+        self._file_handler.write(json.dumps(totals_record(extension_totals, grand_totals, file_count, failures))
+                                 + "\n")
+        self._file_handler.flush()
+
+
+class CSVWriter:
+    """ Writes a header, then a row with "type" "file" for each file, a row with "type" "extension" for the totals
+    of each extension and a row with "type" "totals" for the grand totals, where "file" is the number of files.
+    """
+
+    binary = False
+
+    def __init__(self, file_handler):
+        """ Write rows to the text file_handler, which should have been opened with newline="".
+
+        @param CSVWriter self:
+        @param io.TextIOBase file_handler:
+        @rtype: NoneType:
+        """
+
+        self._file_handler = file_handler
+        self._writer = csv.writer(file_handler, lineterminator="\n")
+        self._writer.writerow(["type", "file", "extension"] + SUMMARY_FIELDS + ["failure", "message"])
+
+    def write_file(self, file_name, extension, summary, failure=None):
+        """ Write the row for a file. A file that failed has a summary of None and its failure as (kind, message).
+
+        @param CSVWriter self:
+        @param str file_name:
+        @param str extension:
+        @param list summary:
+        @param tuple failure:
+        @rtype: NoneType:
+        """
+
+        if failure is None:
+            self._writer.writerow(["file", file_name, extension] + summary + ["", ""])
+        else:
+            self._writer.writerow(["file", file_name, extension] + [""] * len(SUMMARY_FIELDS) + list(failure))
+
+    def write_totals(self, extension_totals, grand_totals, file_count, failures):
+        """ Write the rows with the totals.
+
+        @param CSVWriter self:
+        @param dict extension_totals:
+        @param list grand_totals:
+        @param int file_count:
+        @param dict failures:
+        @rtype: NoneType:
+        """
+
+        for extension in sorted(extension_totals):
+            self._writer.writerow(["extension", "", extension] + extension_totals[extension] + ["", ""])
+        self._writer.writerow(["totals", file_count, ""] + grand_totals + [sum(failures.values()), ""])
+        self._file_handler.flush()
+
+
+class ColumnarWriter:
+    """ Writes a compact binary file laid out in columns, in the spirit of Arrow record batches. All numbers are
+    little endian. The file starts with COLUMNAR_MAGIC, followed by batches of up to COLUMNAR_BATCH_SIZE files:
+
+        b"B", uint32 number of rows,
+        the "file", "extension" and "failure" columns, each as one more uint32 offset than there are rows, then
+        a uint32 length and that many bytes of UTF-8 text, which the offsets index into,
+        the SUMMARY_FIELDS columns, each as an int64 for every row (zeros for files that failed).
+
+    It ends with b"T", a uint32 length and the JSON of totals_record. read_columnar reads it back.
+    """
+
+    binary = True
+
+    def __init__(self, file_handler):
+        """ Write batches to the binary file_handler.
+
+        @param ColumnarWriter self:
+        @param io.BufferedIOBase file_handler:
+        @rtype: NoneType:
+        """
+
+        self._file_handler = file_handler
+        self._file_handler.write(COLUMNAR_MAGIC)
+        self._strings = ([], [], [])
+        self._counts = [array.array('q') for field in SUMMARY_FIELDS]
+
+    def write_file(self, file_name, extension, summary, failure=None):
+        """ Add the row for a file, writing out the batch once it is full. A file that failed has a summary of
+        None and its failure as (kind, message).
+
+        @param ColumnarWriter self:
+        @param str file_name:
+        @param str extension:
+        @param list summary:
+        @param tuple failure:
+        @rtype: NoneType:
+        """
+
+        for column, value in zip(self._strings, (file_name, extension, failure[0] if failure else "")):
+            column.append(value)
+        for column, count in zip(self._counts, summary or [0] * len(SUMMARY_FIELDS)):
+            column.append(count)
+
+        if len(self._strings[0]) >= COLUMNAR_BATCH_SIZE:
+            self._write_batch()
+
+    def _write_batch(self):
+        """ Write out the rows added since the last batch.
+
+        @param ColumnarWriter self:
+        @rtype: NoneType:
+        """
+
+        rows = len(self._strings[0])
+        if not rows:
+            return
+
+        output = [b"B", struct.pack("<I", rows)]
+        for column in self._strings:
+            data = [value.encode("utf-8", "surrogateescape") for value in column]
+            offsets = array.array('I', [0])
+            for value in data:
+                offsets.append(offsets[-1] + len(value))
+            output += [_little_endian(offsets), struct.pack("<I", offsets[-1])] + data
+        output += [_little_endian(column) for column in self._counts]
+        self._file_handler.write(b"".join(output))
+
+        self._strings = ([], [], [])
+        self._counts = [array.array('q') for field in SUMMARY_FIELDS]
+
+    def write_totals(self, extension_totals, grand_totals, file_count, failures):
+        """ Write out the last batch and then the totals.
+
+        @param ColumnarWriter self:
+        @param dict extension_totals:
+        @param list grand_totals:
+        @param int file_count:
+        @param dict failures:
+        @rtype: NoneType:
+        """
+
+        self._write_batch()
+        totals = json.dumps(totals_record(extension_totals, grand_totals, file_count, failures)).encode()
+        self._file_handler.write(b"T" + struct.pack("<I", len(totals)) + totals)
+        self._file_handler.flush()
+
+
+def _little_endian(column):
+    """ Return the bytes of an array in little endian order.
+
+    @param array.array column:
+    @rtype: bytes:
+    """
+
+    if sys.byteorder == "big":
+        column = array.array(column.typecode, column)
+        column.byteswap()
+
+    return column.tobytes()
+
+
+def _read_array(file_handler, typecode, length):
+    """ Read length little endian numbers of typecode from file_handler.
+
+    @param io.BufferedIOBase file_handler:
+    @param str typecode:
+    @param int length:
+    @rtype: array.array:
+    """
+
+    column = array.array(typecode)
+    column.frombytes(file_handler.read(column.itemsize * length))
+    if sys.byteorder == "big":
+        column.byteswap()
+
+    return column
+
+
+def read_columnar(file_handler):
+    """ Read a file written by ColumnarWriter and yield the same records as JSONLinesWriter writes, ending with
+    the totals.
+
+    @param io.BufferedIOBase file_handler:
+    @rtype: generator:
+    """
+
+    if file_handler.read(len(COLUMNAR_MAGIC)) != COLUMNAR_MAGIC:
+        raise ValueError("Not a columnar comment checker file.")
+
+    while True:
+        kind = file_handler.read(1)
+        if kind == b"T":
+            length, = struct.unpack("<I", file_handler.read(4))
+            yield json.loads(file_handler.read(length).decode())
+            return
+        if kind != b"B":
+            raise ValueError("Columnar comment checker file is cut short.")
+
+        rows, = struct.unpack("<I", file_handler.read(4))
+        strings = []
+        for i in range(3):
+            offsets = _read_array(file_handler, 'I', rows + 1)
+            data = file_handler.read(struct.unpack("<I", file_handler.read(4))[0])
+            strings.append([data[offsets[row]:offsets[row + 1]].decode("utf-8", "surrogateescape")
+                            for row in range(rows)])
+        counts = [_read_array(file_handler, 'q', rows) for field in SUMMARY_FIELDS]
+
+        for row in range(rows):
+            record = {"type": "file", "file": strings[0][row], "extension": strings[1][row]}
+            if strings[2][row]:
+                record["failure"] = strings[2][row]
+            else:
+                record.update((field, column[row]) for field, column in zip(SUMMARY_FIELDS, counts))
+            yield record
+
+
+# Writers for each machine readable output format
+WRITERS = {"jsonl": JSONLinesWriter, "csv": CSVWriter, "columnar": ColumnarWriter}
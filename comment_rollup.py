@@ -0,0 +1,334 @@
+"""
+Comment Rollup: The totals of every directory in a tree of files, kept in a tree keyed on the components of their
+paths, so that the comment density of any package or team directory can be looked up without adding up the files
+under it again.
+"""
+
+import os
+import json
+
+from comment_output import SUMMARY_FIELDS
+from automated_comment_checker import CommentCheckerError
+
+# Changing what RollupTree.to_dict writes must change this, so that older rollup files aren't loaded
+ROLLUP_VERSION = 1
+
+
+class RollupNode:
+    """ A directory or file in a RollupTree.
+
+    === Attributes ===
+    @param list counts: the summary of a file, or the summaries of every file under a directory added up
+    @param int files: number of files under the node (1 for a file)
+    @param dict children: the node of each file and directory directly under a directory, by name, or None for a
+    file
+    """
+
+    __slots__ = ("counts", "files", "children")
+
+    def __init__(self, is_file=False):
+        """ Create an empty node for a directory, or for a file when is_file is true.
+
+        @param RollupNode self:
+        @param bool is_file:
+        @rtype: NoneType:
+        """
+
+        self.counts = [0] * len(SUMMARY_FIELDS)
+        self.files = 0
+        self.children = None if is_file else {}
+
+    def is_file(self):
+        """ Return whether the node is a file.
+
+        @param RollupNode self:
+        @rtype: bool:
+        """
+
+        return self.children is None
+
+    def density(self):
+        """ Return the comment lines as a fraction of the total lines, or 0.0 when there are no lines.
+
+        @param RollupNode self:
+        @rtype: float:
+        """
+
+        total_lines, comment_lines = self.counts[0], self.counts[1]
+        return comment_lines / total_lines if total_lines else 0.0
+
+
+class RollupTree:
+    """ The summaries of files, added up into every directory above them. Changing or removing a file only updates
+    the directories it is in, so keeping the tree up to date as files change costs as much as the depth of the
+    file, however many files there are.
+
+    === Attributes ===
+    @param RollupNode root: the node everything is under
+    """
+
+    def __init__(self):
+        """ Create an empty tree.
+
+        @param RollupTree self:
+        @rtype: NoneType:
+        """
+
+        self.root = RollupNode()
+
+    def _nodes(self, components, create=False):
+        """ Return the nodes from the root down to the node with the path components, stopping where there is none
+        unless create is true, when the directories on the way are created.
+
+        @param RollupTree self:
+        @param list components:
+        @param bool create:
+        @rtype: list:
+        """
+
+        nodes = [self.root]
+        for name in components:
+            if nodes[-1].is_file():
+                break
+            node = nodes[-1].children.get(name)
+            if node is None:
+                if not create:
+                    break
+                node = nodes[-1].children[name] = RollupNode()
+            nodes.append(node)
+
+        return nodes
+
+    def update(self, file_name, summary):
+        """ Set the summary of a file, adding it to the tree if it isn't in it already.
+
+        @param RollupTree self:
+        @param str file_name:
+        @param list summary:
+        @rtype: NoneType:
+        """
+
+        components = _components(file_name)
+        if not components:
+            raise ValueError("A file needs a name.")
+
+        nodes = self._nodes(components[:-1], True)
+        if nodes[-1].is_file():
+            raise ValueError("{} is under a file.".format(file_name))
+        leaf = nodes[-1].children.get(components[-1])
+        if leaf is None:
+            leaf = nodes[-1].children[components[-1]] = RollupNode(is_file=True)
+        elif not leaf.is_file():
+            raise ValueError("{} is a directory, not a file.".format(file_name))
+
+        delta = [count - old for count, old in zip(summary, leaf.counts)]
+        added = 1 - leaf.files
+        for node in nodes + [leaf]:
+            node.files += added
+            for i, count in enumerate(delta):
+                node.counts[i] += count
+
+    def remove(self, file_name):
+        """ Take a file out of the tree, along with the directories left empty. Returns whether it was in the
+        tree.
+
+        @param RollupTree self:
+        @param str file_name:
+        @rtype: bool:
+        """
+
+        components = _components(file_name)
+        nodes = self._nodes(components)
+        if not components or len(nodes) != len(components) + 1 or not nodes[-1].is_file():
+            return False
+
+        leaf = nodes[-1]
+        for node in nodes:
+            node.files -= 1
+            for i, count in enumerate(leaf.counts):
+                node.counts[i] -= count
+
+        # Directories are left empty from the bottom up, so they are removed until one still has files
+        for depth in range(len(components), 0, -1):
+            if nodes[depth].files:
+                break
+            del nodes[depth - 1].children[components[depth - 1]]
+
+        return True
+
+    def node(self, path=""):
+        """ Return the node of a file or directory, or None if there isn't one. The root is the node of "".
+
+        @param RollupTree self:
+        @param str path:
+        @rtype: RollupNode | NoneType:
+        """
+
+        components = _components(path)
+        nodes = self._nodes(components)
+        return nodes[-1] if len(nodes) == len(components) + 1 else None
+
+    def totals(self, path=""):
+        """ Return the totals of a file or directory as a dict with the number of files, the counts in
+        SUMMARY_FIELDS and the comment density, or None if there isn't one.
+
+        @param RollupTree self:
+        @param str path:
+        @rtype: dict | NoneType:
+        """
+
+        node = self.node(path)
+        return None if node is None else _node_record(node)
+
+    def to_dict(self, path="", depth=None):
+        """ Return the subtree under a file or directory as a dict that can be saved as JSON, going depth levels
+        down (all the way by default), or None if there isn't one. Each level is the record from totals, with
+        "file" true for files and the levels under a directory in "children".
+
+        @param RollupTree self:
+        @param str path:
+        @param int depth:
+        @rtype: dict | NoneType:
+        """
+
+        node = self.node(path)
+        if node is None:
+            return None
+
+        record = _subtree_record(node, depth)
+        record["version"] = ROLLUP_VERSION
+        record["path"] = "/".join(_components(path))
+
+        return record
+
+    @classmethod
+    def from_dict(cls, record):
+        """ Return the tree saved as a whole by to_dict, without adding up the files again.
+
+        @param type cls:
+        @param dict record:
+        @rtype: RollupTree:
+        """
+
+        if record.get("version") != ROLLUP_VERSION or record.get("path"):
+            raise CommentCheckerError("Not a whole rollup tree of version {}.".format(ROLLUP_VERSION))
+
+        tree = cls()
+        tree.root = _record_node(record)
+
+        return tree
+
+    def save(self, file_name):
+        """ Save the whole tree to file_name as JSON.
+
+        @param RollupTree self:
+        @param str file_name:
+        @rtype: NoneType:
+        """
+
+        with open(file_name, 'w') as file_handler:
+            json.dump(self.to_dict(), file_handler)
+
+    @classmethod
+    def load(cls, file_name):
+        """ Load a tree saved with save.
+
+        @param type cls:
+        @param str file_name:
+        @rtype: RollupTree:
+        """
+
+        try:
+            with open(file_name) as file_handler:
+                record = json.load(file_handler)
+        except (OSError, ValueError) as error:
+            raise CommentCheckerError("Couldn't load the rollup tree in {}: {}".format(file_name, error))
+
+        return cls.from_dict(record)
+
+
+def _components(path):
+    """ Return the names of the directories and the file in path, leaving out "." and where the path starts, so
+    that "./src/a.py" and "src/a.py" are the same file.
+
+    @param str path:
+    @rtype: list:
+    """
+
+    path = os.path.normpath(path).replace(os.sep, "/")
+    return [name for name in path.split("/") if name not in ("", ".")]
+
+
+def _node_record(node):
+    """ Return the number of files, counts and comment density of a node as a dict.
+
+    @param RollupNode node:
+    @rtype: dict:
+    """
+
+    record = {"files": node.files}
+    record.update(zip(SUMMARY_FIELDS, node.counts))
+    record["comment_density"] = node.density()
+
+    return record
+
+
+def _subtree_record(node, depth):
+    """ Return the record of a node with the records of the nodes under it, depth levels down (all the way when
+    depth is None).
+
+    @param RollupNode node:
+    @param int depth:
+    @rtype: dict:
+    """
+
+    record = _node_record(node)
+    if node.is_file():
+        record["file"] = True
+    elif depth is None or depth > 0:
+        record["children"] = {name: _subtree_record(child, None if depth is None else depth - 1)
+                              for name, child in sorted(node.children.items())}
+
+    return record
+
+
+def _record_node(record):
+    """ Return the node saved as record by _subtree_record, with every level under it.
+
+    @param dict record:
+    @rtype: RollupNode:
+    """
+
+    node = RollupNode(is_file=record.get("file", False))
+    node.files = record["files"]
+    node.counts = [record[field] for field in SUMMARY_FIELDS]
+    if not node.is_file():
+        if "children" not in record:
+            raise CommentCheckerError("A rollup tree saved only part of the way down can't be loaded.")
+        node.children = {name: _record_node(child) for name, child in record["children"].items()}
+
+    return node
+
+
+def output_rollup(rollup_file, path="", depth=1):
+    """ Output the totals and comment density of a directory in a saved rollup tree and of everything depth
+    levels under it, without scanning anything.
+
+    @param str rollup_file:
+    @param str path:
+    @param int depth:
+    @rtype: NoneType:
+    """
+
+    record = RollupTree.load(rollup_file).to_dict(path, depth)
+    if record is None:
+        raise CommentCheckerError("{} isn't in {}.".format(path, rollup_file))
+
+    def output(name, record, indent):
+        print("{}{}: {} files, {} lines, {} comment lines, {} TODO's, {:.1%} comments".format(
+            "  " * indent, name, record["files"], record["total_lines"], record["comment_lines"], record["todos"],
+            record["comment_density"]))
+        for child_name, child in record.get("children", {}).items():
+            output(child_name, child, indent + 1)
+
+    output(record["path"] or ".", record, 0)
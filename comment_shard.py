@@ -0,0 +1,227 @@
+"""
+Comment Shard: Split the files of a tree between several machines (or processes) that each scan their own shard
+and write its totals to a partial results file, then merge the partial results into the totals a single run gives.
+No machine has to know about the others: every shard lists the same files and splits them the same way.
+"""
+
+import os
+import json
+import heapq
+
+from comment_cache import hash_file
+from comment_output import SUMMARY_FIELDS
+from comment_output import totals_record
+from automated_comment_checker import CommentCheckerError
+from automated_comment_checker import print_summary
+
+# Changing what PartialWriter writes must change this, so that partial results of different versions aren't merged
+PARTIAL_VERSION = 1
+
+
+class ShardError(CommentCheckerError):
+    """ Raised when a shard is given wrongly or partial results can't be merged.
+    """
+
+
+def parse_shard(text):
+    """ Return (shard, shards) from text such as "2/4", where shards count from 1.
+
+    @param str text:
+    @rtype: tuple:
+    """
+
+    try:
+        shard, shards = (int(number) for number in text.split("/"))
+    except ValueError:
+        raise ShardError("Please give the shard as i/N, such as 2/4.")
+    if not 1 <= shard <= shards:
+        raise ShardError("Please give a shard from 1 to the number of shards, such as 2/4.")
+
+    return shard, shards
+
+
+def partition_files(file_names, shards):
+    """ Split file_names into shards lists of about the same number of bytes. Each file, biggest first, goes to
+    the shard with the fewest bytes so far (the one counting from 1 first when there is a tie), so every shard
+    splits the same files the same way. Files that can't be found count as empty.
+
+    @param iterable file_names:
+    @param int shards:
+    @rtype: list:
+    """
+
+    sizes = []
+    for file_name in file_names:
+        try:
+            sizes.append((-os.path.getsize(file_name), file_name))
+        except OSError:
+            sizes.append((0, file_name))
+
+    partition = [[] for shard in range(shards)]
+    loads = [(0, shard) for shard in range(shards)]
+    for size, file_name in sorted(sizes):
+        load, shard = heapq.heappop(loads)
+        partition[shard].append(file_name)
+        heapq.heappush(loads, (load - size, shard))
+
+    return [sorted(files) for files in partition]
+
+
+def shard_files(file_names, shard, shards):
+    """ Return the files in file_names that are in shard of shards, counting from 1.
+
+    @param iterable file_names:
+    @param int shard:
+    @param int shards:
+    @rtype: list:
+    """
+
+    return partition_files(file_names, shards)[shard - 1]
+
+
+def partial_file_name(shard, shards):
+    """ Return the name partial results are written to when no other is given.
+
+    @param int shard:
+    @param int shards:
+    @rtype: str:
+    """
+
+    return "comment-counter.shard-{}-of-{}.json".format(shard, shards)
+
+
+class PartialWriter:
+    """ Writes the totals of a shard as a partial results file, which is the "totals" record of comment_output
+    with the shard, the number of shards and what the files were scanned with. Used as a writer for
+    write_tree_records, where only the totals are written.
+
+    === Attributes ===
+    @param str file_name: the partial results file
+    @param int shard:
+    @param int shards:
+    @param str syntax_hash: hash of the .csv file and the engine the files were scanned with
+    """
+
+    binary = False
+
+    def __init__(self, file_name, shard, shards, csv_file, engine="scan"):
+        """ Write the partial results of shard of shards to file_name.
+
+        @param PartialWriter self:
+        @param str file_name:
+        @param int shard:
+        @param int shards:
+        @param str csv_file:
+        @param str engine:
+        @rtype: NoneType:
+        """
+
+        self.file_name = file_name
+        self.shard = shard
+        self.shards = shards
+        self.syntax_hash = "{}:{}".format(hash_file(csv_file), engine)
+
+    def write_file(self, file_name, extension, summary, failure=None):
+        """ Files aren't written, only the totals.
+
+        @param PartialWriter self:
+        @param str file_name:
+        @param str extension:
+        @param list summary:
+        @param tuple failure:
+        @rtype: NoneType:
+        """
+
+    def write_totals(self, extension_totals, grand_totals, file_count, failures):
+        """ Write the partial results file.
+
+        @param PartialWriter self:
+        @param dict extension_totals:
+        @param list grand_totals:
+        @param int file_count:
+        @param dict failures:
+        @rtype: NoneType:
+        """
+
+        record = totals_record(extension_totals, grand_totals, file_count, failures)
+        record.update({"type": "partial", "version": PARTIAL_VERSION, "shard": self.shard, "shards": self.shards,
+                       "syntax_hash": self.syntax_hash})
+        with open(self.file_name, 'w') as file_handler:
+            json.dump(record, file_handler, indent=2)
+
+
+def merge_partials(file_names):
+    """ Merge the partial results files of every shard of a run into per extension totals, grand totals, the
+    number of files and the number of failures of each kind, the same as a single run over every file gives.
+
+    @param list file_names:
+    @rtype: dict extension_totals:
+    @rtype: list grand_totals:
+    @rtype: int file_count:
+    @rtype: dict failures:
+    """
+
+    records = []
+    for file_name in file_names:
+        try:
+            with open(file_name) as file_handler:
+                record = json.load(file_handler)
+        except (OSError, ValueError) as error:
+            raise ShardError("Couldn't read the partial results in {}: {}".format(file_name, error))
+        if not isinstance(record, dict) or record.get("type") != "partial" or \
+                record.get("version") != PARTIAL_VERSION:
+            raise ShardError("{} isn't a partial results file of version {}.".format(file_name, PARTIAL_VERSION))
+        records.append(record)
+
+    if not records:
+        raise ShardError("Please pass in the partial results files to merge.")
+
+    # Every shard of the same run has to be there exactly once
+    shards = records[0]["shards"]
+    if any(record["shards"] != shards or record["syntax_hash"] != records[0]["syntax_hash"] for record in records):
+        raise ShardError("The partial results are from different runs.")
+    found = sorted(record["shard"] for record in records)
+    if found != list(range(1, shards + 1)):
+        raise ShardError("Expected shards 1 to {} once each, but got {}.".format(
+            shards, ", ".join(str(shard) for shard in found)))
+
+    extension_totals, grand_totals, file_count, failures = {}, [0] * len(SUMMARY_FIELDS), 0, {}
+    for record in records:
+        for extension, counts in record["extensions"].items():
+            totals = extension_totals.setdefault(extension, [0] * len(SUMMARY_FIELDS))
+            for i, field in enumerate(SUMMARY_FIELDS):
+                totals[i] += counts[field]
+        for i, field in enumerate(SUMMARY_FIELDS):
+            grand_totals[i] += record[field]
+        file_count += record["files"]
+        for kind, count in record["failures"].items():
+            failures[kind] = failures.get(kind, 0) + count
+
+    return extension_totals, grand_totals, file_count, failures
+
+
+def output_merged(file_names):
+    """ Merge the partial results files of every shard of a run and output the counts for each file extension
+    followed by the grand totals, the same as output_tree_summary. Returns the number of files that failed.
+
+    @param list file_names:
+    @rtype: int:
+    """
+
+    extension_totals, grand_totals, file_count, failures = merge_partials(file_names)
+
+    for extension in sorted(extension_totals):
+        print("[{}]".format(extension))
+        print_summary(extension_totals[extension])
+        print()
+
+    print("Total # of files: {}".format(file_count))
+    print_summary(grand_totals)
+
+    failed = sum(failures.values())
+    if failed:
+        print()
+        print("Total # of failed files: {}{}".format(failed, "".join(
+            "\n  {}: {}".format(kind, failures[kind]) for kind in sorted(failures))))
+
+    return failed